@@ -0,0 +1,82 @@
+# Mide el coste de la dependencia get_current_user con y sin la caché de tokens verificados:
+#   - llamadas directas a la dependencia por segundo
+#   - peticiones por segundo a un endpoint mínimo que solo autentica (ASGI en proceso, sin red)
+# Por defecto usa el almacén de revocaciones en memoria para medir solo la autenticación.
+#
+# Uso: python -m benchmarks.bench_auth --tokens 100 --calls 50000 --output auth.json
+import argparse
+import asyncio
+import json
+import os
+from time import perf_counter
+
+os.environ.setdefault("REVOCATION_BACKEND", "memory")
+
+import httpx
+from fastapi import Depends, FastAPI
+from main import crud
+from main.cache import MemoryCache
+
+
+def _auth_app():
+    app = FastAPI()
+
+    @app.get("/whoami")
+    async def whoami(user_id: int = Depends(crud.get_current_user)):
+        return {"user_id": user_id}
+
+    return app
+
+
+async def _dependency_rate(tokens, calls):
+    started = perf_counter()
+    for i in range(calls):
+        await crud.get_current_user(tokens[i % len(tokens)])
+    return calls / (perf_counter() - started)
+
+
+async def _request_rate(tokens, requests):
+    transport = httpx.ASGITransport(app=_auth_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = perf_counter()
+        for i in range(requests):
+            response = await client.get("/whoami", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+            response.raise_for_status()
+        return requests / (perf_counter() - started)
+
+
+async def run(args):
+    tokens = [crud.create_access_token(data={"user_id": user_id}) for user_id in range(1, args.tokens + 1)]
+    results = {}
+    for name, max_entries in (("without_cache", 0), ("with_cache", max(args.tokens, 1))):
+        crud.verified_tokens = MemoryCache(max_entries=max_entries, default_ttl=0)
+        # Primera pasada para llenar las cachés (la de revocaciones también)
+        await _dependency_rate(tokens, len(tokens))
+        results[name] = {
+            "dependency_calls_per_second": round(await _dependency_rate(tokens, args.calls), 1),
+            "requests_per_second": round(await _request_rate(tokens, args.requests), 1),
+        }
+    results["speedup"] = {
+        key: round(results["with_cache"][key] / results["without_cache"][key], 2)
+        for key in results["with_cache"]
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendimiento de get_current_user con y sin caché de tokens")
+    parser.add_argument("--tokens", type=int, default=100, help="Tokens distintos que se reparten las llamadas")
+    parser.add_argument("--calls", type=int, default=50000, help="Llamadas directas a la dependencia")
+    parser.add_argument("--requests", type=int, default=5000, help="Peticiones al endpoint mínimo")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# Mide /analytics/cohort (consultas agrupadas sobre metricRollups) frente a recorrer los usuarios
+# uno a uno con get_data_history, que es lo que haría un bucle sobre las funciones por usuario.
+# Crea --users usuarios de prueba con --days días de resúmenes diarios, semanales y mensuales
+# (pasos y peso) y los borra al terminar salvo que se indique --keep.
+# Usa la base de datos configurada en el .env.
+#
+# Uso: python -m benchmarks.bench_cohort --users 10000 --days 365 --output cohort.json
+import argparse
+import asyncio
+import json
+import uuid
+from time import perf_counter
+import numpy as np
+from sqlalchemy import text
+from main import analytics, crud
+from main.cache import MemoryCache
+from main.database import AsyncReadSessionLocal, SessionLocal
+
+# Valor diario de cada métrica sembrada (SQL sobre el id de usuario u.id y el día d)
+SEED_VALUES = {
+    'steps': "round(2000 + random() * 10000)",
+    'weights': "60 + (u.id % 40) + random() * 2 - extract(doy from d) / 365.0",
+}
+
+
+def _seed(prefix: str, users: int, days: int):
+    with SessionLocal() as db:
+        db.execute(text("""
+            INSERT INTO users (email, username, password, birthdate, gender)
+            SELECT :prefix || i || '@example.com', :prefix || i, 'x', DATE '1990-01-01', 'MASCULINO'
+            FROM generate_series(1, :users) i
+        """), {"prefix": prefix, "users": users})
+        bench_users = "SELECT id FROM users WHERE username LIKE :pattern"
+        for metric, value in SEED_VALUES.items():
+            db.execute(text(f"""
+                INSERT INTO "metricRollups"
+                SELECT u.id, :metric, 'day', d::date, v, 1, v, v, v, d
+                FROM users u
+                CROSS JOIN generate_series(current_date - :days + 1, current_date, interval '1 day') d
+                CROSS JOIN LATERAL (SELECT {value} AS v) value
+                WHERE u.username LIKE :pattern
+            """), {"metric": metric, "days": days, "pattern": prefix + "%"})
+        for granularity in ("week", "month"):
+            db.execute(text(f"""
+                INSERT INTO "metricRollups"
+                SELECT "userId", metric, :granularity, date_trunc(:granularity, bucket)::date,
+                       sum(total), sum(count), min(minimum), max(maximum),
+                       (array_agg(last ORDER BY bucket DESC))[1], max("lastDate")
+                FROM "metricRollups"
+                WHERE granularity = 'day' AND "userId" IN ({bench_users})
+                GROUP BY "userId", metric, date_trunc(:granularity, bucket)
+            """), {"granularity": granularity, "pattern": prefix + "%"})
+        db.commit()
+    # Como haría autovacuum: estadísticas al día y mapa de visibilidad para los index-only scans
+    with SessionLocal() as db:
+        db.connection(execution_options={"isolation_level": "AUTOCOMMIT"}).execute(text('VACUUM ANALYZE "metricRollups"'))
+
+
+def _cleanup(prefix: str):
+    with SessionLocal() as db:
+        bench_users = "SELECT id FROM users WHERE username LIKE :pattern"
+        db.execute(text(f'DELETE FROM "metricRollups" WHERE "userId" IN ({bench_users})'), {"pattern": prefix + "%"})
+        db.execute(text("DELETE FROM users WHERE username LIKE :pattern"), {"pattern": prefix + "%"})
+        db.commit()
+
+
+def _ms(values):
+    values = np.array(values) * 1000
+    return {"p50_ms": round(float(np.percentile(values, 50)), 2), "max_ms": round(float(values.max()), 2)}
+
+
+async def _first_page(args, cold: bool):
+    timings = []
+    for _ in range(args.iterations):
+        if cold:
+            analytics.cache = MemoryCache()
+        async with AsyncReadSessionLocal() as db:
+            started = perf_counter()
+            response = await analytics.get_cohort_view(db, args.metric, args.period, args.granularity, None, args.page_size)
+            timings.append(perf_counter() - started)
+    return timings, response
+
+
+async def _all_pages(args):
+    analytics.cache = MemoryCache()
+    pages = users = 0
+    cursor = None
+    started = perf_counter()
+    async with AsyncReadSessionLocal() as db:
+        while True:
+            response = await analytics.get_cohort_view(db, args.metric, args.period, args.granularity, cursor, args.page_size)
+            pages += 1
+            users += len(response["users"])
+            cursor = response["next_cursor"]
+            if cursor is None:
+                break
+    return {"seconds": round(perf_counter() - started, 3), "pages": pages, "users": users, "queries": pages + 1}
+
+
+# Lo mismo con las funciones por usuario: get_data_history de cada usuario en un bucle y los
+# percentiles de cada periodo calculados después en Python
+async def _per_user_loop(args, prefix: str):
+    agg = 'sum' if analytics.COHORT_METRICS[args.metric] == 'sum' else 'avg'
+    async with AsyncReadSessionLocal() as db:
+        user_ids = (await db.execute(text("SELECT id FROM users WHERE username LIKE :pattern ORDER BY id LIMIT :limit"),
+                                     {"pattern": prefix + "%", "limit": args.baseline_users})).scalars().all()
+        started = perf_counter()
+        by_bucket = {}
+        for user_id in user_ids:
+            history = await crud.get_data_history(db, user_id, args.metric, args.period, args.granularity, agg=agg)
+            for row in history["data"]:
+                by_bucket.setdefault(row["fecha"], []).append(row[crud._history_label(args.metric)])
+        for values in by_bucket.values():
+            np.percentile(values, [25, 50, 75])
+        elapsed = perf_counter() - started
+    per_user = elapsed / max(len(user_ids), 1)
+    return {
+        "users_measured": len(user_ids),
+        "ms_per_user": round(per_user * 1000, 3),
+        "estimated_seconds_all_users": round(per_user * args.users, 3),
+        "queries": args.users,
+    }
+
+
+async def run(args, prefix: str):
+    cold, response = await _first_page(args, cold=True)
+    warm, _ = await _first_page(args, cold=False)
+    all_pages = await _all_pages(args)
+    loop = await _per_user_loop(args, prefix)
+    return {
+        "users": args.users,
+        "days": args.days,
+        "query": {"metric": args.metric, "period": args.period, "granularity": args.granularity, "page_size": args.page_size},
+        "summary_buckets": len(response["summary"]),
+        "first_page_cold": _ms(cold),
+        "first_page_cached": _ms(warm),
+        "all_pages_cold": all_pages,
+        "per_user_loop": loop,
+        "speedup_all_users": round(loop["estimated_seconds_all_users"] / all_pages["seconds"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendimiento de las vistas de cohorte")
+    parser.add_argument("--users", type=int, default=10000, help="Usuarios de prueba")
+    parser.add_argument("--days", type=int, default=365, help="Días de datos por usuario")
+    parser.add_argument("--metric", default="steps", choices=list(SEED_VALUES))
+    parser.add_argument("--period", default="year", choices=list(crud.HISTORY_PERIODS))
+    parser.add_argument("--granularity", default="week", choices=["day", "week", "month"])
+    parser.add_argument("--page-size", type=int, default=500, help="Usuarios por página")
+    parser.add_argument("--iterations", type=int, default=5, help="Repeticiones de la primera página")
+    parser.add_argument("--baseline-users", type=int, default=200, help="Usuarios medidos en el bucle por usuario")
+    parser.add_argument("--keep", action="store_true", help="No borrar los datos sembrados")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    prefix = f"bench_cohort_{uuid.uuid4().hex[:8]}_"
+    started = perf_counter()
+    try:
+        _seed(prefix, args.users, args.days)
+        seed_seconds = perf_counter() - started
+        results = asyncio.run(run(args, prefix))
+    finally:
+        if not args.keep:
+            _cleanup(prefix)
+    results["seed_seconds"] = round(seed_seconds, 1)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
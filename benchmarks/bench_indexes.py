@@ -0,0 +1,117 @@
+# Compara el diseño de índices anterior de las tablas de sensores con el actual:
+#   antes:   PRIMARY KEY (date, "userId") + índices sueltos sobre date y "userId"
+#   después: PRIMARY KEY ("userId", date) INCLUDE (valor)
+# Mide la velocidad de inserción y muestra los planes de las consultas del dashboard y del historial.
+#
+# Uso: python -m benchmarks.bench_indexes --users 200 --rows-per-user 2000
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from time import perf_counter
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, PrimaryKeyConstraint, Table, insert, text
+from main.database import engine
+
+SCHEMA = "bench_indexes"
+
+
+def _layouts(metadata):
+    before = Table(
+        "weights_before", metadata,
+        Column("date", DateTime, nullable=False),
+        Column("userId", Integer, nullable=False),
+        Column("weight", Float, nullable=False),
+        PrimaryKeyConstraint("date", "userId"),
+        Index("ix_before_date", "date"),
+        Index("ix_before_userId", "userId"),
+        schema=SCHEMA,
+    )
+    after = Table(
+        "weights_after", metadata,
+        Column("date", DateTime, nullable=False),
+        Column("userId", Integer, nullable=False),
+        Column("weight", Float, nullable=False),
+        PrimaryKeyConstraint("userId", "date"),
+        schema=SCHEMA,
+    )
+    return before, after
+
+
+def _rows(users: int, rows_per_user: int):
+    start = datetime(2025, 1, 1)
+    rows = [
+        {"date": start + timedelta(minutes=15 * i), "userId": user_id, "weight": 60 + random.random() * 30}
+        for user_id in range(1, users + 1)
+        for i in range(rows_per_user)
+    ]
+    # Las importaciones llegan mezcladas entre usuarios
+    random.shuffle(rows)
+    return rows
+
+
+def _insert(connection, table, rows, batch_size):
+    started = perf_counter()
+    for i in range(0, len(rows), batch_size):
+        connection.execute(insert(table).values(rows[i:i + batch_size]))
+    return len(rows) / (perf_counter() - started)
+
+
+def _explain(connection, table, user_id, since):
+    queries = {
+        "latest": f'SELECT weight FROM {SCHEMA}."{table.name}" WHERE "userId" = :user_id ORDER BY date DESC LIMIT 1',
+        "range": f'SELECT date, weight FROM {SCHEMA}."{table.name}" WHERE "userId" = :user_id AND date >= :since ORDER BY date',
+    }
+    plans = {}
+    for name, query in queries.items():
+        plan = connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}"), {"user_id": user_id, "since": since}).scalars().all()
+        plans[name] = plan
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el diseño de índices anterior y actual de las tablas de sensores")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rows-per-user", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    metadata = MetaData()
+    before, after = _layouts(metadata)
+    rows = _rows(args.users, args.rows_per_user)
+    since = datetime(2025, 1, 1) + timedelta(minutes=15 * args.rows_per_user) - timedelta(days=30)
+    results = {"users": args.users, "rows": len(rows), "layouts": {}}
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        metadata.create_all(connection)
+        # El diseño actual incluye el valor en la clave primaria, como la migración 0003
+        connection.execute(text(f'ALTER TABLE {SCHEMA}.weights_after DROP CONSTRAINT weights_after_pkey'))
+        connection.execute(text(f'ALTER TABLE {SCHEMA}.weights_after ADD PRIMARY KEY ("userId", date) INCLUDE (weight)'))
+
+    try:
+        for name, table in (("before", before), ("after", after)):
+            with engine.begin() as connection:
+                rows_per_second = _insert(connection, table, rows, args.batch_size)
+            # VACUUM actualiza el mapa de visibilidad que permiten los Index Only Scan
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text(f'VACUUM ANALYZE {SCHEMA}."{table.name}"'))
+                plans = _explain(connection, table, random.randint(1, args.users), since)
+            results["layouts"][name] = {"insert_rows_per_second": round(rows_per_second, 1), "plans": plans}
+
+            print(f"=== {name}: {rows_per_second:,.0f} filas/s al insertar")
+            for query, plan in plans.items():
+                print(f"--- {query}")
+                print("\n".join(plan))
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Mide la latencia del dashboard mientras llega una ráfaga de inicios de sesión concurrentes.
+# Con bcrypt fuera del event loop el p99 del dashboard debe mantenerse cerca del de reposo;
+# los inicios de sesión que no caben en la cola del pool reciben 503 con Retry-After.
+#
+# Arranca el servidor con uvicorn (hereda las variables de entorno: BCRYPT_ROUNDS, HASH_POOL,
+# HASH_WORKERS, HASH_MAX_PENDING...) salvo que se indique --base-url.
+#
+# Uso: HASH_POOL=process python -m benchmarks.bench_login_burst --logins 200 --output burst.json
+import argparse
+import asyncio
+import os
+import uuid
+from time import perf_counter
+import httpx
+from .common import latency_stats, save_results, server, wait_ready
+
+PASSWORD = "bench-password"
+
+
+async def _register_users(client, count):
+    prefix = f"bench_{uuid.uuid4().hex[:8]}"
+    usernames = []
+    for i in range(count):
+        username = f"{prefix}_{i}"
+        response = await client.post("/register", json={
+            "email": f"{username}@example.com", "username": username, "password": PASSWORD,
+            "weight": 70, "height": 1.7, "birthdate": "1990-01-01", "gender": "MASCULINO",
+        })
+        response.raise_for_status()
+        usernames.append(username)
+    return usernames
+
+
+async def _login(client, username):
+    started = perf_counter()
+    response = await client.post("/login", json={"username": username, "password": PASSWORD})
+    return response.status_code, perf_counter() - started, response
+
+
+# Pide el dashboard en bucle hasta que se active stop; devuelve las latencias
+async def _dashboard_loop(client, token, stop):
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        started = perf_counter()
+        response = await client.get("/dashboard/view", headers=headers)
+        response.raise_for_status()
+        latencies.append(perf_counter() - started)
+    return latencies
+
+
+async def _phase(client, token, concurrency, seconds, burst=None):
+    stop = asyncio.Event()
+    readers = [asyncio.create_task(_dashboard_loop(client, token, stop)) for _ in range(concurrency)]
+    logins = await burst if burst is not None else await asyncio.sleep(seconds)
+    stop.set()
+    latencies = [latency for task in readers for latency in await task]
+    return latencies, logins
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.logins + args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        await wait_ready(client)
+        usernames = await _register_users(client, args.users)
+        _, _, response = await _login(client, usernames[0])
+        token = response.json()["access_token"]
+
+        idle, _ = await _phase(client, token, args.concurrency, args.idle_seconds)
+
+        burst = asyncio.gather(*[_login(client, usernames[i % len(usernames)]) for i in range(args.logins)])
+        started = perf_counter()
+        during, logins = await _phase(client, token, args.concurrency, None, burst)
+        burst_seconds = perf_counter() - started
+
+    statuses = {}
+    for status_code, _, _ in logins:
+        statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+    return {
+        "settings": {key: os.getenv(key) for key in ("BCRYPT_ROUNDS", "HASH_POOL", "HASH_WORKERS", "HASH_MAX_PENDING")},
+        "logins": args.logins,
+        "burst_seconds": round(burst_seconds, 3),
+        "login_statuses": statuses,
+        "login_latency": latency_stats([latency for status_code, latency, _ in logins if status_code == 200]),
+        "dashboard_idle": latency_stats(idle),
+        "dashboard_during_burst": latency_stats(during),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia del dashboard durante una ráfaga de inicios de sesión")
+    parser.add_argument("--base-url", help="Servidor ya arrancado; si se omite se arranca uno con uvicorn")
+    parser.add_argument("--users", type=int, default=10, help="Usuarios de prueba que se registran")
+    parser.add_argument("--logins", type=int, default=200, help="Inicios de sesión simultáneos de la ráfaga")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clientes que piden el dashboard en bucle")
+    parser.add_argument("--idle-seconds", type=float, default=5, help="Duración de la medición sin ráfaga")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    with server(args.base_url) as args.base_url:
+        results = asyncio.run(run(args))
+    save_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
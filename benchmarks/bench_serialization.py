@@ -0,0 +1,85 @@
+# Compara el tiempo de serialización de una respuesta del historial de 10k filas:
+#   - generic: sin response_model, jsonable_encoder + json de la librería estándar (como antes)
+#   - typed:   response_model de schemas.py + ORJSONResponse (validación y serialización en pydantic-core)
+# para los formatos rows y columnar. Las peticiones van por ASGI en proceso, sin red ni base de datos.
+# Requiere httpx.
+#
+# Uso: python -m benchmarks.bench_serialization --rows 10000 --iterations 50 --output serialization.json
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Union
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from main.formats import columnar
+from main.schemas import ErrorResponse, HistoryResponse
+
+LABEL = "Pasos durante el día"
+
+
+def _payloads(rows: int):
+    start = datetime(2025, 1, 1)
+    results = [(start + timedelta(minutes=15 * i), random.randint(0, 500)) for i in range(rows)]
+    return {
+        "rows": {"status": "success", "data": [{"fecha": date, LABEL: value} for date, value in results]},
+        "columnar": {"status": "success", "data": columnar(results, LABEL)},
+    }
+
+
+def _app(payloads, typed: bool):
+    app = FastAPI(default_response_class=ORJSONResponse if typed else JSONResponse)
+    options = {"response_model": Union[HistoryResponse, ErrorResponse]} if typed else {}
+
+    @app.get("/history/{format}", **options)
+    async def history(format: str):
+        return payloads[format]
+
+    return app
+
+
+async def _measure(app, format: str, iterations: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get(f"/history/{format}")
+        response.raise_for_status()
+        started = perf_counter()
+        for _ in range(iterations):
+            await client.get(f"/history/{format}")
+        elapsed = perf_counter() - started
+    return {"ms_per_response": round(elapsed / iterations * 1000, 2), "bytes": len(response.content)}
+
+
+async def run(args):
+    payloads = _payloads(args.rows)
+    results = {}
+    for format in payloads:
+        generic = await _measure(_app(payloads, typed=False), format, args.iterations)
+        typed = await _measure(_app(payloads, typed=True), format, args.iterations)
+        results[format] = {
+            "generic": generic,
+            "typed": typed,
+            "speedup": round(generic["ms_per_response"] / typed["ms_per_response"], 2),
+        }
+    return {"rows": args.rows, "iterations": args.iterations, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de serialización de las respuestas del historial")
+    parser.add_argument("--rows", type=int, default=10000, help="Filas por respuesta")
+    parser.add_argument("--iterations", type=int, default=50, help="Respuestas medidas por combinación")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Utilidades compartidas por los benchmarks que hablan con un servidor HTTP
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Optional
+import httpx
+import numpy as np
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Latencias en segundos -> número de peticiones, percentiles en ms y, si se da la duración, rendimiento
+def latency_stats(latencies, elapsed: Optional[float] = None, errors: int = 0):
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    values = np.array(latencies) * 1000
+    stats = {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+    if elapsed:
+        stats["throughput_rps"] = round(len(values) / elapsed, 1)
+    return stats
+
+
+async def wait_ready(client, timeout=30):
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        try:
+            await client.get("/cache/stats")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+# Arranca uvicorn con main.main:app si no se indica base_url (hereda las variables de entorno)
+# y devuelve la URL base
+@contextmanager
+def server(base_url: Optional[str] = None):
+    if base_url:
+        yield base_url
+        return
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main.main:app", "--port", str(port),
+                                "--log-level", "warning"])
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def save_results(results, output: Optional[str]):
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
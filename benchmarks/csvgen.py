@@ -0,0 +1,57 @@
+# Genera CSV de importación sintéticos con el formato que espera /import-data: cabecera con los
+# nombres en español de IMPORT_MAPPINGS y una fila cada --step-seconds segundos desde --start.
+# Se escriben por bloques, así que 1M de filas no necesita tenerlas en memoria.
+#
+# Uso: python -m benchmarks.csvgen daily_steps 1000000 steps_1m.csv --start 2024-01-01
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from main.importer import IMPORT_MAPPINGS
+
+EXERCISE_NAMES = np.array(["Correr", "Nadar", "Bicicleta", "Pesas"])
+
+# Columna del CSV -> valores aleatorios para n filas
+CSV_VALUES = {
+    "peso": lambda rng, n: np.round(60 + rng.random(n) * 30, 1),
+    "altura": lambda rng, n: np.round(1.5 + rng.random(n) * 0.4, 2),
+    "grasa": lambda rng, n: np.round(15 + rng.random(n) * 15, 1),
+    "musculo": lambda rng, n: np.round(30 + rng.random(n) * 15, 1),
+    "agua": lambda rng, n: np.round(45 + rng.random(n) * 15, 1),
+    "porcentajeGrasa": lambda rng, n: np.round(15 + rng.random(n) * 15, 1),
+    "vasosDeAgua": lambda rng, n: rng.integers(1, 4, n),
+    "cantidadPasos": lambda rng, n: rng.integers(0, 1500, n),
+    "nombreEjercicio": lambda rng, n: EXERCISE_NAMES[rng.integers(0, len(EXERCISE_NAMES), n)],
+    "duracion": lambda rng, n: rng.integers(10, 70, n),
+}
+
+
+def generate_csv(path: str, data_type: str, rows: int, start: datetime = datetime(2024, 1, 1),
+                 step_seconds: int = 60, chunk_size: int = 100000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    columns = list(IMPORT_MAPPINGS[data_type]["columns"])
+    with open(path, "w", newline="") as f:
+        f.write(",".join(["fecha", *columns]) + "\n")
+        for offset in range(0, rows, chunk_size):
+            n = min(chunk_size, rows - offset)
+            dates = pd.Timestamp(start) + pd.to_timedelta(np.arange(offset, offset + n) * step_seconds, unit="s")
+            frame = pd.DataFrame({"fecha": dates.strftime("%Y-%m-%d %H:%M:%S"),
+                                  **{column: CSV_VALUES[column](rng, n) for column in columns}})
+            frame.to_csv(f, header=False, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV sintéticos para /import-data")
+    parser.add_argument("data_type", choices=list(IMPORT_MAPPINGS))
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=datetime(2024, 1, 1), help="Fecha de la primera fila")
+    parser.add_argument("--step-seconds", type=int, default=60, help="Segundos entre filas consecutivas")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los valores aleatorios")
+    args = parser.parse_args()
+    generate_csv(args.path, args.data_type, args.rows, args.start, args.step_seconds, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Siembra la base de datos configurada en el .env con usuarios sintéticos y --years años de datos
+# en los siete modelos de sensores, con la frecuencia de un dispositivo real (pasos cada hora, agua
+# cada dos horas, peso y ejercicio diarios, composición corporal semanal, altura mensual). Crea las
+# particiones que hagan falta y reconstruye los resúmenes. Todos los usuarios comparten la
+# contraseña PASSWORD; el resultado (prefijo, usuarios, filas) se guarda en --output para
+# reutilizarlo con benchmarks.suite --seed y para borrar los datos después.
+#
+# Uso: python -m benchmarks.seed create --users 50 --years 1 --output seed.json
+#      python -m benchmarks.seed cleanup --prefix bench_seed_1a2b3c4d_
+import argparse
+import json
+import uuid
+from datetime import datetime, timedelta
+from time import perf_counter
+from sqlalchemy import select, text
+from main.database import SessionLocal
+from main.hashing import pwd_context
+from main.models import (User, Weight, Height, BodyComposition, BodyFatPercentage, WaterConsumption, DailySteps,
+                         Exercise, MetricRollup, ImportDayHash, ImportWatermark, ImportJobRecord)
+from main.partitions import ensure_partitions
+from main.rollups import ROLLUP_METRICS, refresh_rollups
+
+PASSWORD = "bench-password"
+
+# Modelo -> (intervalo entre mediciones, expresión SQL de cada columna sobre el usuario u y la fecha d)
+SEED_DATA = {
+    Weight: ("1 day", {"weight": "60 + (u.id % 40) + random() * 2"}),
+    Height: ("30 days", {"height": "1.5 + (u.id % 40) / 100.0"}),
+    BodyComposition: ("7 days", {"fat": "15 + random() * 15", "muscle": "30 + random() * 15", "water": "45 + random() * 15"}),
+    BodyFatPercentage: ("7 days", {"fatPercentage": "15 + random() * 15"}),
+    WaterConsumption: ("2 hours", {"waterAmount": "1 + floor(random() * 3)::int"}),
+    DailySteps: ("1 hour", {"stepsAmount": "floor(random() * 1500)::int"}),
+    Exercise: ("1 day", {"exerciseName": "(ARRAY['Correr', 'Nadar', 'Bicicleta', 'Pesas'])[1 + floor(random() * 4)::int]",
+                         "duration": "10 + floor(random() * 60)::int"}),
+}
+
+
+def _user_ids(db, prefix: str):
+    return db.scalars(select(User.id).where(User.username.like(prefix + "%")).order_by(User.id)).all()
+
+
+def seed(users: int, years: float, prefix: str = None):
+    prefix = prefix or f"bench_seed_{uuid.uuid4().hex[:8]}_"
+    end = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=round(365 * years))
+    params = {"prefix": prefix, "pattern": prefix + "%", "start": start, "end": end}
+
+    started = perf_counter()
+    rows = {}
+    with SessionLocal() as db:
+        db.execute(text("""
+            INSERT INTO users (email, username, password, birthdate, gender)
+            SELECT :prefix || i || '@example.com', :prefix || i, :password, DATE '1990-01-01',
+                   (ARRAY['MASCULINO', 'FEMENINO'])[1 + i % 2]::generoenum
+            FROM generate_series(1, :users) i
+        """), {**params, "users": users, "password": pwd_context.hash(PASSWORD)})
+        db.commit()
+
+        for table, (interval, columns) in SEED_DATA.items():
+            name = table.__tablename__
+            ensure_partitions(name, start, end)
+            column_names = ", ".join(f'"{column}"' for column in columns)
+            result = db.execute(text(f"""
+                INSERT INTO "{name}" ("userId", date, {column_names})
+                SELECT u.id, d, {", ".join(columns.values())}
+                FROM users u
+                CROSS JOIN generate_series(CAST(:start AS timestamp), :end, interval '{interval}') d
+                WHERE u.username LIKE :pattern
+            """), params)
+            rows[name] = result.rowcount
+            db.commit()
+
+        # Resúmenes de cada usuario, como después de una importación
+        user_ids = _user_ids(db, prefix)
+        for user_id in user_ids:
+            for table in dict.fromkeys(table for table, _ in ROLLUP_METRICS.values()):
+                refresh_rollups(db, user_id, table, start, end)
+            db.commit()
+
+    return {
+        "prefix": prefix,
+        "password": PASSWORD,
+        "users": [f"{prefix}{i}" for i in range(1, users + 1)],
+        "user_ids": list(user_ids),
+        "years": years,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "rows": rows,
+        "seconds": round(perf_counter() - started, 1),
+    }
+
+
+def cleanup(prefix: str):
+    with SessionLocal() as db:
+        user_ids = select(User.id).where(User.username.like(prefix + "%")).scalar_subquery()
+        for table in [*SEED_DATA, MetricRollup, ImportDayHash, ImportWatermark, ImportJobRecord]:
+            db.execute(table.__table__.delete().where(table.__table__.c.userId.in_(user_ids)))
+        deleted = db.execute(User.__table__.delete().where(User.username.like(prefix + "%"))).rowcount
+        db.commit()
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Datos sintéticos para los benchmarks")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    create_parser = subcommands.add_parser("create", help="Crea usuarios y datos de sensores")
+    create_parser.add_argument("--users", type=int, default=50, help="Usuarios sintéticos")
+    create_parser.add_argument("--years", type=float, default=1, help="Años de datos por usuario")
+    create_parser.add_argument("--prefix", help="Prefijo de los nombres de usuario (por defecto uno aleatorio)")
+    create_parser.add_argument("--output", help="Archivo JSON donde guardar el resultado")
+    cleanup_parser = subcommands.add_parser("cleanup", help="Borra los usuarios con el prefijo y todos sus datos")
+    cleanup_parser.add_argument("--prefix", required=True)
+    args = parser.parse_args()
+
+    if args.command == "create":
+        manifest = seed(args.users, args.years, args.prefix)
+        print(json.dumps({key: value for key, value in manifest.items() if key not in ("users", "user_ids")}, indent=2))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(manifest, f, indent=2)
+    else:
+        print(f"Usuarios borrados: {cleanup(args.prefix)}")
+
+
+if __name__ == "__main__":
+    main()
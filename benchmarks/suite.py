@@ -0,0 +1,248 @@
+# Benchmark completo del servicio: siembra datos sintéticos (o reutiliza los de benchmarks.seed),
+# arranca el servidor y reproduce tráfico contra los endpoints principales:
+#   - login:     POST /login de los usuarios sembrados
+#   - dashboard: GET /dashboard/view
+#   - history:   GET /dashboard/history para cada data_type y cada period
+#   - mixed:     mezcla de las anteriores con los pesos de MIXED_TRAFFIC
+#   - import:    POST /import-data con CSV de --import-rows filas, esperando a que termine el trabajo
+# Para cada escenario da peticiones, errores, rendimiento y latencias p50/p95/p99. Los resultados
+# se guardan en JSON; con --baseline se comparan con una ejecución anterior y se listan las
+# regresiones que superan --tolerance. El servidor hereda las variables de entorno (CACHE_BACKEND=none
+# para medir sin la caché de respuestas, BCRYPT_ROUNDS, DB_POOL_SIZE...). Los usuarios que crea el
+# escenario import se borran al terminar, aunque se use --seed o --keep.
+#
+# Uso: python -m benchmarks.suite --users 50 --years 1 --output run.json
+#      python -m benchmarks.suite --seed seed.json --import-rows 1000,100000,1000000 --baseline run.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import uuid
+from time import perf_counter
+import httpx
+from main.crud import HISTORY_MAPPINGS, HISTORY_PERIODS
+from main.importer import IMPORT_MAPPINGS
+from .common import latency_stats, save_results, server, wait_ready
+from .csvgen import generate_csv
+from .seed import cleanup, seed
+
+HISTORY_DATA_TYPES = [*HISTORY_MAPPINGS, 'exercises']
+SCENARIOS = ["login", "dashboard", "history", "mixed", "import"]
+# Reparto de las peticiones del escenario mixed
+MIXED_TRAFFIC = {"history": 0.6, "dashboard": 0.35, "login": 0.05}
+
+# Métricas que se comparan con la ejecución de referencia: 1 = mayor es mejor, -1 = menor es mejor
+COMPARED_METRICS = {"p50_ms": -1, "p95_ms": -1, "p99_ms": -1, "throughput_rps": 1, "rows_per_second": 1}
+
+
+# Lanza total peticiones con concurrency clientes a la vez; request(i) devuelve la respuesta
+async def _load(request, total: int, concurrency: int):
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = perf_counter()
+            try:
+                response = await request(i)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(perf_counter() - started)
+            else:
+                errors += 1
+
+    started = perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, min(concurrency, total)))])
+    return latency_stats(latencies, perf_counter() - started, errors)
+
+
+class Traffic:
+    def __init__(self, client, manifest, tokens, rng):
+        self.client = client
+        self.manifest = manifest
+        self.tokens = tokens
+        self.rng = rng
+
+    def _headers(self, i):
+        return {"Authorization": f"Bearer {self.tokens[i % len(self.tokens)]}"}
+
+    def login(self, i):
+        users = self.manifest["users"]
+        return self.client.post("/login", json={"username": users[i % len(users)], "password": self.manifest["password"]})
+
+    def dashboard(self, i):
+        return self.client.get("/dashboard/view", headers=self._headers(i))
+
+    def history(self, i, data_type=None, period=None):
+        data_type = data_type or self.rng.choice(HISTORY_DATA_TYPES)
+        period = period or self.rng.choice(list(HISTORY_PERIODS))
+        return self.client.get("/dashboard/history", params={"data_type": data_type, "period": period},
+                               headers=self._headers(i))
+
+    def mixed(self, i):
+        kind = self.rng.choices(list(MIXED_TRAFFIC), weights=list(MIXED_TRAFFIC.values()))[0]
+        return getattr(self, kind)(i)
+
+
+async def _register(client, prefix: str):
+    username = f"{prefix}{uuid.uuid4().hex[:8]}"
+    response = await client.post("/register", json={
+        "email": f"{username}@example.com", "username": username, "password": "bench-password",
+        "weight": 70, "height": 1.7, "birthdate": "1990-01-01", "gender": "MASCULINO",
+    })
+    response.raise_for_status()
+    response = await client.post("/login", json={"username": username, "password": "bench-password"})
+    return username, response.json()["access_token"]
+
+
+# Sube un CSV de rows filas a un usuario nuevo (solo inserciones) y espera a que termine el trabajo
+async def _import(client, data_type: str, rows: int, chunk_size: int, workdir: str, prefix: str):
+    path = generate_csv(os.path.join(workdir, f"{data_type}_{rows}.csv"), data_type, rows)
+    _, token = await _register(client, prefix)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    started = perf_counter()
+    with open(path, "rb") as f:
+        response = await client.post("/import-data", params={"data_type": data_type, "chunk_size": chunk_size},
+                                     files={"file": (os.path.basename(path), f, "text/csv")}, headers=headers)
+    response.raise_for_status()
+    uploaded = perf_counter() - started
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/import-jobs/{job_id}", headers=headers)).json()
+        if job["state"] not in ("queued", "running"):
+            break
+        await asyncio.sleep(0.2)
+    elapsed = perf_counter() - started
+    return {
+        "rows": rows,
+        "state": job["state"],
+        "errors": job["errors"],
+        "upload_seconds": round(uploaded, 3),
+        "total_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1),
+        "job_rows_per_second": job["rows_per_second"],
+    }
+
+
+async def run(args, manifest):
+    rng = random.Random(args.random_seed)
+    scenarios = {}
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=600, limits=limits) as client:
+        await wait_ready(client)
+        tokens = []
+        for username in manifest["users"][:args.token_users]:
+            response = await client.post("/login", json={"username": username, "password": manifest["password"]})
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+        traffic = Traffic(client, manifest, tokens, rng)
+
+        if "login" in args.scenarios:
+            scenarios["login"] = await _load(traffic.login, args.login_requests, args.concurrency)
+        if "dashboard" in args.scenarios:
+            scenarios["dashboard"] = await _load(traffic.dashboard, args.requests, args.concurrency)
+        if "history" in args.scenarios:
+            for data_type in HISTORY_DATA_TYPES:
+                for period in HISTORY_PERIODS:
+                    request = lambda i, data_type=data_type, period=period: traffic.history(i, data_type, period)
+                    scenarios[f"history:{data_type}:{period}"] = await _load(request, args.history_requests, args.concurrency)
+        if "mixed" in args.scenarios:
+            scenarios["mixed"] = await _load(traffic.mixed, args.requests, args.concurrency)
+        if "import" in args.scenarios:
+            with tempfile.TemporaryDirectory() as workdir:
+                for rows in args.import_rows:
+                    scenarios[f"import:{args.import_type}:{rows}"] = await _import(
+                        client, args.import_type, rows, args.import_chunk_size, workdir, args.import_prefix)
+    return scenarios
+
+
+def compare(scenarios, baseline, tolerance: float):
+    comparison, regressions = {}, []
+    for name, stats in scenarios.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            if stats.get(metric) is None or not previous.get(metric):
+                continue
+            change = (stats[metric] - previous[metric]) / previous[metric]
+            comparison.setdefault(name, {})[metric] = {
+                "baseline": previous[metric], "current": stats[metric], "change_pct": round(change * 100, 1),
+            }
+            if change * direction < -tolerance:
+                regressions.append(f"{name} {metric}: {previous[metric]} -> {stats[metric]} ({change * 100:+.1f}%)")
+    return comparison, regressions
+
+
+def _csv_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los endpoints principales")
+    parser.add_argument("--base-url", help="Servidor ya arrancado; si se omite se arranca uno con uvicorn")
+    parser.add_argument("--seed", help="JSON de benchmarks.seed con los usuarios ya sembrados")
+    parser.add_argument("--users", type=int, default=20, help="Usuarios que se siembran si no se da --seed")
+    parser.add_argument("--years", type=float, default=1, help="Años de datos por usuario si no se da --seed")
+    parser.add_argument("--keep", action="store_true", help="No borrar los datos sembrados al terminar")
+    parser.add_argument("--scenarios", type=_csv_list, default=SCENARIOS, help=f"Escenarios separados por comas ({','.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clientes simultáneos")
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones de los escenarios dashboard y mixed")
+    parser.add_argument("--login-requests", type=int, default=50, help="Peticiones del escenario login")
+    parser.add_argument("--history-requests", type=int, default=50, help="Peticiones por cada data_type y period")
+    parser.add_argument("--token-users", type=int, default=20, help="Usuarios sembrados que reparten las peticiones autenticadas")
+    parser.add_argument("--import-type", default="daily_steps", choices=list(IMPORT_MAPPINGS))
+    parser.add_argument("--import-rows", type=lambda value: [int(rows) for rows in _csv_list(value)], default=[1000, 10000, 100000],
+                        help="Tamaños de los CSV importados, separados por comas (hasta 1000000)")
+    parser.add_argument("--import-chunk-size", type=int, default=50000)
+    parser.add_argument("--random-seed", type=int, default=0, help="Semilla del reparto de peticiones")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con la que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Empeoramiento relativo que se considera regresión")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Termina con código 1 si hay regresiones")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    if args.seed:
+        with open(args.seed) as f:
+            manifest = json.load(f)
+    else:
+        manifest = seed(args.users, args.years)
+    # Prefijo propio de la ejecución para no borrar usuarios de import de otra que corra a la vez
+    args.import_prefix = f"bench_import_{uuid.uuid4().hex[:8]}_"
+    try:
+        with server(args.base_url) as args.base_url:
+            scenarios = asyncio.run(run(args, manifest))
+    finally:
+        cleanup(args.import_prefix)
+        if not args.seed and not args.keep:
+            cleanup(manifest["prefix"])
+
+    results = {
+        "settings": {
+            "concurrency": args.concurrency,
+            "users": len(manifest["users"]),
+            "years": manifest["years"],
+            "rows": manifest["rows"],
+            "env": {key: os.getenv(key) for key in ("CACHE_BACKEND", "BCRYPT_ROUNDS", "HASH_POOL", "DB_POOL_SIZE", "IMPORT_WORKERS")},
+        },
+        "scenarios": scenarios,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["comparison"], regressions = compare(scenarios, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+    save_results(results, args.output)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+from datetime import datetime
+from itertools import groupby
+from typing import List, Optional
+from fastapi import Depends, HTTPException
+from sqlalchemy import Float, cast, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .cache import cache
+from .crud import HISTORY_PERIODS, get_current_user
+from .models import MetricRollup, User
+from .rollups import ROLLUP_GRANULARITIES, _bucket_start
+
+# Usuarios (ids separados por comas) que pueden consultar las vistas de cohorte; vacío = nadie
+COACH_USER_IDS = {int(user_id) for user_id in os.getenv("COACH_USER_IDS", "").split(",") if user_id.strip()}
+# Segundos que se guarda cada página de una vista de cohorte. Mezcla datos de muchos usuarios, así
+# que no se invalida con cada importación: puede ir hasta este tiempo por detrás
+COHORT_CACHE_TTL = int(os.getenv("COHORT_CACHE_TTL", "300"))
+COHORT_MAX_PAGE_SIZE = int(os.getenv("COHORT_MAX_PAGE_SIZE", "1000"))
+
+# Cómo se resume cada métrica en un periodo: suma (pasos, agua, minutos de ejercicio) o media
+# de las mediciones (peso, músculo, porcentaje de grasa)
+COHORT_METRICS = {
+    'steps': 'sum',
+    'water_consumption': 'sum',
+    'exercises': 'sum',
+    'weights': 'avg',
+    'muscle': 'avg',
+    'body_fat_percentage': 'avg',
+}
+
+PERCENTILES = [0.25, 0.5, 0.75]
+
+
+async def require_coach(user_id: int = Depends(get_current_user)) -> int:
+    if user_id not in COACH_USER_IDS:
+        raise HTTPException(status_code=403, detail="Solo los entrenadores pueden consultar las cohortes")
+    return user_id
+
+
+def _value(metric: str):
+    if COHORT_METRICS[metric] == 'sum':
+        return MetricRollup.total
+    return MetricRollup.total / cast(MetricRollup.count, Float)
+
+
+# El rango empieza en el periodo que contiene start, igual que los resúmenes
+def _filters(metric: str, granularity: str, start: datetime):
+    return (
+        MetricRollup.metric == metric,
+        MetricRollup.granularity == granularity,
+        MetricRollup.bucket >= _bucket_start(granularity, start),
+    )
+
+
+# Distribución de la cohorte en cada periodo: una sola consulta agrupada por periodo
+def _summary_query(metric: str, granularity: str, start: datetime):
+    value = _value(metric)
+    return (
+        select(
+            MetricRollup.bucket, func.count(), func.avg(value),
+            *[func.percentile_cont(p).within_group(value) for p in PERCENTILES],
+        )
+        .where(*_filters(metric, granularity, start))
+        .group_by(MetricRollup.bucket)
+        .order_by(MetricRollup.bucket)
+    )
+
+
+# Página de usuarios con datos de la métrica, por keyset sobre users.id. Cada usuario se comprueba
+# con la clave primaria de metricRollups: el coste no depende del tamaño de la cohorte
+def _page_query(metric: str, granularity: str, start: datetime, after: Optional[int], limit: int):
+    page = (
+        select(User.id)
+        .where(exists().where(MetricRollup.userId == User.id, *_filters(metric, granularity, start)))
+        .order_by(User.id)
+        .limit(limit)
+    )
+    if after is not None:
+        page = page.where(User.id > after)
+    return page
+
+
+# Serie de cada usuario de la página con el cambio respecto al periodo anterior (lag) y la
+# tendencia (pendiente por día de la recta de regresión)
+def _users_query(metric: str, granularity: str, start: datetime, user_ids: List[int]):
+    value = _value(metric)
+    per_user = {"partition_by": MetricRollup.userId}
+    days = func.extract('epoch', MetricRollup.bucket) / 86400
+    return (
+        select(
+            MetricRollup.userId, MetricRollup.bucket, value,
+            value - func.lag(value).over(order_by=MetricRollup.bucket, **per_user),
+            func.regr_slope(value, days).over(**per_user),
+        )
+        # El rango deja que la página se lea como un tramo contiguo del índice de cohortes
+        .where(MetricRollup.userId.between(user_ids[0], user_ids[-1]), MetricRollup.userId.in_(user_ids),
+               *_filters(metric, granularity, start))
+        .order_by(MetricRollup.userId, MetricRollup.bucket)
+    )
+
+
+def _round(value):
+    return round(float(value), 4) if value is not None else None
+
+
+# Vista de cohorte de una métrica: distribución por periodo de todos los usuarios y una página
+# de series por usuario. cursor es el último userId de la página anterior (next_cursor)
+async def get_cohort_view(db: AsyncSession, metric: str, period: str, granularity: str = 'week',
+                          cursor: Optional[int] = None, limit: int = 100):
+    if metric not in COHORT_METRICS:
+        return {"status": "error", "message": "Invalid metric"}
+    if period not in HISTORY_PERIODS:
+        return {"status": "error", "message": "Invalid period"}
+    if granularity not in ROLLUP_GRANULARITIES:
+        return {"status": "error", "message": "Invalid granularity"}
+    if not 1 <= limit <= COHORT_MAX_PAGE_SIZE:
+        return {"status": "error", "message": f"limit debe estar entre 1 y {COHORT_MAX_PAGE_SIZE}"}
+
+    # El rango es relativo a hoy: la fecha va en las claves para que no sirvan pasado el día
+    today = datetime.today()
+    key = f"cohort:{metric}:{period}:{granularity}:{today.date()}:{cursor}:{limit}"
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    start = today - HISTORY_PERIODS[period]
+    # Las filas se leen por la conexión (Core): sin la carga de resultados del ORM, que en una
+    # página de cientos de usuarios es la mayor parte del tiempo
+    connection = await db.connection()
+
+    # El resumen es el mismo para todas las páginas: se guarda aparte
+    summary_key = f"cohort:{metric}:{period}:{granularity}:{today.date()}:summary"
+    summary = cache.get(summary_key)
+    if summary is None:
+        summary = [
+            {"bucket": bucket, "users": users, "mean": _round(mean),
+             "p25": _round(p25), "median": _round(median), "p75": _round(p75)}
+            for bucket, users, mean, p25, median, p75 in (await connection.execute(_summary_query(metric, granularity, start))).all()
+        ]
+        cache.set(summary_key, summary, ttl=COHORT_CACHE_TTL)
+
+    user_ids = (await connection.execute(_page_query(metric, granularity, start, cursor, limit))).scalars().all()
+    rows = (await connection.execute(_users_query(metric, granularity, start, user_ids))).all() if user_ids else []
+    users = []
+    for user_id, user_rows in groupby(rows, key=lambda row: row[0]):
+        user_rows = list(user_rows)
+        users.append({
+            "user_id": user_id,
+            "trend_per_day": _round(user_rows[0][4]),
+            # Los valores de cada periodo se devuelven tal cual: redondear decenas de miles de floats
+            # por página costaba más que la propia consulta
+            "buckets": [{"bucket": bucket, "value": value, "change": change} for _, bucket, value, change, _ in user_rows],
+        })
+
+    response = {
+        "status": "success",
+        "metric": metric,
+        "granularity": granularity,
+        "summary": summary,
+        "users": users,
+        # Una página llena puede no ser la última; la siguiente vendrá vacía en ese caso
+        "next_cursor": user_ids[-1] if len(user_ids) == limit else None,
+    }
+    cache.set(key, response, ttl=COHORT_CACHE_TTL)
+    return response
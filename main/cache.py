@@ -0,0 +1,246 @@
+import logging
+import os
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+# Workers del servidor: uvicorn --workers y gunicorn toman su valor por defecto de WEB_CONCURRENCY
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+# La invalidación por generación solo llega a los procesos que comparten la caché: con varios workers
+# y sin Redis, una escritura atendida por uno no invalidaría lo guardado en los demás, así que por
+# defecto no se cachea
+def default_backend(redis_url: Optional[str] = REDIS_URL, workers: int = WEB_CONCURRENCY) -> str:
+    if redis_url:
+        return "redis"
+    return "memory" if workers <= 1 else "none"
+
+
+# Backend de caché: "memory", "redis" o "none". Por defecto redis si hay REDIS_URL, memory con un solo
+# worker y none con varios
+CACHE_BACKEND = os.getenv("CACHE_BACKEND") or default_backend()
+# Segundos que vive una entrada y número máximo de entradas en memoria
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# Segundos tras una escritura del usuario en los que sus lecturas van al primario y no a la réplica
+# (debe cubrir el retraso de la réplica: si no, se guardaría en caché un dato viejo con la generación nueva)
+READ_AFTER_WRITE_SECONDS = int(os.getenv("READ_AFTER_WRITE_SECONDS", "10"))
+
+
+# Interfaz común de los backends de caché
+class CacheBackend:
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+# Caché LRU en memoria del proceso con expiración por entrada
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, default_ttl: int = CACHE_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = monotonic() + ttl if ttl > 0 else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            # Al superar el límite se descartan las entradas usadas hace más tiempo
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Sustituto local de Redis: implementa el subconjunto de la API de redis-py que usa el proyecto
+class LocalRedis:
+    def __init__(self, max_keys: int = CACHE_MAX_ENTRIES):
+        self._store = MemoryCache(max_entries=max_keys, default_ttl=0)
+
+    def get(self, name):
+        return self._store.get(name)
+
+    def set(self, name, value, ex=None, nx=False):
+        if nx and self._store.get(name) is not None:
+            return None
+        self._store.set(name, value, ttl=ex or 0)
+        return True
+
+    def delete(self, *names):
+        self._store.delete(*names)
+
+    def exists(self, *names):
+        return sum(1 for name in names if self._store.get(name) is not None)
+
+    def info(self, section=None):
+        return {"evicted_keys": self._store.evictions}
+
+
+# Caché sobre Redis (o cualquier cliente compatible); los valores se serializan con pickle
+class RedisCache(CacheBackend):
+    def __init__(self, client, default_ttl: int = CACHE_TTL, prefix: str = "cache:"):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl if ttl > 0 else None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def stats(self):
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.client.info("stats").get("evicted_keys"),
+        }
+
+
+# Caché que no guarda nada (CACHE_BACKEND=none)
+class NullCache(CacheBackend):
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+
+# Cliente Redis real si hay REDIS_URL y el paquete está instalado; si no, el sustituto local
+def get_redis_client():
+    if REDIS_URL:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("REDIS_URL está configurado pero el paquete 'redis' no está instalado")
+        return redis.Redis.from_url(REDIS_URL)
+    return LocalRedis()
+
+
+def create_cache(backend: str = CACHE_BACKEND, workers: int = WEB_CONCURRENCY) -> CacheBackend:
+    if workers > 1 and (backend == "memory" or (backend == "redis" and not REDIS_URL)):
+        logger.warning("CACHE_BACKEND=%s con %d workers: cada proceso tiene su propia caché y las escrituras "
+                       "atendidas por otro worker no la invalidan. Configure REDIS_URL o use CACHE_BACKEND=none",
+                       backend, workers)
+    if backend == "memory":
+        return MemoryCache()
+    if backend == "redis":
+        return RedisCache(get_redis_client())
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"CACHE_BACKEND no válido: {backend}")
+
+
+cache = create_cache()
+
+
+# Generación de los datos de un usuario dentro de un ámbito ("dashboard", "profile" o una tabla).
+# Cambia con cada escritura: las claves antiguas dejan de usarse sin tener que buscarlas, y un
+# valor calculado antes de la escritura se guarda bajo una generación que ya nadie consulta
+def _generation(user_id: int, scope: str):
+    key = f"generation:{user_id}:{scope}"
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.set(key, generation, ttl=0)
+    return generation
+
+
+# La clave debe calcularse antes de consultar la base de datos
+def cache_key(user_id: int, scope: str, *params):
+    return ":".join([scope, str(user_id), _generation(user_id, scope), *map(str, params)])
+
+
+# Usuarios con escrituras recientes. Con Redis se comparte entre procesos; con los demás backends
+# (none no guarda nada) se lleva en memoria del proceso
+_recent_writes = cache if isinstance(cache, RedisCache) else MemoryCache(default_ttl=READ_AFTER_WRITE_SECONDS)
+
+
+def wrote_recently(user_id: int) -> bool:
+    return READ_AFTER_WRITE_SECONDS > 0 and _recent_writes.get(f"recent-write:{user_id}") is not None
+
+
+# Invalida todas las entradas de los ámbitos dados para el usuario. Se llama tras cada escritura, así
+# que también marca al usuario para leer del primario durante READ_AFTER_WRITE_SECONDS. Devuelve las
+# generaciones nuevas: si después cambian, es que otra escritura llegó detrás
+def invalidate(user_id: int, *scopes: str):
+    if READ_AFTER_WRITE_SECONDS > 0:
+        _recent_writes.set(f"recent-write:{user_id}", True, ttl=READ_AFTER_WRITE_SECONDS)
+    changed = {scope: uuid.uuid4().hex for scope in scopes}
+    for scope, generation in changed.items():
+        cache.set(f"generation:{user_id}:{scope}", generation, ttl=0)
+    return changed
+
+
+# Generaciones actuales de varios ámbitos: un valor guardado junto a ellas sigue siendo válido
+# mientras no cambien
+def generations(user_id: int, *scopes: str):
+    return tuple(_generation(user_id, scope) for scope in scopes)
@@ -1,48 +1,63 @@
-from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from datetime import date, datetime, time, timedelta, timezone
+from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import numpy as np
 import pandas as pd
-from sqlalchemy import func
+from sqlalchemy import JSON, Date, DateTime, Float, Integer, cast, func, select, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .models import User, Weight, Height, BodyComposition, BodyFatPercentage, WaterConsumption, DailySteps, Exercise
+from .models import User, Weight, Height, BodyComposition, BodyFatPercentage, WaterConsumption, DailySteps, Exercise, MetricRollup
+from .cache import MemoryCache, cache, cache_key, invalidate
+from .database import read_session
+from .formats import ARROW_MEDIA_TYPE, NDJSON_MEDIA_TYPE, ArrowStreamEncoder, columnar, naive_utc, ndjson_lines, pa
+from .downsampling import BUCKET_SECONDS, auto_bucket, lttb
+from .rollups import ROLLUP_GRANULARITIES, refresh_rollups
+from .partitions import ensure_partitions
+from .hashing import hash_password, verify_password
+from .revocation import revocations
+from .importer import IMPORT_MAPPINGS, DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, parse_csv, parse_bulk, upsert_frame, import_stats, ErrorReport
+from .sync import SYNC_MODES, DeltaSync
+from .derived import DERIVED_STREAKS, derived_frame, mark_dirty
+import base64
+import binascii
+import hashlib
 import jwt
-from passlib.context import CryptContext
+import orjson
+import uuid
 from fastapi.security import OAuth2PasswordBearer
-from typing import Set
+from typing import BinaryIO, Callable, Optional
+import logging
+import os
+from time import perf_counter
 from config import SECRET_KEY  
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-
-# Mantener una lista negra de tokens en memoria
-blacklist: Set[str] = set()
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-# Configuración para el hash de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Hash de la contraseña
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
 
-# Verificar contraseña
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Tokens ya verificados en este proceso -> (user_id, jti). AUTH_CACHE_MAX_ENTRIES=0 la desactiva
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+verified_tokens = MemoryCache(max_entries=AUTH_CACHE_MAX_ENTRIES, default_ttl=0)
 
-# Función para generar un token JWT
+# Función para generar un token JWT; el jti identifica el token al revocarlo en el logout
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=30)):
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
 # Función para registrar un usuario
-def register_user(db: Session, request):
+async def register_user(db: AsyncSession, request):
     # Verificar si el correo electrónico o el nombre de usuario ya existen
-    existing_user = db.query(User).filter((User.email == request.email) | (User.username == request.username)).first()
+    existing_user = await db.scalar(select(User).where((User.email == request.email) | (User.username == request.username)).limit(1))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email o nombre de usuario ya está registrado")
 
-    hashed_password = get_password_hash(request.password)
+    # El hash se calcula en el pool de bcrypt, fuera del event loop
+    hashed_password = await hash_password(request.password)
 
     new_user = User(
         email=request.email,
@@ -54,82 +69,119 @@ def register_user(db: Session, request):
     
     # Agregar y confirmar usuario
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # Registrar el peso y altura inicial del usuario
-    db_weight = Weight(userId=new_user.id, date=datetime.utcnow(), weight=request.weight)
-    db_height = Height(userId=new_user.id, date=datetime.utcnow(), height=request.height)
+    registered_at = datetime.utcnow()
+    for table in (Weight, Height):
+        await run_in_threadpool(ensure_partitions, table.__tablename__, registered_at, registered_at)
+    db_weight = Weight(userId=new_user.id, date=registered_at, weight=request.weight)
+    db_height = Height(userId=new_user.id, date=registered_at, height=request.height)
     
     db.add(db_weight)
     db.add(db_height)
-    db.commit()
+    await db.flush()
+    await db.run_sync(refresh_rollups, new_user.id, Weight, registered_at, registered_at)
+    await db.commit()
+    invalidate(new_user.id, "dashboard", Weight.__tablename__, Height.__tablename__)
 
     return {"status": "success", "message": "User registered successfully"}
 
 # Función para iniciar sesión
-def login_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if user and verify_password(password, user.password):
+async def login_user(db: AsyncSession, username: str, password: str):
+    user = await db.scalar(select(User).where(User.username == username).limit(1))
+    # Devuelve la conexión al pool antes de esperar a bcrypt, para no acapararla durante el hash
+    await db.commit()
+    valid, new_hash = await verify_password(password, user.password) if user else (False, None)
+    if valid:
+        # Si cambió el coste de bcrypt, se guarda el hash rehecho con el coste actual
+        if new_hash:
+            user.password = new_hash
+            await db.commit()
         # Crear un token JWT para el usuario
         access_token = create_access_token(data={"user_id": user.id})
         return {"access_token": access_token, "token_type": "bearer"}
     raise HTTPException(status_code=400, detail="Incorrect username or password")
 
 
+# Identificador del token para la lista de revocados; los tokens emitidos antes de añadir el
+# claim jti se identifican por su hash
+def _token_id(payload: dict, token: str):
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+def _unauthorized(detail: str):
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 # Dependencia para obtener el usuario actual a partir del token JWT
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    if token in blacklist:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    # Un token ya verificado en este proceso no se vuelve a decodificar ni a comprobar su firma;
+    # la entrada caduca a la vez que el token
+    verified = verified_tokens.get(token)
+    if verified is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        except jwt.ExpiredSignatureError:
+            raise _unauthorized("Token has expired")
+        except jwt.InvalidTokenError:
+            raise _unauthorized("Invalid token")
+        if payload.get("user_id") is None:
+            raise _unauthorized("Invalid authentication credentials")
+        verified = (payload["user_id"], _token_id(payload, token))
+        remaining = payload.get("exp", 0) - datetime.now(timezone.utc).timestamp()
+        if remaining > 0:
+            verified_tokens.set(token, verified, ttl=remaining)
+
+    # La revocación se comprueba siempre. La caché local responde casi siempre; solo si no sabe
+    # se consulta el almacén compartido
+    user_id, jti = verified
+    revoked = revocations.cached(jti)
+    if revoked is None:
+        revoked = await run_in_threadpool(revocations.is_revoked, jti)
+    if revoked:
+        raise _unauthorized("Invalid authentication credentials")
+    return user_id
+
+# Función para cerrar sesión: revoca el token hasta que expire. Un token inválido o ya expirado
+# no sirve para autenticarse, así que no hace falta guardarlo
+async def logout_user(db: AsyncSession, token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id: int = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user_id
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
     except jwt.InvalidTokenError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-# Función para cerrar sesión
-def logout_user(db: Session, token: str):
-    blacklist.add(token)
+        payload = None
+    if payload is not None:
+        await run_in_threadpool(revocations.revoke, _token_id(payload, token), payload["exp"])
+    verified_tokens.delete(token)
     return {"status": "success", "message": "Logout successful"}
 
 
-def get_user_profile(db: Session, user_id: int):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user_profile(db: AsyncSession, user_id: int):
+    key = cache_key(user_id, "profile")
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     # Devolver solo los campos necesarios
-    return {
+    profile = {
         "id": user.id,
         "email": user.email,
         "username": user.username,
         "birthdate": user.birthdate,
         "gender": user.gender.name
     }
+    cache.set(key, profile)
+    return profile
 
 
-def update_user_profile(db: Session, user_id: int, request):
-    user = db.query(User).filter(User.id == user_id).first()
+async def update_user_profile(db: AsyncSession, user_id: int, request):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -138,225 +190,519 @@ def update_user_profile(db: Session, user_id: int, request):
         if value is not None:
             # Si la clave es 'password', entonces hashearla antes de guardar
             if key == "password":
-                hashed_password = get_password_hash(value)
+                hashed_password = await hash_password(value)
                 setattr(user, key, hashed_password)
             else:
                 setattr(user, key, value)
 
-    db.commit()
+    await db.commit()
+    invalidate(user_id, "profile")
     return {"status": "success", "message": "Profile updated successfully"}
 
-def import_sensor_data(db: Session, user_id: int, data_type: str, file: UploadFile):
+# Escribe las filas de un tipo de datos y actualiza sus resúmenes; no confirma la transacción
+def _write_frame(db: Session, user_id: int, data_type: str, frame: pd.DataFrame, batch_size: int):
+    if not len(frame):
+        return 0, 0
+    table = IMPORT_MAPPINGS[data_type]["table"]
+    start, end = frame["date"].min(), frame["date"].max()
+    # Crea antes de escribir las particiones de los meses que cubren las filas
+    ensure_partitions(table.__tablename__, start, end)
+    inserted, updated = upsert_frame(db, data_type, frame, batch_size)
+    # Actualiza los resúmenes solo de los días afectados
+    refresh_rollups(db, user_id, table, start, end)
+    return inserted, updated
+
+def import_sensor_data(db: Session, user_id: int, data_type: str, file: BinaryIO, batch_size: int = DEFAULT_BATCH_SIZE,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, on_progress: Optional[Callable[[int, int], None]] = None,
+                       sync: str = "full"):
+    if data_type not in IMPORT_MAPPINGS:
+        raise HTTPException(status_code=400, detail="Tipo de datos no válido para importación")
+    if batch_size < 1 or chunk_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size y chunk_size deben ser mayores que 0")
+    if sync not in SYNC_MODES:
+        raise HTTPException(status_code=400, detail=f"sync debe ser uno de: {', '.join(SYNC_MODES)}")
     try:
-        # Leer el archivo CSV y eliminar espacios iniciales
-        df = pd.read_csv(file.file, delimiter=',', skipinitialspace=True)
-        
-        # Eliminar espacios en los nombres de las columnas
-        df.columns = df.columns.str.strip().astype(str).str.replace(';+', '', regex=True)
-        
-        # Identificar la última columna
-        last_column = df.columns[-1]
-        
-        # Limpiar los valores en la última columna para eliminar `;;;` y convertir a numérico si es posible
-        df[last_column] = df[last_column].astype(str).str.replace(';+', '', regex=True)
-        print(df.head())
-
-        # Insertar los datos dependiendo del tipo
-        if data_type == 'weights':
-            for _, row in df.iterrows():
-                new_weight = Weight(
-                    date=row['fecha'],
-                    userId=user_id,
-                    weight=row['peso']
-                )
-                db.merge(new_weight)
-        elif data_type == 'heights':
-            for _, row in df.iterrows():
-                new_height = Height(
-                    date=row['fecha'],
-                    userId=user_id,
-                    height=row['altura']
-                )
-                db.merge(new_height)
-        elif data_type == 'body_composition':
-            for _, row in df.iterrows():
-                new_body_composition = BodyComposition(
-                    date=row['fecha'],
-                    userId=user_id,
-                    fat=row['grasa'],
-                    muscle=row['musculo'],
-                    water=row['agua']
-                )
-                db.merge(new_body_composition)
-        elif data_type == 'body_fat_percentage':
-            for _, row in df.iterrows():
-                new_body_fat = BodyFatPercentage(
-                    date=row['fecha'],
-                    userId=user_id,
-                    fatPercentage=row['porcentajeGrasa']
-                )
-                db.merge(new_body_fat)
-        elif data_type == 'water_consumption':
-            for _, row in df.iterrows():
-                new_water_consumption = WaterConsumption(
-                    date=row['fecha'],
-                    userId=user_id,
-                    waterAmount=row['vasosDeAgua']
-                )
-                db.merge(new_water_consumption)
-        elif data_type == 'daily_steps':
-            for _, row in df.iterrows():
-                new_daily_steps = DailySteps(
-                    date=row['fecha'],
-                    userId=user_id,
-                    stepsAmount=row['cantidadPasos']
-                )
-                db.merge(new_daily_steps)
-        elif data_type == 'exercises':
-            for _, row in df.iterrows():
-                new_exercise = Exercise(
-                    date=row['fecha'],
-                    userId=user_id,
-                    exerciseName=row['nombreEjercicio'],
-                    duration=row['duracion']
-                )
-                db.merge(new_exercise)
-        else:
-            raise HTTPException(status_code=400, detail="Tipo de datos no válido para importación")
+        started = perf_counter()
+        inserted = updated = rows = chunks = 0
+        first_date = None
+        delta = DeltaSync(db, user_id, data_type, sync)
+
+        # En modo hash una primera pasada calcula la huella de cada día del archivo completo:
+        # un mismo día puede repartirse entre varios bloques
+        if sync == "hash":
+            for block in parse_csv(file, user_id, [data_type], chunk_size):
+                delta.scan(block.frames[data_type])
+            file.seek(0)
+        delta.prepare()
+
+        # Leer, limpiar, validar y escribir el CSV bloque a bloque; la memoria no crece con el archivo.
+        # Las filas inválidas no se escriben y se devuelven en el informe de errores
+        report = ErrorReport()
+        for block in parse_csv(file, user_id, [data_type], chunk_size):
+            report.add(block)
+            frame = delta.filter(block.frames[data_type])
+            if not frame.empty:
+                chunk_inserted, chunk_updated = _write_frame(db, user_id, data_type, frame, batch_size)
+                inserted += chunk_inserted
+                updated += chunk_updated
+                delta.written(frame)
+                first_date = min(first_date, frame["date"].min()) if first_date is not None else frame["date"].min()
+            rows += block.rows
+            chunks += 1
+
+            logger.info("Importación %s usuario %s: %d filas leídas (%d bloques)", data_type, user_id, rows, chunks)
+            if on_progress:
+                on_progress(rows, chunks)
+
+        delta.finish()
+        db.commit()
+        if inserted or updated:
+            mark_dirty(user_id, {IMPORT_MAPPINGS[data_type]["table"]: first_date}, "dashboard")
+        return {"status": "success", "message": "Data imported successfully", "chunks": chunks, "sync": sync,
+                **import_stats(inserted, updated, started, delta.skipped), **report.summary()}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Importación masiva: un archivo con varias métricas (zip de CSV, Excel con varias hojas o CSV con
+# secciones). Las secciones se leen en paralelo y todas las métricas se escriben en una transacción
+def import_bulk_data(db: Session, user_id: int, file: BinaryIO, batch_size: int = DEFAULT_BATCH_SIZE,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, on_progress: Optional[Callable[[int, int], None]] = None,
+                     sync: str = "full"):
+    if batch_size < 1 or chunk_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size y chunk_size deben ser mayores que 0")
+    if sync not in SYNC_MODES:
+        raise HTTPException(status_code=400, detail=f"sync debe ser uno de: {', '.join(SYNC_MODES)}")
+    try:
+        started = perf_counter()
+        frames, sections, report = parse_bulk(file, user_id, chunk_size)
+
+        inserted = updated = skipped = rows = 0
+        data_types, first_dates = {}, {}
+        for data_type in sorted(frames):
+            delta = DeltaSync(db, user_id, data_type, sync)
+            # Las filas de cada métrica ya están en memoria: la huella diaria sale de una sola pasada
+            if sync == "hash":
+                delta.scan(frames[data_type])
+            delta.prepare()
+            frame = delta.filter(frames[data_type])
+            type_inserted = type_updated = 0
+            if not frame.empty:
+                type_inserted, type_updated = _write_frame(db, user_id, data_type, frame, batch_size)
+                delta.written(frame)
+                first_dates[data_type] = frame["date"].min()
+            delta.finish()
+            data_types[data_type] = {"rows": type_inserted + type_updated, "inserted": type_inserted,
+                                     "updated": type_updated, "skipped": delta.skipped}
+            inserted += type_inserted
+            updated += type_updated
+            skipped += delta.skipped
+            rows += len(frames[data_type])
+
+            logger.info("Importación masiva usuario %s: %s (%d filas)", user_id, data_type, len(frames[data_type]))
+            if on_progress:
+                on_progress(rows, len(data_types))
 
         db.commit()
-        return {"status": "success", "message": "Data imported successfully"}
+        mark_dirty(user_id, {IMPORT_MAPPINGS[data_type]["table"]: first_date for data_type, first_date in first_dates.items()
+                             if data_types[data_type]["rows"]}, "dashboard")
+        return {"status": "success", "message": "Data imported successfully", "sync": sync, "sections": sections,
+                "data_types": data_types, **import_stats(inserted, updated, started, skipped), **report.summary()}
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+# Inicio del día de hoy y de mañana, para filtrar por rango y aprovechar el índice (userId, date)
+def _today_range():
+    today = datetime.combine(datetime.today().date(), time.min)
+    return today, today + timedelta(days=1)
+
+
+# Subconsulta lateral con la fila más reciente de la tabla para el usuario
+def _latest(table, *columns):
+    return select(*columns).where(table.userId == User.id).order_by(table.date.desc()).limit(1).lateral()
+
+
+# Total de hoy de una métrica a partir de su resumen diario
+def _today_rollup(metric: str, today: datetime):
+    return select(cast(MetricRollup.total, Integer)).where(
+        MetricRollup.userId == User.id,
+        MetricRollup.metric == metric,
+        MetricRollup.granularity == 'day',
+        MetricRollup.bucket == today.date()
+    ).scalar_subquery()
+
+
 # Dash
-def get_dashboard_view(db: Session, user_id: int):
+async def get_dashboard_view(db: AsyncSession, user_id: int):
+    today, tomorrow = _today_range()
+    # Los totales son los de hoy: la fecha va en la clave para que a medianoche no se sirvan los de ayer
+    key = cache_key(user_id, "dashboard", today.date())
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        # Peso Actual
-        weight = db.query(Weight).filter(Weight.userId == user_id).order_by(Weight.date.desc()).first()
-        # Altura Actual
-        height = db.query(Height).filter(Height.userId == user_id).order_by(Height.date.desc()).first()
-        # Composición Corporal Actual
-        body_composition = db.query(BodyComposition).filter(BodyComposition.userId == user_id).order_by(BodyComposition.date.desc()).first()
-        # Porcentaje de Grasa Corporal
-        body_fat = db.query(BodyFatPercentage).filter(BodyFatPercentage.userId == user_id).order_by(BodyFatPercentage.date.desc()).first()
-        # Consumo de Agua Hoy
-        water_consumption = db.query(func.sum(WaterConsumption.waterAmount)).filter(
-            WaterConsumption.userId == user_id,
-            func.date(WaterConsumption.date) == func.current_date()
-        ).scalar()
-        # Pasos Dados Hoy
-        daily_steps = db.query(func.sum(DailySteps.stepsAmount)).filter(
-            DailySteps.userId == user_id,
-            func.date(DailySteps.date) == func.current_date()
-        ).scalar()
-        # Ejercicios Realizados Hoy
-        exercises = db.query(Exercise).filter(
-            Exercise.userId == user_id,
-            func.date(Exercise.date) == func.current_date()
-        ).all()
 
-        return {
+        # Peso, altura, composición corporal y porcentaje de grasa actuales
+        weight = _latest(Weight, Weight.weight)
+        height = _latest(Height, Height.height)
+        body_composition = _latest(BodyComposition, BodyComposition.fat, BodyComposition.muscle, BodyComposition.water)
+        body_fat = _latest(BodyFatPercentage, BodyFatPercentage.fatPercentage)
+        # Consumo de Agua y Pasos Dados Hoy, leídos del resumen diario
+        water_consumption = _today_rollup('water_consumption', today)
+        daily_steps = _today_rollup('steps', today)
+        # Ejercicios Realizados Hoy, agregados como JSON en la misma consulta
+        exercises = select(func.json_agg(aggregate_order_by(
+            func.json_build_object("name", Exercise.exerciseName, "duration", Exercise.duration), Exercise.date
+        ), type_=JSON)).where(
+            Exercise.userId == User.id,
+            Exercise.date >= today,
+            Exercise.date < tomorrow
+        ).scalar_subquery()
+
+        # Una sola consulta (un solo viaje a la base de datos) para todo el dashboard
+        query = select(
+            weight.c.weight,
+            height.c.height,
+            body_composition.c.fat,
+            body_composition.c.muscle,
+            body_composition.c.water,
+            body_fat.c.fatPercentage,
+            water_consumption.label("water_consumption"),
+            daily_steps.label("daily_steps"),
+            exercises.label("exercises"),
+        ).select_from(User) \
+            .outerjoin(weight, true()) \
+            .outerjoin(height, true()) \
+            .outerjoin(body_composition, true()) \
+            .outerjoin(body_fat, true()) \
+            .where(User.id == user_id)
+        row = (await db.execute(query)).first()
+        values = row._mapping if row else {}
+
+        response = {
             "status": "success",
             "data": {
-                "weight": weight.weight if weight else None,
-                "height": height.height if height else None,
+                "weight": values.get("weight"),
+                "height": values.get("height"),
                 "body_composition": {
-                    "fat": body_composition.fat if body_composition else None,
-                    "muscle": body_composition.muscle if body_composition else None,
-                    "water": body_composition.water if body_composition else None,
+                    "fat": values.get("fat"),
+                    "muscle": values.get("muscle"),
+                    "water": values.get("water"),
                 },
-                "body_fat_percentage": body_fat.fatPercentage if body_fat else None,
-                "water_consumption_today": water_consumption if water_consumption else 0,
-                "daily_steps": daily_steps if daily_steps else 0,
-                "exercises_today": [{"name": e.exerciseName, "duration": e.duration} for e in exercises]
+                "body_fat_percentage": values.get("fatPercentage"),
+                "water_consumption_today": values.get("water_consumption") or 0,
+                "daily_steps": values.get("daily_steps") or 0,
+                "exercises_today": values.get("exercises") or []
             }
         }
+        cache.set(key, response)
+        return response
     except Exception as e:
         return {
             "status": "error",
             "message": str(e)
         }
     
-def add_dummy_user(db: Session):
+async def add_dummy_user(db: AsyncSession):
     try:
         dummy_user = User(
             email="dummyuser@example.com",
             username="dummyuser",
             password="olman123", 
-            birthdate="2000-01-01",
+            birthdate=date(2000, 1, 1),
             gender="MASCULINO"
         )
-        db.merge(dummy_user)
-        db.commit()
+        await db.merge(dummy_user)
+        await db.commit()
         return {"status": "success", "message": "Dummy user added successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 
+# Mapea el data_type del historial a la tabla correspondiente y a la agregación por defecto
+# (los pasos y el agua se suman; el peso, el músculo y la grasa se promedian)
+HISTORY_MAPPINGS = {
+    'weights': {"table":Weight, "column":"weight", "label":"Peso (kg)", "agg": "avg"},
+    'muscle': {"table":BodyComposition, "column":"muscle", "label":"Músculo", "agg": "avg"}, #Pero a la columna Muscle
+    'body_fat_percentage': {"table":BodyFatPercentage, "column":"fatPercentage", "label":"Porcentaje de grasa corporal (%)", "agg": "avg"},
+    'water_consumption': {"table":WaterConsumption, "column":"waterAmount", "label":"Vasos de agua", "agg": "sum"},
+    'steps': {"table":DailySteps, "column":"stepsAmount", "label":"Pasos durante el día", "agg": "sum"},
+    # 'exercises': {"table":Exercise, "column":"waterAmount", "label":"Vasos de agua"}, 
+    # Tengo que ver que hago con los ejercicios
+}
+
+# Funciones de agregación disponibles al agrupar por intervalos de tiempo
+AGGREGATES = {
+    'sum': func.sum,
+    'avg': lambda column: cast(func.avg(column), Float),
+    'min': func.min,
+    'max': func.max,
+}
+
+# Las mismas agregaciones calculadas sobre los resúmenes
+ROLLUP_AGGREGATES = {
+    'sum': MetricRollup.total,
+    'avg': MetricRollup.total / MetricRollup.count,
+    'min': MetricRollup.minimum,
+    'max': MetricRollup.maximum,
+}
+
+# Resoluciones del historial: sin valor devuelve las filas crudas
+HISTORY_RESOLUTIONS = [*BUCKET_SECONDS, 'auto', 'lttb']
+MAX_HISTORY_POINTS = 10000
+
+
+# Fecha inicial del historial según el período
+HISTORY_PERIODS = {
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'three_months': timedelta(days=90),
+    'six_months': timedelta(days=180),
+    'year': timedelta(days=365),
+}
+
+# Historial crudo paginado: filas por página por defecto y máximo, y filas que se leen a la vez del
+# cursor del servidor
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "1000"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "10000"))
+HISTORY_PAGE_ORDERS = ['asc', 'desc']
+
+# Formatos de respuesta: filas (por defecto), columnas en paralelo, NDJSON en streaming o Arrow IPC
+HISTORY_FORMATS = ['rows', 'columnar', 'ndjson', 'arrow']
+STREAMING_FORMATS = ['ndjson', 'arrow']
+# Filas que se leen del cursor del servidor y se envían por cada bloque en los formatos en streaming
+HISTORY_STREAM_BATCH = 5000
+
+
+# Consulta del historial: (fecha, valor) o, para los ejercicios, (fecha, nombre, duración)
+def _history_query(user_id: int, data_type: str, start_date: datetime, resolution: Optional[str], agg: Optional[str]):
+    if data_type == 'exercises':
+        if resolution in BUCKET_SECONDS:
+            # Duración total de cada ejercicio por intervalo
+            bucket = func.date_trunc(resolution, Exercise.date).label("date")
+            query = select(bucket, Exercise.exerciseName, AGGREGATES[agg or 'sum'](Exercise.duration).label("duration")) \
+                .group_by(bucket, Exercise.exerciseName)
+        else:
+            query = select(Exercise.date, Exercise.exerciseName, Exercise.duration)
+        return query.where(Exercise.userId == user_id, Exercise.date >= start_date) \
+            .order_by(query.selected_columns[0].asc())
+
+    # Selecciona la tabla correspondiente
+    table_info = HISTORY_MAPPINGS[data_type]
+    table = table_info["table"]
+    column = getattr(table, table_info["column"])
+
+    # Consulta SQL: Filtra por user_id y fecha en el rango, y selecciona los valores y fechas
+    if resolution in ROLLUP_GRANULARITIES:
+        # Días, semanas y meses salen de los resúmenes precalculados (el primer intervalo va completo)
+        value = ROLLUP_AGGREGATES[agg or table_info["agg"]]
+        # Los resúmenes se guardan como Float; las métricas enteras se devuelven como enteros
+        if (agg or table_info["agg"]) != 'avg' and column.type.python_type is int:
+            value = cast(value, Integer)
+        return select(cast(MetricRollup.bucket, DateTime).label("date"), value) \
+            .where(MetricRollup.userId == user_id,
+                   MetricRollup.metric == data_type,
+                   MetricRollup.granularity == resolution,
+                   MetricRollup.bucket >= cast(func.date_trunc(resolution, start_date), Date)) \
+            .order_by(MetricRollup.bucket.asc())
+    if resolution in BUCKET_SECONDS:
+        # Agrega en la base de datos por intervalo; el tamaño de la respuesta queda acotado
+        bucket = func.date_trunc(resolution, table.date).label("date")
+        query = select(bucket, AGGREGATES[agg or table_info["agg"]](column)).group_by(bucket)
+    else:
+        query = select(table.date, column)
+    return query.where(table.userId == user_id, table.date >= start_date).order_by(query.selected_columns[0].asc())
+
+
+# Reduce la serie cruda a max_points puntos conservando su forma
+def _reduce_lttb(results, max_points: int):
+    if len(results) <= max_points:
+        return results
+    x = np.array([record[0].timestamp() for record in results])
+    y = np.array([record[1] for record in results], dtype=float)
+    return [results[i] for i in lttb(x, y, max_points)]
+
+
+def _history_label(data_type: str):
+    return "Duración (min)" if data_type == 'exercises' else HISTORY_MAPPINGS[data_type]["label"]
+
+
+# Filas en el formato clásico: un objeto por punto con la etiqueta como clave
+def _history_rows(data_type: str, results):
+    if data_type == 'exercises':
+        return [{"fecha": record[0], record[1]: record[2]} for record in results]
+    label = HISTORY_MAPPINGS[data_type]["label"]
+    return [{"fecha": record[0], label: record[1]} for record in results]
+
+
+# Genera el historial en NDJSON o Arrow leyendo del cursor del servidor por bloques: la memoria
+# no depende del tamaño del rango. Usa su propia sesión, que vive lo mismo que la respuesta
+async def _stream_history(user_id: int, query, data_type: str, format: str, resolution: Optional[str], max_points: int):
+    exercises = data_type == 'exercises'
+    encoder = None
+    if format == 'arrow':
+        encoder = ArrowStreamEncoder(_history_label(data_type), isinstance(list(query.selected_columns)[-1].type, Integer),
+                                     names=exercises)
+    encode = encoder.write if encoder else lambda rows: ndjson_lines(_history_rows(data_type, rows))
+
+    async with read_session(user_id) as db:
+        if resolution == 'lttb':
+            # LTTB necesita la serie completa; el resultado ya queda acotado a max_points
+            yield encode(_reduce_lttb((await db.execute(query)).all(), max_points))
+        else:
+            result = await db.stream(query.execution_options(yield_per=HISTORY_STREAM_BATCH))
+            async for rows in result.partitions():
+                yield encode(rows)
+    if encoder:
+        yield encoder.close()
+
+
 # Función para cargar el histórico de datos
-def get_data_history(db: Session, user_id: int, data_type: str, period: str):
+async def get_data_history(db: AsyncSession, user_id: int, data_type: str, period: str, resolution: Optional[str] = None,
+                     max_points: int = 300, agg: Optional[str] = None, format: str = 'rows'):
     # Calcula la fecha inicial según el período
     today = datetime.today()
-    if period == 'week':
-        start_date = today - timedelta(weeks=1)
-    elif period == 'month':
-        start_date = today - timedelta(days=30)
-    elif period == 'three_months':
-        start_date = today - timedelta(days=90)
-    elif period == 'six_months':
-        start_date = today - timedelta(days=180)
-    elif period == 'year':
-        start_date = today - timedelta(days=365)
-    else:
+    if period not in HISTORY_PERIODS:
         return {"status": "error", "message": "Invalid period"}
+    start_date = today - HISTORY_PERIODS[period]
 
-    # Mapea el data_type a la tabla correspondiente
-    data_type_map = {
-        'weights': {"table":Weight, "column":"weight", "label":"Peso (kg)"},
-        'muscle': {"table":BodyComposition, "column":"muscle", "label":"Músculo"}, #Pero a la columna Muscle
-        'body_fat_percentage': {"table":BodyFatPercentage, "column":"fatPercentage", "label":"Porcentaje de grasa corporal (%)"},
-        'water_consumption': {"table":WaterConsumption, "column":"waterAmount", "label":"Vasos de agua"},
-        'steps': {"table":DailySteps, "column":"stepsAmount", "label":"Pasos durante el día"},
-        # 'exercises': {"table":Exercise, "column":"waterAmount", "label":"Vasos de agua"}, 
-        # Tengo que ver que hago con los ejercicios
-    }
-    if data_type == 'exercises':
-        results = db.query(Exercise.date, Exercise.exerciseName, Exercise.duration) \
-                    .filter(Exercise.userId == user_id)\
-                    .filter(Exercise.date >= start_date)\
-                    .order_by(Exercise.date.asc())\
-                    .all()
-
-        # Manejo de resultados vacíos
-        if not results:
-            return {"status": "success", "data": []}
-        
-        data = [{"fecha": record.date, record.exerciseName: record.duration} for record in results]
-
-        return {"status": "success", "data": data}
-    
-    elif data_type not in data_type_map:
+    if data_type != 'exercises' and data_type not in HISTORY_MAPPINGS:
         return {"status": "error", "message": "Invalid data_type"}
-    
-    # Selecciona la tabla correspondiente
-    table_info = data_type_map[data_type]
-    table = table_info["table"]
-    column_name = table_info["column"]
+    if resolution is not None and resolution not in HISTORY_RESOLUTIONS:
+        return {"status": "error", "message": "Invalid resolution"}
+    if agg is not None and agg not in AGGREGATES:
+        return {"status": "error", "message": "Invalid agg"}
+    if not 3 <= max_points <= MAX_HISTORY_POINTS:
+        return {"status": "error", "message": f"max_points debe estar entre 3 y {MAX_HISTORY_POINTS}"}
+    if resolution == 'lttb' and data_type == 'exercises':
+        return {"status": "error", "message": "La resolución lttb no está disponible para exercises"}
+    if format not in HISTORY_FORMATS:
+        return {"status": "error", "message": "Invalid format"}
+    if format == 'arrow' and pa is None:
+        return {"status": "error", "message": "El formato arrow requiere el paquete 'pyarrow'"}
+
+    # En modo automático se elige el intervalo más fino que no supera max_points puntos
+    if resolution == 'auto':
+        resolution = auto_bucket(start_date, today, max_points)
+
+    query = _history_query(user_id, data_type, start_date, resolution, agg)
+
+    # Los formatos en streaming no pasan por la caché: se envían a medida que se leen
+    if format in STREAMING_FORMATS:
+        media_type = ARROW_MEDIA_TYPE if format == 'arrow' else NDJSON_MEDIA_TYPE
+        return StreamingResponse(_stream_history(user_id, query, data_type, format, resolution, max_points), media_type=media_type)
+
+    table = Exercise if data_type == 'exercises' else HISTORY_MAPPINGS[data_type]["table"]
+    # La ventana es relativa a hoy: con la fecha en la clave una entrada no sobrevive al cambio de día
+    key = cache_key(user_id, table.__tablename__, data_type, period, today.date(), resolution, max_points, agg, format)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    results = (await db.execute(query)).all()
+    if resolution == 'lttb':
+        results = _reduce_lttb(results, max_points)
 
-    # Consulta SQL: Filtra por user_id y fecha en el rango, y selecciona los valores y fechas
-    results = db.query(table.date, getattr(table, column_name)) \
-                .filter(table.userId == user_id)\
-                .filter(table.date >= start_date)\
-                .order_by(table.date.asc())\
-                .all()
-
-    # Manejo de resultados vacíos
-    if not results:
-        return {"status": "success", "data": []}
-    
     # Prepara los datos para el gráfico
-    data = [{"fecha": record.date, table_info["label"]: record[1]} for record in results]
+    if format == 'columnar':
+        data = columnar(results, _history_label(data_type), names=data_type == 'exercises')
+    else:
+        data = _history_rows(data_type, results)
+
+    response = {"status": "success", "data": data}
+    cache.set(key, response)
+    return response
+
+
+# El cursor es opaco para el cliente: base64 de {"t": data_type, "o": orden, "d": última fecha}
+def encode_history_cursor(data_type: str, order: str, last_date: datetime) -> str:
+    payload = orjson.dumps({"t": data_type, "o": order, "d": last_date.isoformat()})
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str, data_type: str, order: str) -> Optional[datetime]:
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["t"] != data_type or payload["o"] != order:
+            return None
+        return datetime.fromisoformat(payload["d"])
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
+
+
+# Historial crudo entre start y end (end excluido), paginado por (userId, date) sin OFFSET: cada
+# página sigue a la última fecha de la anterior, así que cuesta lo mismo a cualquier profundidad.
+# La página se lee del cursor del servidor (yield_per) en lugar de cargar el resultado de golpe
+async def get_raw_history(db: AsyncSession, user_id: int, data_type: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None, cursor: Optional[str] = None, limit: int = HISTORY_PAGE_SIZE,
+                          order: str = 'asc', format: str = 'rows'):
+    if data_type != 'exercises' and data_type not in HISTORY_MAPPINGS:
+        return {"status": "error", "message": "Invalid data_type"}
+    if order not in HISTORY_PAGE_ORDERS:
+        return {"status": "error", "message": "Invalid order"}
+    if format not in ('rows', 'columnar'):
+        return {"status": "error", "message": "Invalid format"}
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        return {"status": "error", "message": f"limit debe estar entre 1 y {HISTORY_MAX_PAGE_SIZE}"}
+    start, end = naive_utc(start), naive_utc(end)
+    if start and end and start >= end:
+        return {"status": "error", "message": "from debe ser anterior a to"}
+    after = None
+    if cursor is not None:
+        after = decode_history_cursor(cursor, data_type, order)
+        if after is None:
+            return {"status": "error", "message": "Invalid cursor"}
 
-    return {"status": "success", "data": data}
+    if data_type == 'exercises':
+        table = Exercise
+        query = select(Exercise.date, Exercise.exerciseName, Exercise.duration)
+    else:
+        table = HISTORY_MAPPINGS[data_type]["table"]
+        query = select(table.date, getattr(table, HISTORY_MAPPINGS[data_type]["column"]))
+    query = query.where(table.userId == user_id)
+    if start:
+        query = query.where(table.date >= start)
+    if end:
+        query = query.where(table.date < end)
+    if after:
+        query = query.where(table.date > after if order == 'asc' else table.date < after)
+    # Una fila de más indica si hay otra página
+    query = query.order_by(table.date.asc() if order == 'asc' else table.date.desc()).limit(limit + 1)
+
+    result = await db.stream(query.execution_options(yield_per=min(limit + 1, HISTORY_STREAM_BATCH)))
+    rows = await result.fetchmany(limit + 1)
+    await result.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(data_type, order, rows[-1][0])
+    if format == 'columnar':
+        data = columnar(rows, _history_label(data_type), names=data_type == 'exercises')
+    else:
+        data = _history_rows(data_type, rows)
+    return {"status": "success", "data": data, "next_cursor": next_cursor}
+
+
+# Serie derivada como lista JSON: NaN (días sin datos, ventanas sin semana anterior) -> None
+def _derived_values(series: pd.Series):
+    return [None if np.isnan(value) else round(float(value), 2) for value in series.to_numpy(dtype="float64")]
+
+
+# Métricas derivadas del período: IMC, medias móviles, variación semanal y rachas de pasos y agua.
+# latest son los valores del último día con datos
+async def get_derived_metrics(db: AsyncSession, user_id: int, period: str = 'month'):
+    if period not in HISTORY_PERIODS:
+        return {"status": "error", "message": "Invalid period"}
+    frame = await derived_frame(db, user_id)
+    goals = {f"{column}_goal": goal for column, goal in DERIVED_STREAKS.items()}
+    start_date = pd.Timestamp(datetime.today().date() - HISTORY_PERIODS[period])
+    frame = frame[frame.index >= start_date] if not frame.empty else frame
+    if frame.empty:
+        return {"status": "success", "data": {"fecha": [], "series": {}}, "latest": {}, "goals": goals}
+
+    series = {column: _derived_values(frame[column]) for column in frame.columns}
+    latest = {column: values[-1] for column, values in series.items()}
+    return {"status": "success", "data": {"fecha": frame.index.date.tolist(), "series": series}, "latest": latest, "goals": goals}
@@ -1,33 +1,203 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from dotenv import load_dotenv
+from time import perf_counter
+from typing import Optional
+import logging
 import os
+import random
+import threading
 
 # Cargar el archivo .env
 load_dotenv()
 
+# Después de load_dotenv: metrics.py y cache.py leen su configuración al importarse
+from .metrics import instrument_engine
+from .cache import wrote_recently
+
+logger = logging.getLogger(__name__)
+
 # Obtener las credenciales de las variables de entorno
 DATABASE_USER = os.getenv("DATABASE_USER")
 DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
 DATABASE_HOST = os.getenv("DATABASE_HOST")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
+# Réplica de solo lectura opcional para el dashboard y el historial (mismas credenciales)
+DATABASE_READ_HOST = os.getenv("DATABASE_READ_HOST")
+
+# Configuración del pool de conexiones
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Tiempo máximo por sentencia en milisegundos (0 = sin límite)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# El log de todas las sentencias queda desactivado salvo que se pida
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+# Registro de consultas lentas: umbral en ms (0 = desactivado) y fracción de ellas que se registra
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "0"))
+DB_SLOW_QUERY_SAMPLE_RATE = float(os.getenv("DB_SLOW_QUERY_SAMPLE_RATE", "1.0"))
+
+
+def _url(driver: str, host: str):
+    return f"{driver}://{DATABASE_USER}:{DATABASE_PASSWORD}@{host}/{DATABASE_NAME}"
+
 
 # Construir la URL de la base de datos
-DATABASE_URL = (
-    f"postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}/{DATABASE_NAME}"
-)
+DATABASE_URL = _url("postgresql", DATABASE_HOST)
+# La misma base de datos con el driver asyncpg, para los endpoints
+ASYNC_DATABASE_URL = _url("postgresql+asyncpg", DATABASE_HOST)
+
+
+# Métricas de espera al pedir una conexión al pool
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+
+# Pools que miden cuánto se espera por una conexión libre
+class _TimedPool:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record(perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(perf_counter() - started)
+        return connection
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
 
-# Crear el motor de la base de datos
-engine = create_engine(DATABASE_URL, echo=True)
+# Engines creados, por nombre, para exponer las métricas de sus pools
+engines = {}
 
-# Crear una sesión asíncrona
+
+def _create(name: str, url: str, is_async: bool):
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    options = dict(
+        echo=DB_ECHO,
+        poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+    new_engine = create_async_engine(url, **options) if is_async else create_engine(url, **options)
+    sync_engine = new_engine.sync_engine if is_async else new_engine
+    if DB_SLOW_QUERY_MS:
+        _log_slow_queries(sync_engine)
+    instrument_engine(sync_engine)
+    engines[name] = sync_engine
+    return new_engine
+
+
+def _log_slow_queries(target):
+    @event.listens_for(target, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_started = perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (perf_counter() - context.query_started) * 1000
+        if elapsed_ms >= DB_SLOW_QUERY_MS and random.random() < DB_SLOW_QUERY_SAMPLE_RATE:
+            logger.warning("Consulta lenta (%.1f ms): %s", elapsed_ms, " ".join(statement.split())[:1000])
+
+
+# Estado actual y esperas acumuladas de cada pool
+def pool_stats():
+    stats = {}
+    for name, sync_engine in engines.items():
+        pool, metrics = sync_engine.pool, sync_engine.pool.metrics
+        stats[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "checkouts": metrics.checkouts,
+            "timeouts": metrics.timeouts,
+            "wait_avg_ms": round(metrics.wait_total / metrics.checkouts * 1000, 3) if metrics.checkouts else 0.0,
+            "wait_max_ms": round(metrics.wait_max * 1000, 3),
+        }
+    return stats
+
+
+# Crear el motor de la base de datos (síncrono: importaciones en segundo plano y comandos)
+engine = _create("sync", DATABASE_URL, is_async=False)
+
+# Crear una sesión síncrona
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
     bind=engine,
 )
 
+# Motor asíncrono usado por los endpoints
+async_engine = _create("async", ASYNC_DATABASE_URL, is_async=True)
+
+# Crear una sesión asíncrona; los objetos siguen disponibles después del commit
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# Sesiones de solo lectura: van a la réplica si está configurada
+if DATABASE_READ_HOST:
+    async_read_engine = _create("async_read", _url("postgresql+asyncpg", DATABASE_READ_HOST), is_async=True)
+    AsyncReadSessionLocal = async_sessionmaker(
+        async_read_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+else:
+    async_read_engine = async_engine
+    AsyncReadSessionLocal = AsyncSessionLocal
+
+
+# Sesión de solo lectura para las consultas de un usuario: el primario si acaba de escribir, para que
+# vea sus propios datos aunque la réplica vaya por detrás
+def read_session(user_id: Optional[int] = None) -> AsyncSession:
+    if user_id is not None and DATABASE_READ_HOST and wrote_recently(user_id):
+        return AsyncSessionLocal()
+    return AsyncReadSessionLocal()
+
 # Base para los modelos
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
@@ -0,0 +1,174 @@
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .cache import MemoryCache, generations, invalidate
+from .models import Weight, Height, DailySteps, WaterConsumption, MetricRollup
+
+# Objetivos diarios de las rachas: días seguidos con al menos DERIVED_STEPS_GOAL pasos o
+# DERIVED_WATER_GOAL vasos de agua
+DERIVED_STEPS_GOAL = int(os.getenv("DERIVED_STEPS_GOAL", "10000"))
+DERIVED_WATER_GOAL = int(os.getenv("DERIVED_WATER_GOAL", "8"))
+# Días de las medias móviles y de la comparación con la semana anterior
+DERIVED_WINDOW_DAYS = int(os.getenv("DERIVED_WINDOW_DAYS", "7"))
+# Usuarios cuyas series se guardan en memoria en este proceso
+DERIVED_CACHE_MAX_USERS = int(os.getenv("DERIVED_CACHE_MAX_USERS", "1000"))
+
+# Tablas de las que dependen las métricas derivadas
+DERIVED_TABLES = [Weight, Height, DailySteps, WaterConsumption]
+DERIVED_SCOPES = [table.__tablename__ for table in DERIVED_TABLES]
+# Resúmenes diarios que se leen -> columna de la serie diaria y agregación del día
+DERIVED_ROLLUPS = {'weights': ("weight", "avg"), 'steps': ("steps", "sum"), 'water_consumption': ("water", "sum")}
+# Rachas: columna diaria -> objetivo
+DERIVED_STREAKS = {"steps": DERIVED_STEPS_GOAL, "water": DERIVED_WATER_GOAL}
+
+# Un día d depende de los DERIVED_WINDOW_DAYS anteriores (media móvil) y la comparación semanal de
+# la media móvil de d - DERIVED_WINDOW_DAYS: al recalcular desde d se leen 2 * ventana días antes
+LOOKBACK_DAYS = 2 * DERIVED_WINDOW_DAYS
+
+
+# Series derivadas de un usuario y estado con el que se calcularon
+class DerivedMemo:
+    def __init__(self, frame: pd.DataFrame, generations: tuple):
+        self.frame = frame
+        self.generations = generations
+
+
+# Escrituras de este proceso pendientes de aplicar a la serie guardada: primer día modificado y
+# generaciones de las tablas justo antes y justo después de invalidarlas. before es None si entre dos
+# escrituras de este proceso hubo otra que no se ve desde aquí
+class DirtyMark:
+    def __init__(self, day: date, before: Optional[tuple], after: tuple):
+        self.day = day
+        self.before = before
+        self.after = after
+
+
+_memo = MemoryCache(max_entries=DERIVED_CACHE_MAX_USERS, default_ttl=0)
+_dirty: Dict[int, DirtyMark] = {}
+_dirty_lock = threading.Lock()
+
+
+# Se llama después de escribir: since es tabla -> primer día escrito. Invalida los ámbitos dados y las
+# tablas escritas, y anota desde qué día rehacer las series para que el siguiente cálculo no las
+# recalcule completas
+def mark_dirty(user_id: int, since: Dict[Any, datetime], *scopes: str):
+    written = [table for table in since if table in DERIVED_TABLES]
+    before = generations(user_id, *DERIVED_SCOPES) if written else None
+    changed = invalidate(user_id, *scopes, *[table.__tablename__ for table in since])
+    if not written:
+        return
+    after = tuple(changed.get(scope, generation) for scope, generation in zip(DERIVED_SCOPES, before))
+    day = min(value.date() if isinstance(value, datetime) else value for table, value in since.items() if table in written)
+    with _dirty_lock:
+        mark = _dirty.get(user_id)
+        if mark is not None:
+            day = min(day, mark.day)
+            before = mark.before if mark.after == before else None
+        _dirty[user_id] = DirtyMark(day, before, after)
+
+
+def _take_dirty(user_id: int) -> Optional[DirtyMark]:
+    with _dirty_lock:
+        return _dirty.pop(user_id, None)
+
+
+# Días seguidos en que se cumple el objetivo, vectorizado: cada día que no lo cumple abre un grupo
+# y la racha es la suma acumulada dentro del grupo. carry es la racha del día anterior a la serie
+def _streak(values: pd.Series, goal: float, carry: int = 0) -> pd.Series:
+    met = values >= goal
+    group = (~met).cumsum()
+    streak = met.astype("int64").groupby(group).cumsum()
+    return streak + np.where((group == 0) & met, carry, 0)
+
+
+def _compute(daily: pd.DataFrame, heights: pd.DataFrame, carry: Dict[str, int]) -> pd.DataFrame:
+    window = DERIVED_WINDOW_DAYS
+    frame = pd.DataFrame(index=daily.index)
+    frame["weight"] = daily["weight"]
+    frame["weight_ma"] = daily["weight"].rolling(window, min_periods=1).mean()
+    frame["weight_wow"] = frame["weight_ma"] - frame["weight_ma"].shift(window)
+
+    # IMC con la última altura conocida en cada día
+    if heights.empty:
+        frame["bmi"] = np.nan
+    else:
+        days = pd.DataFrame({"day": daily.index})
+        height = pd.merge_asof(days, heights, left_on="day", right_on="date", direction="backward")["height"].to_numpy()
+        frame["bmi"] = daily["weight"].to_numpy() / height ** 2
+    frame["bmi_ma"] = frame["bmi"].rolling(window, min_periods=1).mean()
+
+    for column, goal in DERIVED_STREAKS.items():
+        values = daily[column].fillna(0)
+        total = values.rolling(window, min_periods=1).sum()
+        previous = total.shift(window)
+        frame[column] = values
+        frame[f"{column}_ma"] = total / window
+        frame[f"{column}_wow_pct"] = (total - previous) / previous.where(previous != 0) * 100
+        frame[f"{column}_streak"] = _streak(values, goal, carry.get(column, 0))
+    return frame
+
+
+# Serie diaria continua desde start (todos los días si es None) a partir de los resúmenes diarios
+async def _load(db: AsyncSession, user_id: int, start: Optional[date]):
+    query = select(MetricRollup.bucket, MetricRollup.metric, MetricRollup.total, MetricRollup.count) \
+        .where(MetricRollup.userId == user_id, MetricRollup.granularity == 'day', MetricRollup.metric.in_(DERIVED_ROLLUPS))
+    if start:
+        query = query.where(MetricRollup.bucket >= start)
+    rows = pd.DataFrame((await db.execute(query)).all(), columns=["day", "metric", "total", "count"])
+    heights = pd.DataFrame((await db.execute(
+        select(Height.date, Height.height).where(Height.userId == user_id).order_by(Height.date)
+    )).all(), columns=["date", "height"])
+    heights["date"] = pd.to_datetime(heights["date"]).dt.normalize()
+
+    if rows.empty:
+        return None, heights
+    rows["day"] = pd.to_datetime(rows["day"])
+    rows["value"] = np.where(rows["metric"].map({metric: agg for metric, (_, agg) in DERIVED_ROLLUPS.items()}) == "avg",
+                             rows["total"] / rows["count"], rows["total"])
+    daily = rows.pivot(index="day", columns="metric", values="value") \
+        .rename(columns={metric: column for metric, (column, _) in DERIVED_ROLLUPS.items()})
+    index = pd.date_range(pd.Timestamp(start) if start else daily.index.min(), daily.index.max(), freq="D", name="day")
+    daily = daily.reindex(index)
+    for column, _ in DERIVED_ROLLUPS.values():
+        if column not in daily:
+            daily[column] = np.nan
+    return daily, heights
+
+
+# Series derivadas del usuario. Se guardan en memoria; tras una importación en este proceso solo se
+# recalculan desde el primer día modificado (más los días que necesitan las ventanas), siempre que las
+# generaciones muestren que no hubo más cambios que esa importación. Si los datos cambiaron también por
+# otra vía (otro proceso, registro) o no hay caché compartida (CACHE_BACKEND=none) se recalculan completas
+async def derived_frame(db: AsyncSession, user_id: int) -> pd.DataFrame:
+    current = generations(user_id, *DERIVED_SCOPES)
+    memo: Optional[DerivedMemo] = _memo.get(str(user_id))
+    dirty = _take_dirty(user_id)
+    if memo is not None and memo.generations == current and dirty is None:
+        return memo.frame
+
+    start, splice, carry, previous = None, None, {}, None
+    if memo is not None and dirty is not None and dirty.before == memo.generations and dirty.after == current \
+            and not memo.frame.empty and dirty.day > memo.frame.index[0].date():
+        previous = memo.frame
+        # Se recalcula desde splice (sin huecos respecto a la serie guardada) y se leen antes los
+        # días de las ventanas, que solo sirven para arrancar las medias y las rachas
+        splice = pd.Timestamp(min(dirty.day, previous.index[-1].date() + timedelta(days=1)))
+        start = (splice - pd.Timedelta(days=LOOKBACK_DAYS)).date()
+        before = previous[previous.index < pd.Timestamp(start)]
+        if len(before):
+            carry = {column: int(before[f"{column}_streak"].iloc[-1]) for column in DERIVED_STREAKS}
+
+    daily, heights = await _load(db, user_id, start)
+    if daily is None:
+        frame = previous[previous.index < splice] if previous is not None else pd.DataFrame()
+    else:
+        frame = _compute(daily, heights, carry)
+        if previous is not None:
+            frame = pd.concat([previous[previous.index < splice], frame[frame.index >= splice]])
+    _memo.set(str(user_id), DerivedMemo(frame, current))
+    return frame
@@ -0,0 +1,51 @@
+import numpy as np
+
+# Duración aproximada de cada resolución, para elegir la adecuada en modo automático
+BUCKET_SECONDS = {
+    'hour': 3600,
+    'day': 86400,
+    'week': 7 * 86400,
+    'month': 30 * 86400,
+}
+
+
+# Resolución más fina que no supera max_points puntos en el intervalo dado
+def auto_bucket(start, end, max_points: int):
+    span = (end - start).total_seconds()
+    for bucket, seconds in BUCKET_SECONDS.items():
+        if span / seconds <= max_points:
+            return bucket
+    return 'month'
+
+
+# Largest-Triangle-Three-Buckets: elige max_points índices que conservan la forma de la serie
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    # Los puntos intermedios se reparten en max_points - 2 cubetas
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Promedio de la cubeta siguiente (o el último punto en la última cubeta)
+        if i < max_points - 3:
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        # Se queda con el punto que forma el triángulo de mayor área
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return selected
@@ -0,0 +1,188 @@
+import csv
+import io
+import os
+import zipfile
+from datetime import datetime
+from typing import List, Optional, Sequence
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from .database import read_session
+from .formats import naive_utc, pa
+from .importer import IMPORT_MAPPINGS
+
+if pa is not None:
+    import pyarrow.parquet as pq
+
+# Filas que se leen del cursor del servidor y se codifican a la vez; la memoria de una exportación
+# no depende del tamaño del historial
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+
+EXPORT_FORMATS = ['csv', 'parquet']
+EXPORT_MEDIA_TYPES = {'csv': "text/csv", 'parquet': "application/vnd.apache.parquet", 'zip': "application/zip"}
+
+# Tipo de cada columna en Parquet según el tipo de Python de la columna de la tabla
+PARQUET_TYPES = {int: "int64", float: "float64", str: "string"}
+
+
+# Destino en memoria que se vacía después de cada lote: los escritores de Parquet y zip escriben
+# aquí y la respuesta envía lo acumulado. No admite seek, así que zipfile escribe en modo streaming
+class _Sink(io.RawIOBase):
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# Columnas de la tabla de un data_type y sus nombres en el archivo: los mismos que acepta
+# /import-data, para que una exportación se pueda volver a importar
+def _columns(data_type: str):
+    mapping = IMPORT_MAPPINGS[data_type]
+    table = mapping["table"]
+    return table, [table.date, *[getattr(table, column) for column in mapping["columns"].values()]], ["fecha", *mapping["columns"]]
+
+
+class CsvEncoder:
+    def __init__(self, data_type: str):
+        _, _, self.names = _columns(data_type)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self._writer.writerow(self.names)
+        return self._drain()
+
+    # La fecha sale como "YYYY-MM-DD HH:MM:SS[.ffffff]", que el importador lee sin ambigüedad
+    def write(self, rows: Sequence[Sequence]) -> bytes:
+        self._writer.writerows((row[0].isoformat(sep=" "), *row[1:]) for row in rows)
+        return self._drain()
+
+    def close(self) -> bytes:
+        return b""
+
+
+class ParquetEncoder:
+    def __init__(self, data_type: str):
+        if pa is None:
+            raise RuntimeError("El formato parquet requiere el paquete 'pyarrow'")
+        _, columns, names = _columns(data_type)
+        fields = [pa.field("fecha", pa.timestamp("us"))]
+        fields += [pa.field(name, getattr(pa, PARQUET_TYPES[column.type.python_type])()) for name, column in zip(names[1:], columns[1:])]
+        self.schema = pa.schema(fields)
+        self._sink = _Sink()
+        self._writer = pq.ParquetWriter(self._sink, self.schema)
+
+    def header(self) -> bytes:
+        return b""
+
+    # Cada lote es un row group
+    def write(self, rows: Sequence[Sequence]) -> bytes:
+        columns = [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(self.schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+ENCODERS = {'csv': CsvEncoder, 'parquet': ParquetEncoder}
+
+
+def _export_query(user_id: int, data_type: str, start: Optional[datetime], end: Optional[datetime]):
+    table, columns, _ = _columns(data_type)
+    query = select(*columns).where(table.userId == user_id)
+    if start:
+        query = query.where(table.date >= start)
+    if end:
+        query = query.where(table.date < end)
+    return query.order_by(table.date.asc())
+
+
+# Bytes de la exportación de un data_type, lote a lote. Las filas se leen del cursor del servidor
+# y se codifican en el threadpool para no ocupar el event loop con archivos grandes
+async def _export_chunks(db, user_id: int, data_type: str, format: str, start: Optional[datetime], end: Optional[datetime]):
+    encoder = ENCODERS[format](data_type)
+    yield encoder.header()
+    result = await db.stream(_export_query(user_id, data_type, start, end).execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for rows in result.partitions():
+        yield await run_in_threadpool(encoder.write, rows)
+    yield await run_in_threadpool(encoder.close)
+
+
+async def _stream_file(user_id: int, data_type: str, format: str, start: Optional[datetime], end: Optional[datetime]):
+    async with read_session(user_id) as db:
+        async for chunk in _export_chunks(db, user_id, data_type, format, start, end):
+            if chunk:
+                yield chunk
+
+
+# Zip con un archivo por métrica, generado sobre la marcha: cada miembro se comprime a medida que
+# llegan sus lotes (con descriptores de datos, porque el tamaño no se conoce de antemano)
+async def _stream_zip(user_id: int, data_types: List[str], format: str, start: Optional[datetime], end: Optional[datetime]):
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    async with read_session(user_id) as db:
+        for data_type in data_types:
+            with archive.open(f"{data_type}.{format}", "w", force_zip64=True) as member:
+                async for chunk in _export_chunks(db, user_id, data_type, format, start, end):
+                    await run_in_threadpool(member.write, chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    archive.close()
+    yield sink.drain()
+
+
+# Exporta los datos de sensores del usuario en CSV o Parquet. Un solo data_type devuelve el archivo
+# directamente; varios (por defecto todos) o zip=True devuelven un zip con un archivo por métrica,
+# que se puede subir tal cual a /import-data/bulk si es CSV
+def export_data(user_id: int, data_types: Optional[List[str]] = None, format: str = 'csv', start: Optional[datetime] = None,
+                end: Optional[datetime] = None, zip: bool = False):
+    data_types = data_types or list(IMPORT_MAPPINGS)
+    invalid = [data_type for data_type in data_types if data_type not in IMPORT_MAPPINGS]
+    if invalid:
+        return {"status": "error", "message": f"Invalid data_type: {', '.join(invalid)}"}
+    if format not in EXPORT_FORMATS:
+        return {"status": "error", "message": "Invalid format"}
+    if format == 'parquet' and pa is None:
+        return {"status": "error", "message": "El formato parquet requiere el paquete 'pyarrow'"}
+    # Se valida antes de empezar la respuesta: un error dentro del stream llegaría como un archivo
+    # cortado con estado 200
+    start, end = naive_utc(start), naive_utc(end)
+    if start and end and start >= end:
+        return {"status": "error", "message": "from debe ser anterior a to"}
+
+    data_types = list(dict.fromkeys(data_types))
+    stamp = datetime.now().strftime("%Y%m%d")
+    if len(data_types) == 1 and not zip:
+        filename = f"export_{data_types[0]}_{stamp}.{format}"
+        body = _stream_file(user_id, data_types[0], format, start, end)
+        media_type = EXPORT_MEDIA_TYPES[format]
+    else:
+        filename = f"export_{stamp}.zip"
+        body = _stream_zip(user_id, data_types, format, start, end)
+        media_type = EXPORT_MEDIA_TYPES['zip']
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -0,0 +1,63 @@
+import io
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Sequence
+import orjson
+
+# pyarrow es opcional: solo hace falta para el formato Arrow
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+# Las columnas de fecha son timestamp sin zona horaria (UTC): una fecha con zona (?from=...Z o
+# +02:00) se pasa a UTC sin zona antes de compararla con ellas o con otra fecha sin zona
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# Un objeto JSON por línea; se devuelve un único bloque de bytes por lote de filas
+def ndjson_lines(rows: Iterable[dict]) -> bytes:
+    return b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+
+# Columnas en paralelo en lugar de un objeto por fila: la etiqueta aparece una sola vez
+def columnar(rows: Sequence[Sequence], label: str, names: bool = False) -> dict:
+    data = {"fecha": [row[0] for row in rows], "values": [row[-1] for row in rows], "label": label}
+    if names:
+        data["names"] = [row[1] for row in rows]
+    return data
+
+
+# Escribe lotes de filas como un stream Arrow IPC y devuelve los bytes generados en cada paso
+class ArrowStreamEncoder:
+    def __init__(self, label: str, integer: bool, names: bool = False):
+        if pa is None:
+            raise RuntimeError("El formato arrow requiere el paquete 'pyarrow'")
+        fields = [pa.field("fecha", pa.timestamp("us"))]
+        if names:
+            fields.append(pa.field("name", pa.string()))
+        fields.append(pa.field("value", pa.int64() if integer else pa.float64()))
+        self.schema = pa.schema(fields, metadata={"label": label})
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def write(self, rows: Sequence[Sequence]) -> bytes:
+        columns = [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(self.schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+        return self._drain()
+
+    def close(self) -> Optional[bytes]:
+        self._writer.close()
+        return self._drain()
@@ -0,0 +1,73 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# Coste de bcrypt (2^rounds iteraciones). Los hashes con otro coste se rehacen al iniciar sesión
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Pool donde se calculan los hashes: "thread" (bcrypt libera el GIL) o "process"
+HASH_POOL = os.getenv("HASH_POOL", "thread")
+# Hashes que se calculan a la vez y cuántos pueden esperar turno antes de responder 503
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+# Segundos que se sugieren al cliente en Retry-After cuando el pool está saturado
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "1"))
+
+# min_rounds = max_rounds = BCRYPT_ROUNDS: cualquier hash con otro coste se marca para actualizar
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+if HASH_POOL == "process":
+    _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+elif HASH_POOL == "thread":
+    _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash")
+else:
+    raise ValueError(f"HASH_POOL no válido: {HASH_POOL}")
+
+# Hashes en curso o en cola en este proceso (solo se modifica desde el event loop)
+_pending = 0
+
+
+def pending() -> int:
+    return _pending
+
+
+# Ejecuta fn en el pool sin bloquear el event loop; si la cola está llena responde 503 de inmediato
+async def _submit(fn, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, inténtelo de nuevo en unos segundos",
+            headers={"Retry-After": str(HASH_RETRY_AFTER)},
+        )
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(_hash, password)
+
+
+# Devuelve (válida, nuevo_hash); nuevo_hash no es None si el hash guardado usa otro coste
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _submit(_verify_and_update, password, hashed_password)
@@ -0,0 +1,535 @@
+import csv
+import io
+import itertools
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from . import schemas
+from .models import Weight, Height, BodyComposition, BodyFatPercentage, WaterConsumption, DailySteps, Exercise
+
+# pyarrow es opcional: si está instalado se usa su lector de CSV, bastante más rápido que el de pandas
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+# Tamaño de lote por defecto para los INSERT masivos
+DEFAULT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+# Filas del CSV que se leen y procesan a la vez; limita la memoria sin importar el tamaño del archivo
+DEFAULT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "50000"))
+
+# Hilos que leen en paralelo las secciones de una importación masiva
+IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", "4"))
+
+# Lector de CSV: "pyarrow" (por defecto si está instalado) o "pandas"
+IMPORT_PARSER = os.getenv("IMPORT_PARSER", "pyarrow" if pa else "pandas")
+if IMPORT_PARSER not in ("pyarrow", "pandas"):
+    raise ValueError(f"IMPORT_PARSER no válido: {IMPORT_PARSER}")
+if IMPORT_PARSER == "pyarrow" and pa is None:
+    raise RuntimeError("IMPORT_PARSER=pyarrow pero el paquete 'pyarrow' no está instalado")
+
+# Procesos que leen y validan en paralelo los bloques de un CSV (0 o 1 = en el hilo de la importación,
+# por defecto). Cada worker de uvicorn tiene su propio pool, por eso se limita a PARSE_POOL_MAX_PROCESSES.
+# Arrancar los procesos y devolver los DataFrames al padre cuesta más que leer en línea los archivos
+# pequeños: el pool solo se usa con archivos de al menos IMPORT_PARSE_POOL_MIN_BYTES
+PARSE_POOL_MAX_PROCESSES = 4
+IMPORT_PARSE_PROCESSES = min(int(os.getenv("IMPORT_PARSE_PROCESSES", "0")), PARSE_POOL_MAX_PROCESSES)
+IMPORT_PARSE_POOL_MIN_BYTES = int(os.getenv("IMPORT_PARSE_POOL_MIN_BYTES", str(256 * 1024 * 1024)))
+
+# Filas inválidas que se detallan en el informe de errores; el resto solo se cuentan
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+# Postgres admite como máximo 65535 parámetros por sentencia
+MAX_BIND_PARAMS = 65535
+
+# Mapea cada data_type importable a su modelo, al esquema con el que se validan los valores y a las
+# columnas del CSV -> columnas de la tabla
+IMPORT_MAPPINGS = {
+    'weights': {"table": Weight, "schema": schemas.WeightBase, "columns": {"peso": "weight"}},
+    'heights': {"table": Height, "schema": schemas.HeightBase, "columns": {"altura": "height"}},
+    'body_composition': {"table": BodyComposition, "schema": schemas.BodyCompositionBase,
+                         "columns": {"grasa": "fat", "musculo": "muscle", "agua": "water"}},
+    'body_fat_percentage': {"table": BodyFatPercentage, "schema": schemas.BodyFatPercentageBase,
+                            "columns": {"porcentajeGrasa": "fatPercentage"}},
+    'water_consumption': {"table": WaterConsumption, "schema": schemas.WaterConsumptionBase,
+                          "columns": {"vasosDeAgua": "waterAmount"}},
+    'daily_steps': {"table": DailySteps, "schema": schemas.DailyStepsBase, "columns": {"cantidadPasos": "stepsAmount"}},
+    'exercises': {"table": Exercise, "schema": schemas.ExerciseBase,
+                  "columns": {"nombreEjercicio": "exerciseName", "duracion": "duration"}},
+}
+
+
+# Reglas de cada columna a partir del esquema: tipo (int, float o str) y límites gt/ge/lt/le de Field
+def column_rules(schema) -> Dict[str, dict]:
+    rules = {}
+    for name, field in schema.model_fields.items():
+        rule = {"type": field.annotation}
+        for constraint in field.metadata:
+            for bound in ("gt", "ge", "lt", "le"):
+                if getattr(constraint, bound, None) is not None:
+                    rule[bound] = getattr(constraint, bound)
+        rules[name] = rule
+    return rules
+
+
+IMPORT_RULES = {data_type: column_rules(mapping["schema"]) for data_type, mapping in IMPORT_MAPPINGS.items()}
+
+# Límite -> (valores que lo incumplen, mensaje)
+BOUND_CHECKS = {
+    "gt": (lambda values, bound: values <= bound, "debe ser mayor que {}"),
+    "ge": (lambda values, bound: values < bound, "debe ser mayor o igual que {}"),
+    "lt": (lambda values, bound: values >= bound, "debe ser menor que {}"),
+    "le": (lambda values, bound: values > bound, "debe ser menor o igual que {}"),
+}
+
+
+def clean_columns(columns) -> List[str]:
+    # Eliminar espacios y `;` en los nombres de las columnas
+    return [re.sub(';+', '', str(column)).strip() for column in columns]
+
+
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = clean_columns(df.columns)
+    # Limpiar los valores en la última columna para eliminar `;;;` (las celdas vacías siguen vacías)
+    last_column = df.columns[-1]
+    if df[last_column].dtype == object:
+        df[last_column] = df[last_column].str.strip(" ;")
+    return df
+
+
+# Líneas en blanco (vacías o solo con espacios o `;`). pandas salta algunas y pyarrow las da por mal
+# formadas, así que se quitan antes de leer el bloque. La expresión empieza en el salto de línea
+# anterior: buscar así es bastante más rápido que anclar con ^ en cada línea
+BLANK_LINE = re.compile(rb"\n[ \t\r;]*(?=\n)")
+
+
+def block_lines(content: bytes) -> int:
+    return content.count(b"\n") + (0 if content.endswith(b"\n") else 1)
+
+
+# Quita las líneas en blanco del bloque y devuelve el número de línea (la cabecera es la 1) de cada
+# línea que queda, o None si no había ninguna en blanco
+def strip_blank_lines(content: bytes) -> Tuple[bytes, Optional[np.ndarray]]:
+    tail = content.rfind(b"\n") + 1
+    blank_tail = tail < len(content) and not content[tail:].strip(b" \t\r;")
+    blank = [match.start() + 1 for match in BLANK_LINE.finditer(content)]
+    if not blank and not blank_tail:
+        return content, None
+    lines = np.arange(1, block_lines(content) + 1)
+    # La última línea, si no termina en salto de línea, no la encuentra BLANK_LINE
+    if blank_tail:
+        content, lines = content[:tail], lines[:-1]
+    if not blank:
+        return content, lines
+    newlines = np.flatnonzero(np.frombuffer(content, dtype=np.uint8) == ord("\n"))
+    # Una línea que empieza en la posición p es la número (saltos de línea antes de p) + 1
+    return BLANK_LINE.sub(b"", content), np.setdiff1d(lines, np.searchsorted(newlines, blank) + 1)
+
+
+# Lee un bloque de CSV (cabecera + filas). Devuelve el DataFrame limpio, el número de línea del bloque
+# de cada una de sus filas y las filas mal formadas (línea, texto), que pyarrow salta en lugar de fallar
+def read_block(content: bytes) -> Tuple[pd.DataFrame, np.ndarray, List[Tuple[int, str]]]:
+    content, lines = strip_blank_lines(content)
+    if IMPORT_PARSER == "pandas":
+        df = clean_frame(pd.read_csv(io.BytesIO(content), delimiter=',', skipinitialspace=True))
+        return df, np.arange(2, len(df) + 2) if lines is None else lines[1:len(df) + 1], []
+
+    malformed = []
+
+    def skip_row(row):
+        # row.number es la línea en el bloque sin líneas en blanco, contando la cabecera
+        malformed.append((row.number if lines is None else int(lines[row.number - 1]), row.text))
+        return "skip"
+
+    # Un único bloque de lectura: los tipos se deducen con todo el bloque y no solo con su primer MB
+    table = pa_csv.read_csv(
+        pa.py_buffer(content),
+        read_options=pa_csv.ReadOptions(use_threads=False, block_size=len(content) + 1),
+        parse_options=pa_csv.ParseOptions(invalid_row_handler=skip_row),
+    )
+    table = table.rename_columns(clean_columns(table.column_names))
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type):
+            table = table.set_column(i, field.name, pc.utf8_trim(table.column(i), characters=" ;"))
+    df = table.to_pandas()
+    rows = np.arange(2, len(df) + len(malformed) + 2) if lines is None else lines[1:]
+    if malformed:
+        rows = np.setdiff1d(rows, [number for number, _ in malformed])
+    return df, rows, malformed
+
+
+def _errors(rows, column: str, values, error: str) -> pd.DataFrame:
+    # El valor se devuelve como texto, tal como venía en el archivo
+    values = pd.Series(values, dtype=object)
+    return pd.DataFrame({"row": rows, "column": column,
+                         "value": values.where(values.isna(), values.astype(str)).where(values.notna(), None).to_numpy(),
+                         "error": error})
+
+
+def _is_empty(values: pd.Series) -> pd.Series:
+    return values.isna() | (values.astype(str) == "") if values.dtype == object else values.isna()
+
+
+# Convierte el DataFrame del CSV en un DataFrame columnar con los nombres de la tabla y valida cada
+# valor con las reglas del esquema. Devuelve las filas válidas y un DataFrame con un error por cada
+# valor inválido (row, column, value, error); rows es el número de fila de cada fila de df
+def build_frame(df: pd.DataFrame, user_id: int, data_type: str, rows=None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    mapping = IMPORT_MAPPINGS[data_type]
+    rules = IMPORT_RULES[data_type]
+    missing = [c for c in ["fecha", *mapping["columns"]] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(missing)}")
+    rows = np.arange(1, len(df) + 1) if rows is None else np.asarray(rows)
+    errors = []
+
+    def check(mask, column, error):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            errors.append(_errors(rows[mask], column, df[column].to_numpy()[mask], error))
+        return mask
+
+    raw_dates = df["fecha"]
+    if pd.api.types.is_datetime64_any_dtype(raw_dates):
+        dates = raw_dates
+    else:
+        dates = pd.to_datetime(raw_dates, errors="coerce")
+        # El formato se deduce de la primera fecha; las que no lo siguen se leen una a una
+        retry = dates.isna() & ~_is_empty(raw_dates)
+        if retry.any():
+            dates[retry] = pd.to_datetime(raw_dates[retry], errors="coerce", format="mixed")
+    # Siempre en ns: la huella de la sincronización incremental no debe depender del lector
+    frame = pd.DataFrame({"date": dates.astype("datetime64[ns]").to_numpy()})
+    invalid = check(_is_empty(raw_dates), "fecha", "valor vacío")
+    invalid |= check(frame["date"].isna() & ~invalid, "fecha", "fecha no válida")
+
+    for csv_column, column_name in mapping["columns"].items():
+        rule = rules[column_name]
+        raw = df[csv_column]
+        empty = check(_is_empty(raw), csv_column, "valor vacío")
+        invalid |= empty
+        if rule["type"] in (int, float):
+            # Las columnas numéricas se convierten aquí para no depender del driver fila a fila
+            values = pd.to_numeric(raw, errors="coerce")
+            bad = check(values.isna() & ~empty, csv_column, "no es un número")
+            if rule["type"] is int:
+                bad |= check((values % 1 != 0) & ~bad & ~empty, csv_column, "debe ser un número entero")
+            for bound, (violates, message) in BOUND_CHECKS.items():
+                if bound in rule:
+                    bad |= check(violates(values, rule[bound]) & ~bad & ~empty, csv_column, message.format(rule[bound]))
+            invalid |= bad
+        else:
+            values = raw
+        frame[column_name] = values.to_numpy()
+
+    frame = frame[~invalid]
+    for column_name, rule in rules.items():
+        if rule["type"] is int and column_name in frame:
+            frame[column_name] = frame[column_name].astype("int64")
+    frame["userId"] = user_id
+
+    # Un mismo INSERT ... ON CONFLICT no puede tocar dos veces la misma fila: gana la última, igual que con merge
+    frame = frame.drop_duplicates(subset=["date"], keep="last")
+    errors = pd.concat(errors, ignore_index=True) if errors else _errors([], "", [], "")
+    return frame, errors
+
+
+# Resultado de leer y validar un bloque: filas válidas de cada tipo de datos, filas leídas, líneas
+# de datos del bloque (con las líneas en blanco) y errores. El "row" de cada error es el número de
+# línea en el archivo, con la cabecera en la línea 1 (en Excel, la fila de la hoja)
+class ParsedBlock:
+    def __init__(self, frames: Dict[str, pd.DataFrame], rows: int, invalid_rows: int, errors: List[dict], lines: int = 0):
+        self.frames = frames
+        self.rows = rows
+        self.invalid_rows = invalid_rows
+        self.errors = errors
+        self.lines = lines
+
+
+# Lee y valida un bloque (bytes de un CSV o DataFrame de una hoja de Excel). Se ejecuta en el pool de
+# procesos. Con skip_empty, como en las secciones con varias métricas, las filas sin ningún valor de
+# un tipo de datos no cuentan para ese tipo
+def parse_block(content: Union[bytes, pd.DataFrame], user_id: int, data_types: List[str], skip_empty: bool = False) -> ParsedBlock:
+    if isinstance(content, pd.DataFrame):
+        df, rows, malformed = content, np.arange(2, len(content) + 2), []
+        lines = len(content)
+    else:
+        df, rows, malformed = read_block(content)
+        lines = block_lines(content) - 1
+
+    frames, errors = {}, []
+    if malformed:
+        errors.append(pd.DataFrame({"row": [number for number, _ in malformed], "column": None,
+                                    "value": [text for _, text in malformed], "error": "fila mal formada"}))
+    for data_type in data_types:
+        part, part_rows = df, rows
+        if skip_empty:
+            keep = ~df[list(IMPORT_MAPPINGS[data_type]["columns"])].apply(_is_empty).to_numpy().all(axis=1)
+            part, part_rows = df[keep], rows[keep]
+        frames[data_type], type_errors = build_frame(part, user_id, data_type, part_rows)
+        errors.append(type_errors)
+
+    errors = pd.concat(errors, ignore_index=True).sort_values("row", kind="stable") if errors else None
+    if errors is None or errors.empty:
+        return ParsedBlock(frames, len(df) + len(malformed), 0, [], lines)
+    errors["row"] = errors["row"].astype(int)
+    return ParsedBlock(frames, len(df) + len(malformed), errors["row"].nunique(),
+                       errors.head(IMPORT_MAX_ERRORS).to_dict("records"), lines)
+
+
+# Filas inválidas de una importación: se cuentan todas y se detallan las IMPORT_MAX_ERRORS primeras
+class ErrorReport:
+    def __init__(self):
+        self.invalid_rows = 0
+        self.errors: List[dict] = []
+
+    # block es un ParsedBlock u otro ErrorReport
+    def add(self, block, **extra):
+        self.invalid_rows += block.invalid_rows
+        for error in block.errors[:max(0, IMPORT_MAX_ERRORS - len(self.errors))]:
+            self.errors.append({**extra, **error})
+
+    def summary(self):
+        return {"invalid_rows": self.invalid_rows, "errors": self.errors,
+                "errors_truncated": len(self.errors) < self.invalid_rows and len(self.errors) >= IMPORT_MAX_ERRORS}
+
+
+# Bytes que se leen para estimar el tamaño medio de una fila y bloque mínimo
+SAMPLE_BYTES = 64 * 1024
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+# El pool se crea con la primera importación que supera IMPORT_PARSE_POOL_MIN_BYTES. spawn y no fork: el proceso del servidor tiene
+# hilos y conexiones abiertas que no deben copiarse a los hijos
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=IMPORT_PARSE_PROCESSES,
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+
+# Divide el CSV en bloques de unas chunk_size filas cortando siempre en un salto de línea; cada
+# bloque lleva la cabecera para poder leerse por separado. No admite saltos de línea dentro de
+# campos entre comillas
+def csv_blocks(source: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[List[str], Iterator[bytes]]:
+    header = source.readline()
+    if header.startswith(b"\xef\xbb\xbf"):
+        header = header[3:]
+    if not header.endswith(b"\n"):
+        header += b"\n"
+    columns = clean_columns(next(csv.reader([header.decode("utf-8")]), []))
+    sample = source.read(SAMPLE_BYTES)
+    row_bytes = len(sample) / max(1, sample.count(b"\n"))
+    block_bytes = max(SAMPLE_BYTES, int(chunk_size * row_bytes))
+
+    def blocks():
+        pending = sample
+        while True:
+            data = source.read(block_bytes)
+            buffer = pending + data
+            if not data:
+                if buffer.strip():
+                    yield header + buffer
+                return
+            cut = buffer.rfind(b"\n") + 1
+            if cut:
+                yield header + buffer[:cut]
+            pending = buffer[cut:]
+
+    return columns, blocks()
+
+
+# Lee y valida un CSV por bloques y los devuelve en orden, con los números de línea del archivo
+# completo. Si el archivo es grande, hay más de un bloque y más de un proceso se leen en paralelo en
+# el pool, con un máximo de dos bloques en curso por proceso para que la memoria no crezca con el archivo
+def parse_csv(source: BinaryIO, user_id: int, data_types: Optional[List[str]] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              skip_empty: bool = False, processes: int = IMPORT_PARSE_PROCESSES,
+              pool_min_bytes: int = IMPORT_PARSE_POOL_MIN_BYTES) -> Iterator[ParsedBlock]:
+    position = source.tell()
+    size = source.seek(0, io.SEEK_END) - position
+    source.seek(position)
+    columns, blocks = csv_blocks(source, chunk_size)
+    if data_types is None:
+        data_types = detect_data_types(columns)
+        if not data_types:
+            raise ValueError(f"No se reconoce el tipo de datos (columnas: {', '.join(columns)})")
+    missing = [c for data_type in data_types for c in ["fecha", *IMPORT_MAPPINGS[data_type]["columns"]] if c not in columns]
+    if missing:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(dict.fromkeys(missing))}")
+
+    first = next(blocks, None)
+    second = next(blocks, None)
+    if first is None:
+        return
+    if processes <= 1 or second is None or size < pool_min_bytes:
+        results = (parse_block(block, user_id, data_types, skip_empty)
+                   for block in ([first] if second is None else itertools.chain([first, second], blocks)))
+    else:
+        results = _parse_in_pool([first, second], blocks, user_id, data_types, skip_empty, processes)
+
+    # Cada bloque repite la cabecera: su línea 2 es la primera después de las de los bloques anteriores
+    offset = 0
+    for block in results:
+        for error in block.errors:
+            error["row"] += offset
+        offset += block.lines
+        yield block
+
+
+def _parse_in_pool(head: List[bytes], blocks: Iterator[bytes], user_id: int, data_types: List[str], skip_empty: bool, processes: int):
+    pool = _get_parse_pool()
+    pending = []
+    try:
+        for block in itertools.chain(head, blocks):
+            pending.append(pool.submit(parse_block, block, user_id, data_types, skip_empty))
+            if len(pending) >= processes * 2:
+                yield pending.pop(0).result()
+        while pending:
+            yield pending.pop(0).result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# Tipos de datos que contiene una sección: todos aquellos cuyas columnas aparecen en ella
+def detect_data_types(columns) -> List[str]:
+    columns = set(columns)
+    if "fecha" not in columns:
+        return []
+    return [data_type for data_type, mapping in IMPORT_MAPPINGS.items() if set(mapping["columns"]) <= columns]
+
+
+# Divide una subida masiva en secciones (nombre, contenido). Admite un zip de CSV, un libro de Excel
+# con una hoja por métrica (requiere openpyxl) o un único CSV con secciones separadas por líneas en
+# blanco, cada una con su propia cabecera
+def split_sections(source: BinaryIO) -> List[Tuple[str, Union[bytes, pd.DataFrame]]]:
+    if zipfile.is_zipfile(source):
+        source.seek(0)
+        with zipfile.ZipFile(source) as archive:
+            names = archive.namelist()
+            if "xl/workbook.xml" in names:
+                source.seek(0)
+                sheets = pd.read_excel(source, sheet_name=None)
+                return [(name, clean_frame(df)) for name, df in sheets.items() if len(df.columns)]
+            # Cada miembro se lee aquí: ZipFile no admite lecturas desde varios hilos
+            return [(name, archive.read(name)) for name in names
+                    if name.lower().endswith(".csv") and not name.startswith("__MACOSX/")]
+    source.seek(0)
+    text = source.read().decode("utf-8-sig")
+    blocks = re.split(r"\n(?:[ \t;]*\r?\n)+", text.strip())
+    return [(f"section {i + 1}", block.encode()) for i, block in enumerate(blocks) if block.strip()]
+
+
+# Lee una sección y la convierte en un DataFrame por cada tipo de datos que contiene. En una sección
+# con varias métricas cada fila solo aporta las que trae rellenas
+def parse_section(name: str, content: Union[bytes, pd.DataFrame], user_id: int, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    report = ErrorReport()
+    if isinstance(content, pd.DataFrame):
+        data_types = detect_data_types(content.columns)
+        if not data_types:
+            raise ValueError(f"No se reconoce el tipo de datos de '{name}' (columnas: {', '.join(content.columns)})")
+        blocks = [parse_block(content, user_id, data_types, skip_empty=True)]
+    else:
+        try:
+            blocks = list(parse_csv(io.BytesIO(content), user_id, chunk_size=chunk_size, skip_empty=True))
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}")
+
+    parts: Dict[str, List[pd.DataFrame]] = {}
+    for block in blocks:
+        report.add(block, section=name)
+        for data_type, frame in block.frames.items():
+            parts.setdefault(data_type, []).append(frame)
+    return {data_type: pd.concat(frames, ignore_index=True) for data_type, frames in parts.items()}, report
+
+
+# Lee todas las secciones en paralelo y junta las filas de cada tipo de datos
+def parse_bulk(source: BinaryIO, user_id: int, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = IMPORT_PARSE_WORKERS):
+    sections = split_sections(source)
+    if not sections:
+        raise ValueError("El archivo no contiene secciones")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        parsed = list(executor.map(lambda section: parse_section(*section, user_id, chunk_size), sections))
+
+    by_type: Dict[str, List[pd.DataFrame]] = {}
+    report = ErrorReport()
+    for frames, section_report in parsed:
+        report.add(section_report)
+        for data_type, frame in frames.items():
+            by_type.setdefault(data_type, []).append(frame)
+    summary = [{"name": name, "data_types": list(frames), "invalid_rows": section_report.invalid_rows}
+               for (name, _), (frames, section_report) in zip(sections, parsed)]
+    # Si dos secciones traen la misma fecha para una métrica gana la última, igual que dentro de un archivo
+    frames = {data_type: pd.concat(parts, ignore_index=True).drop_duplicates(subset=["date"], keep="last")
+              for data_type, parts in by_type.items()}
+    return frames, summary, report
+
+
+# Inserta o actualiza las filas en lotes de un único INSERT ... ON CONFLICT (date, userId) DO UPDATE.
+# Las tablas particionadas no permiten leer xmax en el RETURNING para separar inserciones de
+# actualizaciones, así que la misma sentencia cuenta en un CTE las filas del lote que ya existían: todos
+# los CTE ven la tabla como estaba antes del INSERT. Un candado por usuario y tabla, hasta el final de
+# la transacción, evita que otra importación (en otro worker) escriba las mismas filas entre medias
+def upsert_frame(db: Session, data_type: str, frame: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE):
+    table = IMPORT_MAPPINGS[data_type]["table"]
+    value_columns = list(IMPORT_MAPPINGS[data_type]["columns"].values())
+    batch_size = max(1, min(batch_size, MAX_BIND_PARAMS // len(frame.columns)))
+    if frame.empty:
+        return 0, 0
+    user_id = int(frame["userId"].iloc[0])
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(table.__tablename__), user_id)))
+
+    inserted = 0
+    updated = 0
+    for start in range(0, len(frame), batch_size):
+        batch = frame.iloc[start:start + batch_size]
+        records = batch.to_dict("records")
+        existing = select(table.date).where(table.userId == user_id, table.date.in_(batch["date"].tolist())).cte("existing")
+        stmt = insert(table).values(records)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.date, table.userId],
+            set_={column: stmt.excluded[column] for column in value_columns},
+        )
+        written = stmt.returning(table.date).cte("written")
+        batch_written, batch_updated = db.execute(select(
+            select(func.count()).select_from(written).scalar_subquery(),
+            select(func.count()).select_from(existing).scalar_subquery(),
+        )).one()
+        updated += batch_updated
+        inserted += batch_written - batch_updated
+
+    return inserted, updated
+
+
+# Resumen de la importación con el rendimiento obtenido. skipped son las filas que la
+# sincronización incremental no llegó a escribir
+def import_stats(inserted: int, updated: int, started: float, skipped: int = 0):
+    elapsed = perf_counter() - started
+    rate = lambda n: round(n / elapsed, 1) if elapsed > 0 else None
+    return {
+        "rows": inserted + updated,
+        "written": inserted + updated,
+        "skipped": skipped,
+        "inserted": inserted,
+        "updated": updated,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": rate(inserted + updated),
+        "inserted_per_second": rate(inserted),
+        "updated_per_second": rate(updated),
+    }
@@ -0,0 +1,266 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from datetime import datetime
+from time import sleep, time
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import delete, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from .database import SessionLocal
+from .crud import import_sensor_data, import_bulk_data
+from .importer import IMPORT_MAPPINGS
+from .metrics import PROFILE_IMPORTS, profiled
+from .models import ImportJobRecord
+
+logger = logging.getLogger(__name__)
+
+# Número de hilos que procesan importaciones en segundo plano
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+# Con IMPORT_JOBS_INLINE=1 el trabajo se ejecuta dentro de la misma petición (útil para pruebas)
+IMPORT_JOBS_INLINE = os.getenv("IMPORT_JOBS_INLINE", "0") == "1"
+# Segundos que se conserva el estado de un trabajo terminado
+IMPORT_JOB_RETENTION = int(os.getenv("IMPORT_JOB_RETENTION", "3600"))
+# Directorio donde se guardan los archivos subidos mientras esperan su turno
+IMPORT_UPLOAD_DIR = os.getenv("IMPORT_UPLOAD_DIR") or None
+# El estado de cada trabajo se guarda en la tabla importJobs para consultarlo desde cualquier worker.
+# El proceso que tiene el trabajo renueva su heartbeatAt cada IMPORT_JOB_HEARTBEAT segundos; un
+# trabajo sin terminar cuyo heartbeat tiene más de 3 intervalos se da por interrumpido
+IMPORT_JOB_HEARTBEAT = int(os.getenv("IMPORT_JOB_HEARTBEAT", "30"))
+INTERRUPTED_ERROR = "El trabajo se interrumpió: el proceso que lo tenía se reinició o se detuvo"
+
+
+# Los instantes se guardan en memoria como segundos epoch y en la tabla como UTC sin zona
+def _utc(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.utcfromtimestamp(timestamp) if timestamp is not None else None
+
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    return (value - datetime(1970, 1, 1)).total_seconds() if value is not None else None
+
+
+class ImportJob:
+    def __init__(self, user_id: int, data_type: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.data_type = data_type
+        self.state = "queued"
+        self.rows_processed = 0
+        self.chunks = 0
+        self.result: Optional[dict] = None
+        self.errors: List[str] = []
+        self.created_at = time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def on_progress(self, rows: int, chunks: int):
+        self.rows_processed = rows
+        self.chunks = chunks
+        _save(self, required=False)
+
+    def to_dict(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "data_type": self.data_type,
+            "state": self.state,
+            "rows_processed": self.rows_processed,
+            "chunks": self.chunks,
+            "seconds": round(elapsed, 3) if elapsed is not None else None,
+            "rows_per_second": round(self.rows_processed / elapsed, 1) if elapsed else None,
+            "errors": self.errors,
+            "result": self.result,
+        }
+
+    def to_record(self) -> dict:
+        return {
+            "id": self.id, "userId": self.user_id, "dataType": self.data_type, "state": self.state,
+            "rowsProcessed": self.rows_processed, "chunks": self.chunks, "errors": self.errors, "result": self.result,
+            "createdAt": _utc(self.created_at), "startedAt": _utc(self.started_at), "finishedAt": _utc(self.finished_at),
+            "heartbeatAt": datetime.utcnow(),
+        }
+
+    @classmethod
+    def from_record(cls, record: ImportJobRecord) -> "ImportJob":
+        job = cls(record.userId, record.dataType)
+        job.id = record.id
+        job.state = record.state
+        job.rows_processed = record.rowsProcessed
+        job.chunks = record.chunks
+        job.errors = list(record.errors)
+        job.result = record.result
+        job.created_at, job.started_at, job.finished_at = _epoch(record.createdAt), _epoch(record.startedAt), _epoch(record.finishedAt)
+        return job
+
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+_jobs: Dict[str, ImportJob] = {}
+_jobs_lock = threading.Lock()
+
+# Un candado por (usuario, data_type): los upserts del mismo usuario y tabla se ejecutan en serie
+_key_locks: Dict[Tuple[int, str], threading.Lock] = {}
+
+
+def _key_lock(user_id: int, data_type: str) -> threading.Lock:
+    with _jobs_lock:
+        return _key_locks.setdefault((user_id, data_type), threading.Lock())
+
+
+# Guarda el estado del trabajo en importJobs. El progreso no es imprescindible: si falla la escritura
+# la importación sigue y el estado se vuelve a guardar en el siguiente paso
+def _save(job: ImportJob, required: bool = True):
+    values = job.to_record()
+    stmt = insert(ImportJobRecord).values(**values)
+    stmt = stmt.on_conflict_do_update(index_elements=[ImportJobRecord.id],
+                                      set_={column: stmt.excluded[column] for column in values if column != "id"})
+    try:
+        with SessionLocal() as db:
+            db.execute(stmt)
+            db.commit()
+    except Exception:
+        if required:
+            raise
+        logger.warning("No se pudo guardar el estado del trabajo de importación %s", job.id, exc_info=True)
+
+
+# Renueva el heartbeat de los trabajos de este proceso que no han terminado (en cola o en curso)
+def _heartbeat():
+    while True:
+        sleep(IMPORT_JOB_HEARTBEAT)
+        with _jobs_lock:
+            job_ids = [job.id for job in _jobs.values() if job.finished_at is None]
+        if not job_ids:
+            continue
+        try:
+            with SessionLocal() as db:
+                db.execute(update(ImportJobRecord).where(ImportJobRecord.id.in_(job_ids))
+                           .values(heartbeatAt=datetime.utcnow()))
+                db.commit()
+        except Exception:
+            logger.warning("No se pudo renovar el heartbeat de los trabajos de importación", exc_info=True)
+
+
+_heartbeat_thread: Optional[threading.Thread] = None
+
+
+def _start_heartbeat():
+    global _heartbeat_thread
+    with _jobs_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat, name="import-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+
+# Elimina los trabajos terminados (o interrumpidos) hace más de IMPORT_JOB_RETENTION segundos
+def _prune_jobs():
+    limit = time() - IMPORT_JOB_RETENTION
+    with _jobs_lock:
+        for job_id in [j.id for j in _jobs.values() if j.finished_at and j.finished_at < limit]:
+            del _jobs[job_id]
+    with SessionLocal() as db:
+        db.execute(delete(ImportJobRecord).where(or_(ImportJobRecord.finishedAt < _utc(limit),
+                                                     ImportJobRecord.heartbeatAt < _utc(limit))))
+        db.commit()
+
+
+def _run_job(job: ImportJob, path: str, run, data_types: List[str]):
+    try:
+        # Los candados se toman siempre en orden para que dos trabajos no se bloqueen entre sí
+        with ExitStack() as stack:
+            for data_type in sorted(data_types):
+                stack.enter_context(_key_lock(job.user_id, data_type))
+            job.state = "running"
+            job.started_at = time()
+            _save(job, required=False)
+            db = SessionLocal()
+            try:
+                with open(path, "rb") as source, profiled(f"import-{job.id}") if PROFILE_IMPORTS else nullcontext():
+                    job.result = run(db, source, job.on_progress)
+                job.state = "succeeded"
+            except HTTPException as e:
+                job.errors.append(str(e.detail))
+                job.state = "failed"
+            except Exception as e:
+                job.errors.append(str(e))
+                job.state = "failed"
+            finally:
+                db.close()
+    finally:
+        job.finished_at = time()
+        _save(job, required=False)
+        os.remove(path)
+
+
+# Guarda el archivo subido y encola el trabajo; devuelve el trabajo de inmediato
+def _submit(job: ImportJob, file: UploadFile, suffix: str, run, data_types: List[str]) -> ImportJob:
+    _prune_jobs()
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=IMPORT_UPLOAD_DIR)
+    # Hasta que _run_job se hace cargo del archivo (y lo borra al terminar), cualquier fallo lo borra aquí
+    try:
+        with tmp:
+            shutil.copyfileobj(file.file, tmp)
+        _save(job)
+        with _jobs_lock:
+            _jobs[job.id] = job
+        _start_heartbeat()
+        if not IMPORT_JOBS_INLINE:
+            _executor.submit(_run_job, job, tmp.name, run, data_types)
+    except BaseException:
+        with _jobs_lock:
+            _jobs.pop(job.id, None)
+        os.unlink(tmp.name)
+        raise
+
+    if IMPORT_JOBS_INLINE:
+        _run_job(job, tmp.name, run, data_types)
+    return job
+
+
+def submit_import(user_id: int, data_type: str, file: UploadFile, **options) -> ImportJob:
+    run = lambda db, source, on_progress: import_sensor_data(db, user_id, data_type, source,
+                                                             on_progress=on_progress, **options)
+    return _submit(ImportJob(user_id, data_type), file, ".csv", run, [data_type])
+
+
+# La importación masiva puede tocar cualquier métrica del usuario: bloquea todas mientras dura
+def submit_bulk_import(user_id: int, file: UploadFile, **options) -> ImportJob:
+    run = lambda db, source, on_progress: import_bulk_data(db, user_id, source, on_progress=on_progress, **options)
+    suffix = os.path.splitext(file.filename or "")[1] or ".bin"
+    return _submit(ImportJob(user_id, "bulk"), file, suffix, run, list(IMPORT_MAPPINGS))
+
+
+# Marca como fallido un trabajo que ningún proceso tiene ya. La condición evita pisar un heartbeat o
+# un final que llegue a la vez
+def _interrupt(db, job: ImportJob) -> ImportJob:
+    job.state = "failed"
+    job.errors.append(INTERRUPTED_ERROR)
+    job.finished_at = time()
+    db.execute(update(ImportJobRecord)
+               .where(ImportJobRecord.id == job.id, ImportJobRecord.finishedAt.is_(None),
+                      ImportJobRecord.heartbeatAt < _utc(time() - 3 * IMPORT_JOB_HEARTBEAT))
+               .values(state=job.state, errors=job.errors, finishedAt=_utc(job.finished_at)))
+    db.commit()
+    return job
+
+
+# Los trabajos de este proceso se leen de memoria; los de otros workers, de importJobs
+def get_import_job(job_id: str, user_id: int):
+    job = _jobs.get(job_id)
+    if job is None:
+        with SessionLocal() as db:
+            record = db.get(ImportJobRecord, job_id)
+            if record is not None:
+                job = ImportJob.from_record(record)
+                if job.finished_at is None and _epoch(record.heartbeatAt) < time() - 3 * IMPORT_JOB_HEARTBEAT:
+                    job = _interrupt(db, job)
+    # Un usuario solo puede consultar sus propios trabajos
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.to_dict()
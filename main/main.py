@@ -1,20 +1,49 @@
-from datetime import date
+import os
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, status, UploadFile, File
 from pydantic import BaseModel
 from fastapi.security import OAuth2PasswordBearer
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from .database import SessionLocal, engine, Base
+from typing import List, Optional, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import AsyncSessionLocal, pool_stats, read_session
+from .migrate import run_migrations
+from .partitions import ensure_future_partitions
+from .importer import IMPORT_MAPPINGS, DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE
+from .sync import SYNC_MODES
+from .jobs import submit_import, submit_bulk_import, get_import_job
+from .cache import cache
+from .metrics import InstrumentationMiddleware, registry
+from .schemas import (
+    StatusResponse, ErrorResponse, TokenResponse, UserProfile,
+    DashboardResponse, HistoryResponse, HistoryPageResponse, DerivedResponse, ImportAccepted, ImportJobStatus, CohortResponse
+)
 from .crud import (
     login_user, register_user, logout_user, 
     get_user_profile, update_user_profile,
-    import_sensor_data, get_dashboard_view,
-    get_data_history, add_dummy_user, get_current_user
+    get_dashboard_view,
+    get_data_history, get_raw_history, get_derived_metrics, add_dummy_user, get_current_user, HISTORY_PAGE_SIZE
 )
+from .analytics import get_cohort_view, require_coach
+from .export import export_data
 # Definir oauth2_scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-app = FastAPI()
+RUN_MIGRATIONS = os.getenv("RUN_MIGRATIONS", "1") == "1"
+
+# Aplicar las migraciones pendientes al arrancar (desactivable con RUN_MIGRATIONS=0)
+# y crear las particiones de los próximos meses
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if RUN_MIGRATIONS:
+        await run_in_threadpool(run_migrations)
+    await run_in_threadpool(ensure_future_partitions)
+    yield
+
+# Las respuestas se validan con los esquemas de schemas.py y se serializan con orjson
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,25 +52,27 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Latencia, consultas por petición y cabecera Server-Timing (ver metrics.py)
+app.add_middleware(InstrumentationMiddleware)
 
-# Conexión a la base de datos
-Base.metadata.create_all(bind=engine)
+# Dependency para obtener la sesión asíncrona de BD
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
-# Dependency para obtener la sesión de BD
-def get_db():
-    db = SessionLocal()
-    try:
+# Dependency para las consultas de solo lectura (réplica si DATABASE_READ_HOST está configurado,
+# salvo justo después de una escritura del usuario)
+async def get_read_db(user_id: int = Depends(get_current_user)):
+    async with read_session(user_id) as db:
         yield db
-    finally:
-        db.close()
 
 class LoginRequest(BaseModel):
     username: str
     password: str
 
-@app.post("/login")
-def login(request: LoginRequest, db: Session = Depends(get_db)):
-    return login_user(db, request.username, request.password)
+@app.post("/login", response_model=TokenResponse)
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
+    return await login_user(db, request.username, request.password)
 
 class RegisterRequest(BaseModel):
     email: str
@@ -59,40 +90,102 @@ class UpdateProfileRequest(BaseModel):
     password: Optional[str] = None
     birthdate: Optional[date] = None
     gender: Optional[str] = None
-@app.post("/register")
-def register(request: RegisterRequest, db: Session = Depends(get_db)):
-    return register_user(db, request)
-
-
-@app.post("/logout")
-def logout(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    return logout_user(db, token)
-
-
-@app.get("/profile")
-def get_profile(user_id: int = Depends(get_current_user), db: Session = Depends(get_db)):
-    print("Hola")
-    return get_user_profile(db, user_id)
-
-@app.post("/profile/update")
-def update_profile(request: UpdateProfileRequest, user_id: int = Depends(get_current_user), db: Session = Depends(get_db)):
-    print("Hola2")
-    print(request.birthdate)
-    return update_user_profile(db, user_id, request)
-
-@app.post("/import-data")
-def import_data(data_type: str, file: UploadFile = File(...), user: int = Depends(get_current_user), db: Session = Depends(get_db)):
-    return import_sensor_data(db, user, data_type, file)
-
-@app.get("/dashboard/view")
-def dashboard_view(user_id: int = Depends(get_current_user), db: Session = Depends(get_db)):
-    return get_dashboard_view(db, user_id)
-
-
-@app.get("/dashboard/history")
-def data_history(data_type: str, period: str, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    return get_data_history(db, user, data_type, period)
-
-@app.post("/add-dummy-user")
-def add_dummy_user_route(db: Session = Depends(get_db)):
-    return add_dummy_user(db)
+@app.post("/register", response_model=StatusResponse)
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db)):
+    return await register_user(db, request)
+
+
+@app.post("/logout", response_model=StatusResponse)
+async def logout(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    return await logout_user(db, token)
+
+
+@app.get("/profile", response_model=UserProfile)
+async def get_profile(user_id: int = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await get_user_profile(db, user_id)
+
+@app.post("/profile/update", response_model=StatusResponse)
+async def update_profile(request: UpdateProfileRequest, user_id: int = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await update_user_profile(db, user_id, request)
+
+# Se mantiene síncrono: FastAPI lo ejecuta en el threadpool mientras copia el archivo a disco
+@app.post("/import-data", status_code=status.HTTP_202_ACCEPTED, response_model=ImportAccepted)
+def import_data(data_type: str, file: UploadFile = File(...), batch_size: int = DEFAULT_BATCH_SIZE, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                sync: str = "full", user: int = Depends(get_current_user)):
+    if data_type not in IMPORT_MAPPINGS:
+        raise HTTPException(status_code=400, detail="Tipo de datos no válido para importación")
+    # full escribe todo el archivo; watermark y hash saltan lo que ya se importó antes (ver main.sync)
+    if sync not in SYNC_MODES:
+        raise HTTPException(status_code=400, detail=f"sync debe ser uno de: {', '.join(SYNC_MODES)}")
+    # La importación se procesa en segundo plano; el cliente consulta su estado en /import-jobs/{job_id}
+    job = submit_import(user, data_type, file, batch_size=batch_size, chunk_size=chunk_size, sync=sync)
+    return {"status": "accepted", "job_id": job.id, "state": job.state}
+
+# Un archivo con varias métricas: zip de CSV, Excel con una hoja por métrica o CSV con secciones
+@app.post("/import-data/bulk", status_code=status.HTTP_202_ACCEPTED, response_model=ImportAccepted)
+def import_data_bulk(file: UploadFile = File(...), batch_size: int = DEFAULT_BATCH_SIZE, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     sync: str = "full", user: int = Depends(get_current_user)):
+    if sync not in SYNC_MODES:
+        raise HTTPException(status_code=400, detail=f"sync debe ser uno de: {', '.join(SYNC_MODES)}")
+    job = submit_bulk_import(user, file, batch_size=batch_size, chunk_size=chunk_size, sync=sync)
+    return {"status": "accepted", "job_id": job.id, "state": job.state}
+
+# El estado se guarda en la base de datos: se puede consultar desde cualquier worker
+@app.get("/import-jobs/{job_id}", response_model=ImportJobStatus)
+def import_job_status(job_id: str, user: int = Depends(get_current_user)):
+    return get_import_job(job_id, user)
+
+@app.get("/dashboard/view", response_model=Union[DashboardResponse, ErrorResponse])
+async def dashboard_view(user_id: int = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    return await get_dashboard_view(db, user_id)
+
+
+@app.get("/dashboard/history", response_model=Union[HistoryResponse, ErrorResponse])
+async def data_history(data_type: str, period: str, resolution: Optional[str] = None, max_points: int = 300, agg: Optional[str] = None,
+                       format: str = 'rows', user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    return await get_data_history(db, user, data_type, period, resolution, max_points, agg, format)
+
+# Filas crudas entre from y to (to excluido), por páginas; next_cursor da la página siguiente
+@app.get("/dashboard/history/raw", response_model=Union[HistoryPageResponse, ErrorResponse])
+async def raw_history(data_type: str, start: Optional[datetime] = Query(None, alias="from"), end: Optional[datetime] = Query(None, alias="to"),
+                      cursor: Optional[str] = None, limit: int = HISTORY_PAGE_SIZE, order: str = 'asc', format: str = 'rows',
+                      user: int = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    return await get_raw_history(db, user, data_type, start, end, cursor, limit, order, format)
+
+# IMC, medias móviles, variación semanal y rachas de pasos y agua, un valor por día del período
+@app.get("/dashboard/derived", response_model=Union[DerivedResponse, ErrorResponse])
+async def derived_metrics(period: str = 'month', user: int = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    return await get_derived_metrics(db, user, period)
+
+# Descarga de los datos de sensores en CSV o Parquet (zip con un archivo por métrica si hay varios)
+@app.get("/export", response_model=ErrorResponse)
+async def export(data_type: Optional[List[str]] = Query(None), format: str = 'csv', start: Optional[datetime] = Query(None, alias="from"),
+                 end: Optional[datetime] = Query(None, alias="to"), zip: bool = False, user: int = Depends(get_current_user)):
+    return export_data(user, data_type, format, start, end, zip)
+
+# Vista de varios usuarios para los entrenadores (COACH_USER_IDS), paginada por userId
+@app.get("/analytics/cohort", response_model=Union[CohortResponse, ErrorResponse])
+async def cohort_view(metric: str, period: str, granularity: str = 'week', cursor: Optional[int] = None, limit: int = 100,
+                      coach: int = Depends(require_coach), db: AsyncSession = Depends(get_read_db)):
+    return await get_cohort_view(db, metric, period, granularity, cursor, limit)
+
+@app.post("/add-dummy-user", response_model=StatusResponse)
+async def add_dummy_user_route(db: AsyncSession = Depends(get_db)):
+    return await add_dummy_user(db)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.stats()
+
+@app.get("/db/pool")
+async def db_pool_stats():
+    return pool_stats()
+
+# Métricas en formato de texto de Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    gauges = {}
+    for engine_name, stats in pool_stats().items():
+        for stat in ("size", "checked_out"):
+            gauges.setdefault(f"db_pool_{stat}", {})[(("engine", engine_name),)] = stats[stat]
+    return PlainTextResponse(registry.render(gauges), media_type="text/plain; version=0.0.4")
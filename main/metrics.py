@@ -0,0 +1,255 @@
+import bisect
+import contextvars
+import cProfile
+import itertools
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+from starlette.routing import Match
+
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+# Métricas por ruta en /metrics y cabecera Server-Timing en cada respuesta (1 = activadas)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+# Perfilado por muestreo: 1 de cada PROFILE_EVERY peticiones (0 = nunca) y, con PROFILE_IMPORTS=1,
+# cada trabajo de importación. PROFILER es "cprofile" (.prof, se abre con pstats o snakeviz) o
+# "pyinstrument" (.html, requiere el paquete). Las peticiones solo se perfilan con pyinstrument (ver
+# request_profile_every). Los perfiles se guardan en PROFILE_DIR
+PROFILE_EVERY = int(os.getenv("PROFILE_EVERY", "0"))
+PROFILE_IMPORTS = os.getenv("PROFILE_IMPORTS", "0") == "1"
+PROFILER = os.getenv("PROFILER", "cprofile")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "profiles"))
+
+# Límites superiores (segundos) de los intervalos del histograma de latencias
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# Consultas hechas durante una petición. Los hooks de SQLAlchemy la encuentran por la variable de
+# contexto, que se hereda en el threadpool y en los greenlets del driver async. No se cuentan filas:
+# asyncpg no da un rowcount fiable en los SELECT y las filas se leen después, fuera de estos hooks
+class QueryStats:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _query_stats.get()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.seconds += perf_counter() - context.metrics_started
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels) -> str:
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for name, value in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+# Métricas acumuladas del proceso, por método y plantilla de ruta (no por URL: /import-jobs/{job_id})
+class Registry:
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.in_flight: Dict[Tuple[str, str], int] = {}
+        self.db_queries: Dict[Tuple[str, str], int] = {}
+        self.db_seconds: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def started(self, method: str, route: str):
+        with self._lock:
+            self.in_flight[(method, route)] = self.in_flight.get((method, route), 0) + 1
+
+    def finished(self, method: str, route: str, status: int, elapsed: float, stats: QueryStats):
+        key = (method, route)
+        with self._lock:
+            self.in_flight[key] -= 1
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.latency.setdefault(key, Histogram()).observe(elapsed)
+            self.db_queries[key] = self.db_queries.get(key, 0) + stats.queries
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.seconds
+
+    # Formato de texto de Prometheus (versión 0.0.4)
+    def render(self, gauges: Optional[Dict[str, Dict[Tuple[Tuple[str, str], ...], float]]] = None) -> str:
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        with self._lock:
+            family("http_requests_total", "counter", "Peticiones HTTP terminadas",
+                   [f"http_requests_total{_labels(method=m, route=r, status=s)} {n}" for (m, r, s), n in sorted(self.requests.items())])
+            family("http_requests_in_flight", "gauge", "Peticiones HTTP en curso",
+                   [f"http_requests_in_flight{_labels(method=m, route=r)} {n}" for (m, r), n in sorted(self.in_flight.items())])
+            samples = []
+            for (m, r), histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip([*map(str, histogram.buckets), "+Inf"], histogram.counts):
+                    cumulative += count
+                    samples.append(f"http_request_duration_seconds_bucket{_labels(method=m, route=r, le=bound)} {cumulative}")
+                samples.append(f"http_request_duration_seconds_sum{_labels(method=m, route=r)} {histogram.sum}")
+                samples.append(f"http_request_duration_seconds_count{_labels(method=m, route=r)} {histogram.count}")
+            family("http_request_duration_seconds", "histogram", "Latencia de las peticiones HTTP", samples)
+            family("db_queries_total", "counter", "Consultas SQL hechas por las peticiones",
+                   [f"db_queries_total{_labels(method=m, route=r)} {n}" for (m, r), n in sorted(self.db_queries.items())])
+            family("db_query_seconds_total", "counter", "Tiempo total en la base de datos de las peticiones",
+                   [f"db_query_seconds_total{_labels(method=m, route=r)} {n}" for (m, r), n in sorted(self.db_seconds.items())])
+
+        for name, samples in (gauges or {}).items():
+            family(name, "gauge", name.replace("_", " "),
+                   [f"{name}{_labels(**dict(labels))} {value}" for labels, value in samples.items()])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Solo un perfil a la vez: cProfile no admite dos perfiladores activos en el mismo hilo
+_profile_lock = threading.Lock()
+_request_counter = itertools.count(1)
+
+
+# Cada cuántas peticiones se perfila una. cProfile mide el hilo entero y en el event loop mezclaría
+# en el perfil de la petición todas las corrutinas que se ejecutan a la vez; solo sería válido con
+# una petición en curso. pyinstrument en modo async atribuye a la petición solo lo que ocurre en su
+# tarea, así que sin él no se perfilan peticiones (los trabajos de importación van en su propio hilo
+# y sí admiten cProfile)
+def request_profile_every(every: int, profiler: str) -> int:
+    if not every:
+        return 0
+    if profiler != "pyinstrument":
+        logger.warning("PROFILE_EVERY=%s se ignora con PROFILER=%s: cProfile mezcla las peticiones "
+                       "concurrentes; usa PROFILER=pyinstrument", every, profiler)
+        return 0
+    if Profiler is None:
+        logger.warning("PROFILE_EVERY=%s se ignora: el paquete 'pyinstrument' no está instalado", every)
+        return 0
+    return every
+
+
+PROFILE_REQUESTS_EVERY = request_profile_every(PROFILE_EVERY, PROFILER)
+
+
+# Perfila el bloque y guarda el resultado en PROFILE_DIR; si ya hay otro perfil en curso no hace nada
+@contextmanager
+def profiled(name: str):
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}")
+        if PROFILER == "pyinstrument":
+            if Profiler is None:
+                raise RuntimeError("PROFILER=pyinstrument pero el paquete 'pyinstrument' no está instalado")
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(path + ".html", "w") as f:
+                    f.write(profiler.output_html())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(path + ".prof")
+        logger.info("Perfil guardado en %s", path)
+    finally:
+        _profile_lock.release()
+
+
+def _route_template(scope) -> str:
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+def _server_timing(elapsed: float, stats: QueryStats) -> bytes:
+    return f'app;dur={elapsed * 1000:.1f}, db;dur={stats.seconds * 1000:.1f};desc="{stats.queries} queries"'.encode()
+
+
+# Middleware ASGI: latencia, peticiones en curso y consultas de cada petición, cabecera Server-Timing
+# y perfilado de una de cada PROFILE_REQUESTS_EVERY peticiones
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = _route_template(scope)
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        started = perf_counter()
+        status = 500
+        registry.started(method, route)
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(perf_counter() - started, stats)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        sample = PROFILE_REQUESTS_EVERY and next(_request_counter) % PROFILE_REQUESTS_EVERY == 0
+        try:
+            if sample:
+                with profiled(f"{method}{route.replace('/', '_').replace('{', '').replace('}', '')}"):
+                    await self.app(scope, receive, send_with_timing)
+            else:
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            registry.finished(method, route, status, perf_counter() - started, stats)
+            _query_stats.reset(token)
@@ -0,0 +1,31 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from .database import engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+# Versión equivalente a las bases creadas antes con Base.metadata.create_all
+LEGACY_REVISION = "0001_initial_schema"
+
+# Clave del candado de Postgres que comparten todos los workers al migrar
+MIGRATION_LOCK_KEY = 7310001
+
+
+# Aplica las migraciones pendientes. Es seguro llamarla desde varios workers a la vez:
+# el candado hace que solo uno migre y los demás encuentren la base ya actualizada
+def run_migrations():
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logger"] = False
+
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        config.attributes["connection"] = connection
+
+        # Las bases existentes sin historial de migraciones parten de la versión inicial
+        inspector = inspect(connection)
+        if inspector.has_table("users") and not inspector.has_table("alembic_version"):
+            command.stamp(config, LEGACY_REVISION)
+
+        command.upgrade(config, "head")
@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Enum, Float, ForeignKey, Integer, String, DateTime, Date
+from sqlalchemy import JSON, Column, Enum, Float, ForeignKey, Index, Integer, PrimaryKeyConstraint, String, DateTime, Date
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from .database import Base
@@ -8,6 +8,12 @@ class GeneroEnum(enum.Enum):
     MASCULINO = "Masculino"
     FEMENINO = "Femenino"
 
+# Clave primaria (userId, date) de las tablas de sensores: todas las consultas filtran por
+# usuario y luego por fecha. La migración 0003 le añade las columnas de valores con INCLUDE.
+# Las tablas se particionan por mes sobre date (migración 0004, particiones en main.partitions)
+def sensor_table_args():
+    return (PrimaryKeyConstraint("userId", "date"), {"postgresql_partition_by": "RANGE (date)"})
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -19,52 +25,119 @@ class User(Base):
 
 class Weight(Base):
     __tablename__ = "weights"
-    date = Column(DateTime, primary_key=True, index=True)
-    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True, nullable=False)
+    __table_args__ = sensor_table_args()
+    date = Column(DateTime, primary_key=True)
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
 
     weight = Column(Float, nullable=False)
 
 class Height(Base):
     __tablename__ = "heights"
-    date = Column(DateTime, primary_key=True, index=True)
-    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True, nullable=False)
+    __table_args__ = sensor_table_args()
+    date = Column(DateTime, primary_key=True)
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
 
     height = Column(Float, nullable=False)
 
 class WaterConsumption(Base):
     __tablename__ = "waterConsumption"
-    date = Column(DateTime, primary_key=True, index=True)
-    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True, nullable=False)
+    __table_args__ = sensor_table_args()
+    date = Column(DateTime, primary_key=True)
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
 
     waterAmount = Column(Integer, nullable=False)
 
 class BodyFatPercentage(Base):
     __tablename__ = "bodyFatPercentage"
-    date = Column(DateTime, primary_key=True, index=True)
-    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True, nullable=False)
+    __table_args__ = sensor_table_args()
+    date = Column(DateTime, primary_key=True)
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
 
     fatPercentage = Column(Float, nullable=False)
 
 class DailySteps(Base):
     __tablename__ = "dailySteps"
-    date = Column(DateTime, primary_key=True, index=True)
-    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True, nullable=False)
+    __table_args__ = sensor_table_args()
+    date = Column(DateTime, primary_key=True)
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
 
     stepsAmount = Column(Integer, nullable=False)
 
 class Exercise(Base):
     __tablename__ = "exercises"
-    date = Column(DateTime, primary_key=True, index=True)
-    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True, nullable=False)
+    __table_args__ = sensor_table_args()
+    date = Column(DateTime, primary_key=True)
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
 
     exerciseName = Column(String, nullable=False)
     duration = Column(Integer, nullable=False)
 
 class BodyComposition(Base):
     __tablename__ = "bodyComposition"
-    date = Column(DateTime, primary_key=True, index=True)
-    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True, nullable=False)
+    __table_args__ = sensor_table_args()
+    date = Column(DateTime, primary_key=True)
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
 
     fat = Column(Float, nullable=False)
     muscle = Column(Float, nullable=False)
-    water = Column(Float, nullable=False)
\ No newline at end of file
+    water = Column(Float, nullable=False)
+
+# Resúmenes por usuario, métrica y periodo (día, semana o mes), mantenidos al importar
+class MetricRollup(Base):
+    __tablename__ = "metricRollups"
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
+    metric = Column(String, primary_key=True)
+    granularity = Column(String, primary_key=True)
+    bucket = Column(Date, primary_key=True)
+
+    total = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+    last = Column(Float, nullable=False)
+    lastDate = Column(DateTime, nullable=False)
+
+    # Las vistas de cohorte recorren una métrica para muchos usuarios a la vez (migración 0007)
+    __table_args__ = (
+        Index("ix_metricRollups_cohort", "metric", "granularity", "userId", "bucket",
+              postgresql_include=["total", "count"]),
+    )
+
+# Tokens revocados al cerrar sesión, compartidos por todos los workers; se borran al expirar
+class RevokedToken(Base):
+    __tablename__ = "revokedTokens"
+    jti = Column(String, primary_key=True)
+    expiresAt = Column(DateTime, nullable=False, index=True)
+
+# Fecha más reciente importada por usuario y tipo de datos (sincronización por marca de agua)
+class ImportWatermark(Base):
+    __tablename__ = "importWatermarks"
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
+    dataType = Column(String, primary_key=True)
+    lastDate = Column(DateTime, nullable=False)
+
+# Huella del contenido importado de cada día (sincronización por hash)
+class ImportDayHash(Base):
+    __tablename__ = "importDayHashes"
+    userId = Column(Integer, ForeignKey('users.id'), primary_key=True, nullable=False)
+    dataType = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    hash = Column(String, nullable=False)
+    rows = Column(Integer, nullable=False)
+
+# Estado de los trabajos de importación, visible desde todos los workers. heartbeatAt lo renueva el
+# proceso que tiene el trabajo; si deja de hacerlo (reinicio, caída) el trabajo se da por interrumpido
+class ImportJobRecord(Base):
+    __tablename__ = "importJobs"
+    id = Column(String, primary_key=True)
+    userId = Column(Integer, ForeignKey('users.id'), nullable=False)
+    dataType = Column(String, nullable=False)
+    state = Column(String, nullable=False)
+    rowsProcessed = Column(Integer, nullable=False)
+    chunks = Column(Integer, nullable=False)
+    errors = Column(JSON, nullable=False)
+    result = Column(JSON)
+    createdAt = Column(DateTime, nullable=False)
+    startedAt = Column(DateTime)
+    finishedAt = Column(DateTime)
+    heartbeatAt = Column(DateTime, nullable=False, index=True)
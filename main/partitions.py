@@ -0,0 +1,140 @@
+import argparse
+import os
+import re
+import threading
+from datetime import date, datetime
+from typing import Iterable, List, Union
+from sqlalchemy import text
+from .database import engine
+from .models import Weight, Height, WaterConsumption, BodyFatPercentage, DailySteps, Exercise, BodyComposition
+
+# Meses futuros que se crean por adelantado al arrancar y con el comando "ensure"
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+# Tablas de sensores particionadas por mes sobre la columna date
+PARTITIONED_TABLES = [model.__tablename__ for model in
+                      (Weight, Height, WaterConsumption, BodyFatPercentage, DailySteps, Exercise, BodyComposition)]
+
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})_(\d{2})$")
+
+# Particiones que ya se sabe que existen en este proceso; evita repetir la comprobación en cada bloque.
+# Solo vale para el mes actual y los futuros: la retención (desde la línea de comandos u otro worker)
+# puede separar o borrar los meses pasados sin que este proceso se entere
+_known = set()
+_known_lock = threading.Lock()
+
+
+def month_start(value: Union[date, datetime]) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(start: Union[date, datetime], end: Union[date, datetime]) -> Iterable[date]:
+    month, last = month_start(start), month_start(end)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _is_partitioned(connection, table: str) -> bool:
+    return connection.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"),
+        {"table": f'"{table}"'},
+    ).scalar()
+
+
+# Crea la partición como tabla suelta y luego la adjunta: ATTACH PARTITION solo toma un candado
+# SHARE UPDATE EXCLUSIVE sobre la tabla padre, así que no bloquea lecturas ni importaciones en curso
+# (CREATE TABLE ... PARTITION OF pediría un ACCESS EXCLUSIVE)
+def _create_partition(connection, table: str, month: date):
+    name = partition_name(table, month)
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": f'"{name}"'}).scalar() is not None:
+        return
+    connection.execute(text(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    connection.execute(text(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+                            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"))
+
+
+# Garantiza que existan las particiones de los meses entre start y end (incluidos).
+# Usa su propia conexión para que la partición quede visible aunque la importación siga en curso
+def ensure_partitions(table: str, start: Union[date, datetime], end: Union[date, datetime]):
+    current = month_start(datetime.utcnow())
+    months = [month for month in months_between(start, end) if month < current or (table, month) not in _known]
+    if not months:
+        return
+    with engine.begin() as connection:
+        # Varios workers pueden pedir la misma partición a la vez: se crean de una en una por tabla
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": table})
+        if _is_partitioned(connection, table):
+            for month in months:
+                _create_partition(connection, table, month)
+    with _known_lock:
+        _known.update((table, month) for month in months if month >= current)
+
+
+def ensure_future_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD):
+    today = datetime.utcnow()
+    for table in PARTITIONED_TABLES:
+        ensure_partitions(table, today, add_months(month_start(today), months_ahead))
+
+
+def list_partitions(connection, table: str) -> List[str]:
+    return connection.execute(
+        text("SELECT child.relname FROM pg_inherits "
+             "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+             "WHERE pg_inherits.inhparent = to_regclass(:table) ORDER BY child.relname"),
+        {"table": f'"{table}"'},
+    ).scalars().all()
+
+
+# Separa las particiones de los meses anteriores a los últimos keep_months. Las tablas separadas
+# quedan como tablas normales con el prefijo archive_ (para exportarlas con pg_dump) salvo que se
+# pida borrarlas; así una importación posterior de ese mes puede volver a crear la partición
+def detach_old_partitions(keep_months: int, drop: bool = False, concurrently: bool = False) -> List[str]:
+    cutoff = add_months(month_start(datetime.utcnow()), -keep_months)
+    affected = []
+    # DETACH ... CONCURRENTLY no puede ejecutarse dentro de una transacción
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for table in PARTITIONED_TABLES:
+            for name in list_partitions(connection, table):
+                match = PARTITION_SUFFIX.search(name)
+                if not match or add_months(date(int(match[1]), int(match[2]), 1), 1) > cutoff:
+                    continue
+                mode = " CONCURRENTLY" if concurrently else ""
+                connection.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"{mode}'))
+                if drop:
+                    connection.execute(text(f'DROP TABLE "{name}"'))
+                else:
+                    connection.execute(text(f'ALTER TABLE "{name}" RENAME TO "archive_{name}"'))
+                with _known_lock:
+                    _known.discard((table, date(int(match[1]), int(match[2]), 1)))
+                affected.append(name)
+    return affected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de las particiones mensuales de las tablas de sensores")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    ensure_parser = subcommands.add_parser("ensure", help="Crea las particiones de los próximos meses")
+    ensure_parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD, help="Meses futuros a crear")
+    retention_parser = subcommands.add_parser("retention", help="Separa (o borra) las particiones antiguas")
+    retention_parser.add_argument("--keep-months", type=int, required=True, help="Meses recientes que se conservan")
+    retention_parser.add_argument("--drop", action="store_true", help="Borra las particiones en lugar de archivarlas")
+    retention_parser.add_argument("--concurrently", action="store_true",
+                                  help="Usa DETACH PARTITION CONCURRENTLY (Postgres 14+) para no bloquear las consultas")
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        ensure_future_partitions(args.months_ahead)
+        print(f"Particiones garantizadas hasta {add_months(month_start(datetime.utcnow()), args.months_ahead):%Y-%m}")
+    elif args.command == "retention":
+        for name in detach_old_partitions(args.keep_months, args.drop, args.concurrently):
+            print(f"{'Borrada' if args.drop else 'Separada'}: {name}")
@@ -0,0 +1,152 @@
+import heapq
+import os
+import threading
+from datetime import datetime
+from math import ceil
+from time import time
+from typing import Optional
+from sqlalchemy import delete, exists, select
+from sqlalchemy.dialects.postgresql import insert
+from .cache import MemoryCache, get_redis_client
+from .database import SessionLocal
+from .models import RevokedToken
+
+# Dónde se guardan los tokens revocados: "database" (por defecto, compartido entre workers),
+# "redis" (REDIS_URL o el sustituto local) o "memory" (solo este proceso)
+REVOCATION_BACKEND = os.getenv("REVOCATION_BACKEND", "database")
+# Segundos que cada proceso recuerda que un token NO está revocado antes de volver a preguntar.
+# Es el retraso máximo con el que un logout hecho en otro worker se aplica en este; 0 = preguntar siempre
+REVOCATION_CACHE_TTL = int(os.getenv("REVOCATION_CACHE_TTL", "5"))
+REVOCATION_CACHE_MAX_ENTRIES = int(os.getenv("REVOCATION_CACHE_MAX_ENTRIES", "10000"))
+# La tabla se limpia de tokens expirados cada tantas revocaciones
+REVOCATION_PURGE_EVERY = int(os.getenv("REVOCATION_PURGE_EVERY", "100"))
+
+
+# Interfaz común de los almacenes de revocaciones. Solo se guarda el jti del token y su
+# expiración (segundos epoch, el claim exp); pasada la expiración la entrada ya no hace falta
+class RevocationStore:
+    def revoke(self, jti: str, expires_at: float):
+        raise NotImplementedError
+
+    def is_revoked(self, jti: str) -> bool:
+        raise NotImplementedError
+
+    def purge(self) -> int:
+        raise NotImplementedError
+
+
+# En memoria del proceso: diccionario para consultar en O(1) y un heap por expiración para
+# descartar las entradas vencidas; la memoria queda acotada por los logouts de la última media hora
+class MemoryRevocationStore(RevocationStore):
+    def __init__(self):
+        self._expires = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        with self._lock:
+            self._expires[jti] = expires_at
+            heapq.heappush(self._heap, (expires_at, jti))
+        self.purge()
+
+    def is_revoked(self, jti):
+        expires_at = self._expires.get(jti)
+        return expires_at is not None and expires_at > time()
+
+    def purge(self):
+        purged = 0
+        now = time()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, jti = heapq.heappop(self._heap)
+                if self._expires.get(jti) == expires_at:
+                    del self._expires[jti]
+                    purged += 1
+        return purged
+
+
+# Sobre Redis: cada jti es una clave con la misma expiración que el token
+class RedisRevocationStore(RevocationStore):
+    def __init__(self, client, prefix: str = "revoked:"):
+        self.client = client
+        self.prefix = prefix
+
+    def revoke(self, jti, expires_at):
+        ttl = ceil(expires_at - time())
+        if ttl > 0:
+            self.client.set(self.prefix + jti, 1, ex=ttl)
+
+    def is_revoked(self, jti):
+        return bool(self.client.exists(self.prefix + jti))
+
+    def purge(self):
+        # Redis borra las claves expiradas por sí solo
+        return 0
+
+
+# Tabla revokedTokens de Postgres, visible para todos los workers
+class DatabaseRevocationStore(RevocationStore):
+    def __init__(self, purge_every: int = REVOCATION_PURGE_EVERY):
+        self.purge_every = purge_every
+        self._revocations = 0
+
+    def revoke(self, jti, expires_at):
+        with SessionLocal() as db:
+            db.execute(insert(RevokedToken)
+                       .values(jti=jti, expiresAt=datetime.utcfromtimestamp(expires_at))
+                       .on_conflict_do_nothing())
+            db.commit()
+        self._revocations += 1
+        if self._revocations % self.purge_every == 0:
+            self.purge()
+
+    def is_revoked(self, jti):
+        with SessionLocal() as db:
+            return db.scalar(select(exists().where(RevokedToken.jti == jti,
+                                                   RevokedToken.expiresAt > datetime.utcnow())))
+
+    def purge(self):
+        with SessionLocal() as db:
+            purged = db.execute(delete(RevokedToken).where(RevokedToken.expiresAt <= datetime.utcnow())).rowcount
+            db.commit()
+        return purged
+
+
+# Almacén compartido con una caché corta por proceso delante, para no consultarlo en cada petición
+class RevocationList:
+    def __init__(self, store: RevocationStore, cache_ttl: int = REVOCATION_CACHE_TTL,
+                 max_entries: int = REVOCATION_CACHE_MAX_ENTRIES):
+        self.store = store
+        self.cache_ttl = cache_ttl
+        self._cache = MemoryCache(max_entries=max_entries, default_ttl=cache_ttl)
+
+    def revoke(self, jti: str, expires_at: float):
+        self.store.revoke(jti, expires_at)
+        self._cache.set(jti, True, ttl=max(1, ceil(expires_at - time())))
+
+    # Respuesta de la caché local sin tocar el almacén; None si no se sabe
+    def cached(self, jti: str) -> Optional[bool]:
+        return self._cache.get(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        revoked = self._cache.get(jti)
+        if revoked is None:
+            revoked = self.store.is_revoked(jti)
+            # Con ttl 0 MemoryCache no expira: un "no revocado" guardado así no vería nunca un logout
+            # hecho en otro worker
+            if revoked or self.cache_ttl > 0:
+                self._cache.set(jti, revoked)
+        return revoked
+
+
+def create_revocation_store(backend: str = REVOCATION_BACKEND) -> RevocationStore:
+    if backend == "database":
+        return DatabaseRevocationStore()
+    if backend == "redis":
+        return RedisRevocationStore(get_redis_client())
+    if backend == "memory":
+        return MemoryRevocationStore()
+    raise ValueError(f"REVOCATION_BACKEND no válido: {backend}")
+
+
+revocations = RevocationList(create_revocation_store())
@@ -0,0 +1,123 @@
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import Date, Float, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg, insert
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .models import User, Weight, BodyComposition, BodyFatPercentage, WaterConsumption, DailySteps, Exercise, MetricRollup
+
+# Métricas resumidas: mismo nombre que el data_type de /dashboard/history -> (tabla, columna)
+ROLLUP_METRICS = {
+    'weights': (Weight, "weight"),
+    'muscle': (BodyComposition, "muscle"),
+    'body_fat_percentage': (BodyFatPercentage, "fatPercentage"),
+    'water_consumption': (WaterConsumption, "waterAmount"),
+    'steps': (DailySteps, "stepsAmount"),
+    'exercises': (Exercise, "duration"),
+}
+
+# Granularidades mantenidas; las semanales y mensuales se calculan a partir de las diarias
+ROLLUP_GRANULARITIES = ['day', 'week', 'month']
+
+
+def metrics_for_table(table):
+    return [metric for metric, (metric_table, _) in ROLLUP_METRICS.items() if metric_table is table]
+
+
+def _bucket_start(granularity: str, value: datetime):
+    day = value.date()
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(granularity: str, day):
+    if granularity == 'week':
+        return day + timedelta(weeks=1)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _upsert(select_query):
+    columns = ["userId", "metric", "granularity", "bucket", "total", "count", "minimum", "maximum", "last", "lastDate"]
+    stmt = insert(MetricRollup).from_select(columns, select_query)
+    return stmt.on_conflict_do_update(
+        index_elements=[MetricRollup.userId, MetricRollup.metric, MetricRollup.granularity, MetricRollup.bucket],
+        set_={column: stmt.excluded[column] for column in columns[4:]},
+    )
+
+
+# Recalcula los resúmenes de la tabla solo para los días entre start y end (incluidos)
+def refresh_rollups(db: Session, user_id: int, table, start: datetime, end: datetime):
+    for metric in metrics_for_table(table):
+        value = cast(getattr(table, ROLLUP_METRICS[metric][1]), Float)
+
+        # Resúmenes diarios a partir de las filas crudas de los días afectados
+        day_start = _bucket_start('day', start)
+        day_end = _next_bucket('day', _bucket_start('day', end))
+        bucket = cast(func.date_trunc('day', table.date), Date)
+        db.execute(_upsert(
+            select(
+                table.userId, literal(metric), literal('day'), bucket,
+                func.sum(value), func.count(), func.min(value), func.max(value),
+                array_agg(aggregate_order_by(value, table.date.desc()))[1], func.max(table.date),
+            ).where(table.userId == user_id, table.date >= day_start, table.date < day_end)
+             .group_by(table.userId, bucket)
+        ))
+
+        # Semanas y meses afectados, a partir de los resúmenes diarios
+        for granularity in ROLLUP_GRANULARITIES[1:]:
+            period_start = _bucket_start(granularity, start)
+            period_end = _next_bucket(granularity, _bucket_start(granularity, end))
+            bucket = cast(func.date_trunc(granularity, MetricRollup.bucket), Date)
+            db.execute(_upsert(
+                select(
+                    MetricRollup.userId, MetricRollup.metric, literal(granularity), bucket,
+                    func.sum(MetricRollup.total), func.sum(MetricRollup.count),
+                    func.min(MetricRollup.minimum), func.max(MetricRollup.maximum),
+                    array_agg(aggregate_order_by(MetricRollup.last, MetricRollup.lastDate.desc()))[1],
+                    func.max(MetricRollup.lastDate),
+                ).where(
+                    MetricRollup.userId == user_id,
+                    MetricRollup.metric == metric,
+                    MetricRollup.granularity == 'day',
+                    MetricRollup.bucket >= period_start,
+                    MetricRollup.bucket < period_end,
+                ).group_by(MetricRollup.userId, MetricRollup.metric, bucket)
+            ))
+
+
+# Reconstruye los resúmenes de los datos existentes, por lotes de usuarios
+def backfill(batch_size: int = 100):
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            user_ids = db.scalars(select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)).all()
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                for table in dict.fromkeys(table for table, _ in ROLLUP_METRICS.values()):
+                    start, end = db.execute(select(func.min(table.date), func.max(table.date))
+                                            .where(table.userId == user_id)).one()
+                    if start is not None:
+                        refresh_rollups(db, user_id, table, start, end)
+            db.commit()
+            last_id = user_ids[-1]
+            print(f"Resúmenes reconstruidos hasta el usuario {last_id}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de los resúmenes por día, semana y mes")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subcommands.add_parser("backfill", help="Reconstruye los resúmenes de todos los usuarios")
+    backfill_parser.add_argument("--batch-size", type=int, default=100, help="Usuarios por transacción")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        backfill(args.batch_size)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
+from typing import Any, Dict, List, Literal, Optional, Union
 from datetime import datetime, date
 from enum import Enum
 
@@ -21,8 +21,7 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Esquema para el Peso (Weight)
 class WeightBase(BaseModel):
@@ -35,8 +34,7 @@ class WeightCreate(WeightBase):
 class Weight(WeightBase):
     userId: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Esquema para la Altura (Height)
 class HeightBase(BaseModel):
@@ -49,8 +47,7 @@ class HeightCreate(HeightBase):
 class Height(HeightBase):
     userId: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Esquema para el Consumo de Agua (WaterConsumption)
 class WaterConsumptionBase(BaseModel):
@@ -63,8 +60,7 @@ class WaterConsumptionCreate(WaterConsumptionBase):
 class WaterConsumption(WaterConsumptionBase):
     userId: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Esquema para el Porcentaje de Grasa Corporal (BodyFatPercentage)
 class BodyFatPercentageBase(BaseModel):
@@ -77,8 +73,7 @@ class BodyFatPercentageCreate(BodyFatPercentageBase):
 class BodyFatPercentage(BodyFatPercentageBase):
     userId: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Esquema para los Pasos Diarios (DailySteps)
 class DailyStepsBase(BaseModel):
@@ -91,8 +86,7 @@ class DailyStepsCreate(DailyStepsBase):
 class DailySteps(DailyStepsBase):
     userId: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Esquema para los Ejercicios (Exercise)
 class ExerciseBase(BaseModel):
@@ -106,8 +100,7 @@ class ExerciseCreate(ExerciseBase):
 class Exercise(ExerciseBase):
     userId: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Esquema para la Composición Corporal (BodyComposition)
 class BodyCompositionBase(BaseModel):
@@ -122,5 +115,119 @@ class BodyCompositionCreate(BodyCompositionBase):
 class BodyComposition(BodyCompositionBase):
     userId: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+# Esquemas de las respuestas de la API
+class StatusResponse(BaseModel):
+    status: Literal["success"]
+    message: str
+
+class ErrorResponse(BaseModel):
+    status: Literal["error"]
+    message: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str
+
+class UserProfile(BaseModel):
+    id: int
+    email: str
+    username: str
+    birthdate: date
+    gender: GeneroEnum
+
+    model_config = ConfigDict(from_attributes=True)
+
+class BodyCompositionSummary(BaseModel):
+    fat: Optional[float] = None
+    muscle: Optional[float] = None
+    water: Optional[float] = None
+
+class ExerciseSummary(BaseModel):
+    name: str
+    duration: int
+
+class DashboardData(BaseModel):
+    weight: Optional[float] = None
+    height: Optional[float] = None
+    body_composition: BodyCompositionSummary
+    body_fat_percentage: Optional[float] = None
+    water_consumption_today: int
+    daily_steps: int
+    exercises_today: List[ExerciseSummary]
+
+class DashboardResponse(BaseModel):
+    status: Literal["success"]
+    data: DashboardData
+
+# Un punto del historial: {"fecha": ..., <etiqueta o nombre del ejercicio>: valor}
+HistoryRow = Dict[str, Union[datetime, int, float]]
+
+class HistoryColumns(BaseModel):
+    fecha: List[datetime]
+    values: List[Union[int, float]]
+    label: str
+
+class ExerciseHistoryColumns(HistoryColumns):
+    names: List[str]
+
+class HistoryResponse(BaseModel):
+    status: Literal["success"]
+    data: Union[List[HistoryRow], ExerciseHistoryColumns, HistoryColumns]
+
+class HistoryPageResponse(HistoryResponse):
+    next_cursor: Optional[str] = None
+
+# Un valor por día en cada serie (None si ese día no hay datos)
+class DerivedMetrics(BaseModel):
+    fecha: List[date]
+    series: Dict[str, List[Optional[float]]]
+
+class DerivedResponse(BaseModel):
+    status: Literal["success"]
+    data: DerivedMetrics
+    latest: Dict[str, Optional[float]]
+    goals: Dict[str, int]
+
+class ImportAccepted(BaseModel):
+    status: Literal["accepted"]
+    job_id: str
+    state: str
+
+class ImportJobStatus(BaseModel):
+    job_id: str
+    data_type: str
+    state: str
+    rows_processed: int
+    chunks: int
+    seconds: Optional[float] = None
+    rows_per_second: Optional[float] = None
+    errors: List[str]
+    result: Optional[Dict[str, Any]] = None
+
+class CohortBucketSummary(BaseModel):
+    bucket: date
+    users: int
+    mean: Optional[float] = None
+    p25: Optional[float] = None
+    median: Optional[float] = None
+    p75: Optional[float] = None
+
+class CohortUserBucket(BaseModel):
+    bucket: date
+    value: Optional[float] = None
+    change: Optional[float] = None
+
+class CohortUser(BaseModel):
+    user_id: int
+    trend_per_day: Optional[float] = None
+    buckets: List[CohortUserBucket]
+
+class CohortResponse(BaseModel):
+    status: Literal["success"]
+    metric: str
+    granularity: str
+    summary: List[CohortBucketSummary]
+    users: List[CohortUser]
+    next_cursor: Optional[int] = None
@@ -0,0 +1,123 @@
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from .importer import IMPORT_MAPPINGS
+from .models import ImportDayHash, ImportWatermark
+
+# Modos de sincronización de una importación:
+#   - full:      se escriben todas las filas del archivo (comportamiento original)
+#   - watermark: se saltan las filas con fecha igual o anterior a la última importada
+#   - hash:      se saltan los días cuyo contenido coincide con el de la importación anterior
+SYNC_MODES = ("full", "watermark", "hash")
+
+# Huella de un día: (suma de los hash de sus filas módulo 2^64, número de filas)
+DayHash = Tuple[int, int]
+
+
+# Huella de cada día de un DataFrame. Cada fila se resume con un hash de 64 bits de su fecha y sus
+# valores y el día suma los de sus filas: el resultado no depende del orden del archivo
+def day_hashes(frame: pd.DataFrame, data_type: str) -> Dict[datetime, DayHash]:
+    if frame.empty:
+        return {}
+    columns = ["date", *IMPORT_MAPPINGS[data_type]["columns"].values()]
+    # El mismo valor puede llegar como entero en un bloque y como decimal en otro: se hashea siempre como float
+    values = frame[columns].apply(lambda column: column.astype("float64") if pd.api.types.is_numeric_dtype(column) else column)
+    hashes = pd.util.hash_pandas_object(values, index=False)
+    days = frame["date"].dt.normalize().to_numpy()
+    grouped = pd.DataFrame({"day": days, "hash": hashes.to_numpy(dtype=np.uint64)}).groupby("day")["hash"]
+    # La suma de uint64 se desborda dando la vuelta, que es justo la suma módulo 2^64
+    stats = grouped.agg(["sum", "count"])
+    return {day.to_pydatetime(): (int(total), int(count)) for day, total, count in stats.itertuples()}
+
+
+def merge_day_hashes(total: Dict[datetime, DayHash], hashes: Dict[datetime, DayHash]):
+    for day, (value, count) in hashes.items():
+        previous, previous_count = total.get(day, (0, 0))
+        total[day] = ((previous + value) % 2 ** 64, previous_count + count)
+
+
+def _hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+# Decide qué filas de una importación hay que escribir según el modo de sincronización y guarda,
+# al terminar, la marca de agua y las huellas diarias para la siguiente. Uso:
+#   scan() con cada bloque (solo en modo hash, primera pasada), prepare(),
+#   filter() + written() con cada bloque y finish() antes del commit
+class DeltaSync:
+    def __init__(self, db: Session, user_id: int, data_type: str, mode: str = "full"):
+        if mode not in SYNC_MODES:
+            raise ValueError(f"Modo de sincronización no válido: {mode}")
+        self.db = db
+        self.user_id = user_id
+        self.data_type = data_type
+        self.mode = mode
+        self.skipped = 0
+        self.watermark: Optional[datetime] = None
+        self.last_date: Optional[datetime] = None
+        self.hashes: Dict[datetime, DayHash] = {}
+        self.changed_days: Set[datetime] = set()
+
+    def scan(self, frame: pd.DataFrame):
+        merge_day_hashes(self.hashes, day_hashes(frame, self.data_type))
+
+    def prepare(self):
+        if self.mode == "watermark":
+            self.watermark = self.db.scalar(select(ImportWatermark.lastDate).where(
+                ImportWatermark.userId == self.user_id, ImportWatermark.dataType == self.data_type))
+        elif self.mode == "hash" and self.hashes:
+            stored = dict(self.db.execute(
+                select(ImportDayHash.day, ImportDayHash.hash).where(
+                    ImportDayHash.userId == self.user_id,
+                    ImportDayHash.dataType == self.data_type,
+                    ImportDayHash.day.between(min(self.hashes).date(), max(self.hashes).date()),
+                )).all())
+            self.changed_days = {day for day, (value, _) in self.hashes.items()
+                                 if stored.get(day.date()) != _hex(value)}
+
+    # Filas del bloque que hay que escribir; las demás se cuentan como saltadas
+    def filter(self, frame: pd.DataFrame) -> pd.DataFrame:
+        if self.mode == "watermark" and self.watermark is not None:
+            keep = frame["date"] > self.watermark
+        elif self.mode == "hash":
+            keep = frame["date"].dt.normalize().isin(self.changed_days)
+        else:
+            return frame
+        self.skipped += int((~keep).sum())
+        return frame[keep]
+
+    def written(self, frame: pd.DataFrame):
+        if frame.empty:
+            return
+        last_date = frame["date"].max().to_pydatetime()
+        self.last_date = last_date if self.last_date is None else max(self.last_date, last_date)
+        # Fuera del modo hash las huellas guardadas de estos días dejan de describir lo que hay en la tabla
+        if self.mode != "hash":
+            self.db.execute(delete(ImportDayHash).where(
+                ImportDayHash.userId == self.user_id,
+                ImportDayHash.dataType == self.data_type,
+                ImportDayHash.day.between(frame["date"].min().date(), last_date.date()),
+            ))
+
+    def finish(self):
+        if self.mode == "hash" and self.changed_days:
+            records = [{"userId": self.user_id, "dataType": self.data_type, "day": day.date(),
+                        "hash": _hex(self.hashes[day][0]), "rows": self.hashes[day][1]}
+                       for day in sorted(self.changed_days)]
+            # 5 columnas por fila: lotes holgadamente por debajo del límite de parámetros de Postgres
+            for start in range(0, len(records), 10000):
+                stmt = insert(ImportDayHash).values(records[start:start + 10000])
+                self.db.execute(stmt.on_conflict_do_update(
+                    index_elements=[ImportDayHash.userId, ImportDayHash.dataType, ImportDayHash.day],
+                    set_={"hash": stmt.excluded.hash, "rows": stmt.excluded.rows},
+                ))
+        if self.last_date is not None:
+            stmt = insert(ImportWatermark).values(userId=self.user_id, dataType=self.data_type, lastDate=self.last_date)
+            self.db.execute(stmt.on_conflict_do_update(
+                index_elements=[ImportWatermark.userId, ImportWatermark.dataType],
+                set_={"lastDate": func.greatest(ImportWatermark.lastDate, stmt.excluded.lastDate)},
+            ))
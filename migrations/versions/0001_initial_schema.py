@@ -0,0 +1,65 @@
+"""Esquema inicial: usuarios y tablas de sensores
+
+Revision ID: 0001_initial_schema
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Tablas de sensores y sus columnas de valores, tal como las creaba Base.metadata.create_all
+SENSOR_TABLES = {
+    'weights': [sa.Column('weight', sa.Float(), nullable=False)],
+    'heights': [sa.Column('height', sa.Float(), nullable=False)],
+    'waterConsumption': [sa.Column('waterAmount', sa.Integer(), nullable=False)],
+    'bodyFatPercentage': [sa.Column('fatPercentage', sa.Float(), nullable=False)],
+    'dailySteps': [sa.Column('stepsAmount', sa.Integer(), nullable=False)],
+    'exercises': [
+        sa.Column('exerciseName', sa.String(), nullable=False),
+        sa.Column('duration', sa.Integer(), nullable=False),
+    ],
+    'bodyComposition': [
+        sa.Column('fat', sa.Float(), nullable=False),
+        sa.Column('muscle', sa.Float(), nullable=False),
+        sa.Column('water', sa.Float(), nullable=False),
+    ],
+}
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.Column('birthdate', sa.Date(), nullable=False),
+        sa.Column('gender', sa.Enum('MASCULINO', 'FEMENINO', name='generoenum'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+
+    for table, value_columns in SENSOR_TABLES.items():
+        op.create_table(
+            table,
+            sa.Column('date', sa.DateTime(), nullable=False),
+            sa.Column('userId', sa.Integer(), nullable=False),
+            *value_columns,
+            sa.ForeignKeyConstraint(['userId'], ['users.id']),
+            sa.PrimaryKeyConstraint('date', 'userId'),
+        )
+        op.create_index(f'ix_{table}_date', table, ['date'])
+        op.create_index(f'ix_{table}_userId', table, ['userId'])
+
+
+def downgrade():
+    for table in SENSOR_TABLES:
+        op.drop_table(table)
+    op.drop_table('users')
+    sa.Enum(name='generoenum').drop(op.get_bind())
@@ -0,0 +1,39 @@
+"""Tabla de resúmenes por día, semana y mes
+
+Revision ID: 0002_metric_rollups
+Revises: 0001_initial_schema
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002_metric_rollups'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las bases creadas con create_all ya pueden tener la tabla
+    if sa.inspect(op.get_bind()).has_table('metricRollups'):
+        return
+    op.create_table(
+        'metricRollups',
+        sa.Column('userId', sa.Integer(), nullable=False),
+        sa.Column('metric', sa.String(), nullable=False),
+        sa.Column('granularity', sa.String(), nullable=False),
+        sa.Column('bucket', sa.Date(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('minimum', sa.Float(), nullable=False),
+        sa.Column('maximum', sa.Float(), nullable=False),
+        sa.Column('last', sa.Float(), nullable=False),
+        sa.Column('lastDate', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['userId'], ['users.id']),
+        sa.PrimaryKeyConstraint('userId', 'metric', 'granularity', 'bucket'),
+    )
+
+
+def downgrade():
+    op.drop_table('metricRollups')
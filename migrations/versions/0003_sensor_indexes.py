@@ -0,0 +1,52 @@
+"""Índices de las tablas de sensores según el patrón de acceso (userId, date)
+
+Todas las consultas filtran por userId y luego por un rango de fechas o la fila
+más reciente. La clave primaria pasa de (date, userId) a (userId, date) e incluye
+las columnas de valores, de modo que esas consultas se resuelven solo con el
+índice. Un índice btree se recorre igual de rápido hacia atrás, así que también
+sirve para ORDER BY date DESC. Los índices sueltos sobre date y userId sobran y
+se eliminan, lo que abarata cada inserción.
+
+Revision ID: 0003_sensor_indexes
+Revises: 0002_metric_rollups
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+revision = '0003_sensor_indexes'
+down_revision = '0002_metric_rollups'
+branch_labels = None
+depends_on = None
+
+# Tabla -> columnas de valores incluidas en la clave primaria
+SENSOR_TABLES = {
+    'weights': ['weight'],
+    'heights': ['height'],
+    'waterConsumption': ['waterAmount'],
+    'bodyFatPercentage': ['fatPercentage'],
+    'dailySteps': ['stepsAmount'],
+    'exercises': ['exerciseName', 'duration'],
+    'bodyComposition': ['fat', 'muscle', 'water'],
+}
+
+
+def _quote(columns):
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def upgrade():
+    for table, value_columns in SENSOR_TABLES.items():
+        op.execute(f'DROP INDEX IF EXISTS "ix_{table}_date"')
+        op.execute(f'DROP INDEX IF EXISTS "ix_{table}_userId"')
+        op.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT "{table}_pkey"')
+        op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" '
+                   f'PRIMARY KEY ("userId", date) INCLUDE ({_quote(value_columns)})')
+
+
+def downgrade():
+    for table in SENSOR_TABLES:
+        op.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT "{table}_pkey"')
+        op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY (date, "userId")')
+        op.create_index(f'ix_{table}_date', table, ['date'])
+        op.create_index(f'ix_{table}_userId', table, ['userId'])
@@ -0,0 +1,83 @@
+"""Particionado mensual por rango de date de las tablas de sensores
+
+Cada tabla pasa a ser una tabla particionada por RANGE (date) con una partición
+por mes. Las consultas del historial filtran por date, así que Postgres descarta
+las particiones fuera del intervalo, y el mantenimiento (VACUUM, índices) trabaja
+por meses en lugar de sobre la tabla entera. Se crean las particiones que cubren
+los datos existentes y los próximos meses; las siguientes las crea
+main.partitions al arrancar y al importar.
+
+Revision ID: 0004_sensor_partitions
+Revises: 0003_sensor_indexes
+Create Date: 2026-10-18
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004_sensor_partitions'
+down_revision = '0003_sensor_indexes'
+branch_labels = None
+depends_on = None
+
+# Tabla -> columnas de valores incluidas en la clave primaria
+SENSOR_TABLES = {
+    'weights': ['weight'],
+    'heights': ['height'],
+    'waterConsumption': ['waterAmount'],
+    'bodyFatPercentage': ['fatPercentage'],
+    'dailySteps': ['stepsAmount'],
+    'exercises': ['exerciseName', 'duration'],
+    'bodyComposition': ['fat', 'muscle', 'water'],
+}
+
+# Meses futuros creados por adelantado
+MONTHS_AHEAD = 3
+
+
+def _quote(columns):
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# Copia la tabla en otra nueva con la misma clave primaria y clave foránea; partition_by vacío = tabla normal
+def _rebuild(table, value_columns, suffix, partition_by=""):
+    op.execute(f'ALTER TABLE "{table}" RENAME TO "{table}_{suffix}"')
+    op.execute(f'ALTER TABLE "{table}_{suffix}" RENAME CONSTRAINT "{table}_pkey" TO "{table}_{suffix}_pkey"')
+    op.execute(f'CREATE TABLE "{table}" (LIKE "{table}_{suffix}" INCLUDING DEFAULTS) {partition_by}')
+    op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" '
+               f'PRIMARY KEY ("userId", date) INCLUDE ({_quote(value_columns)})')
+    op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_userId_fkey" '
+               f'FOREIGN KEY ("userId") REFERENCES users (id)')
+
+
+def upgrade():
+    bind = op.get_bind()
+    current = date.today().replace(day=1)
+    for table, value_columns in SENSOR_TABLES.items():
+        _rebuild(table, value_columns, "unpartitioned", "PARTITION BY RANGE (date)")
+
+        # Un mes por partición, desde el dato más antiguo hasta unos meses después del actual
+        first, last = bind.execute(sa.text(f'SELECT min(date), max(date) FROM "{table}_unpartitioned"')).one()
+        month = min(first.date().replace(day=1), current) if first else current
+        end = max(last.date().replace(day=1), _add_months(current, MONTHS_AHEAD)) if last else _add_months(current, MONTHS_AHEAD)
+        while month <= end:
+            op.execute(f'CREATE TABLE "{table}_p{month:%Y_%m}" PARTITION OF "{table}" '
+                       f"FOR VALUES FROM ('{month}') TO ('{_add_months(month, 1)}')")
+            month = _add_months(month, 1)
+
+        op.execute(f'INSERT INTO "{table}" SELECT * FROM "{table}_unpartitioned"')
+        op.execute(f'DROP TABLE "{table}_unpartitioned"')
+
+
+def downgrade():
+    for table, value_columns in SENSOR_TABLES.items():
+        _rebuild(table, value_columns, "partitioned")
+        op.execute(f'INSERT INTO "{table}" SELECT * FROM "{table}_partitioned"')
+        # Borra la tabla particionada junto con todas sus particiones
+        op.execute(f'DROP TABLE "{table}_partitioned"')
@@ -0,0 +1,29 @@
+"""Tabla de tokens revocados al cerrar sesión
+
+Revision ID: 0005_revoked_tokens
+Revises: 0004_sensor_partitions
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005_revoked_tokens'
+down_revision = '0004_sensor_partitions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'revokedTokens',
+        sa.Column('jti', sa.String(), nullable=False),
+        sa.Column('expiresAt', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('jti'),
+    )
+    op.create_index('ix_revokedTokens_expiresAt', 'revokedTokens', ['expiresAt'])
+
+
+def downgrade():
+    op.drop_index('ix_revokedTokens_expiresAt', table_name='revokedTokens')
+    op.drop_table('revokedTokens')
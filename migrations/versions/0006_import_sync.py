@@ -0,0 +1,40 @@
+"""Estado de la sincronización incremental de importaciones
+
+Revision ID: 0006_import_sync
+Revises: 0005_revoked_tokens
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006_import_sync'
+down_revision = '0005_revoked_tokens'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'importWatermarks',
+        sa.Column('userId', sa.Integer(), nullable=False),
+        sa.Column('dataType', sa.String(), nullable=False),
+        sa.Column('lastDate', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['userId'], ['users.id']),
+        sa.PrimaryKeyConstraint('userId', 'dataType'),
+    )
+    op.create_table(
+        'importDayHashes',
+        sa.Column('userId', sa.Integer(), nullable=False),
+        sa.Column('dataType', sa.String(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('hash', sa.String(), nullable=False),
+        sa.Column('rows', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['userId'], ['users.id']),
+        sa.PrimaryKeyConstraint('userId', 'dataType', 'day'),
+    )
+
+
+def downgrade():
+    op.drop_table('importDayHashes')
+    op.drop_table('importWatermarks')
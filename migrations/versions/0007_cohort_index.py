@@ -0,0 +1,28 @@
+"""Índice de metricRollups para las vistas de cohorte
+
+Las consultas de /analytics/cohort filtran por métrica y granularidad para
+muchos usuarios a la vez, así que la clave primaria (userId, ...) no les sirve.
+Con userId detrás de la métrica una página de usuarios es un rango contiguo del
+índice, ya ordenado por usuario y periodo, e incluye las columnas que se leen
+para resolverse solo con él.
+
+Revision ID: 0007_cohort_index
+Revises: 0006_import_sync
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+revision = '0007_cohort_index'
+down_revision = '0006_import_sync'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_metricRollups_cohort', 'metricRollups', ['metric', 'granularity', 'userId', 'bucket'],
+                    postgresql_include=['total', 'count'])
+
+
+def downgrade():
+    op.drop_index('ix_metricRollups_cohort', table_name='metricRollups')
@@ -0,0 +1,40 @@
+"""Estado de los trabajos de importación compartido entre workers
+
+Revision ID: 0008_import_jobs
+Revises: 0007_cohort_index
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008_import_jobs'
+down_revision = '0007_cohort_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'importJobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('userId', sa.Integer(), nullable=False),
+        sa.Column('dataType', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=False),
+        sa.Column('rowsProcessed', sa.Integer(), nullable=False),
+        sa.Column('chunks', sa.Integer(), nullable=False),
+        sa.Column('errors', sa.JSON(), nullable=False),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(), nullable=False),
+        sa.Column('startedAt', sa.DateTime(), nullable=True),
+        sa.Column('finishedAt', sa.DateTime(), nullable=True),
+        sa.Column('heartbeatAt', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['userId'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_importJobs_heartbeatAt', 'importJobs', ['heartbeatAt'])
+
+
+def downgrade():
+    op.drop_index('ix_importJobs_heartbeatAt', table_name='importJobs')
+    op.drop_table('importJobs')
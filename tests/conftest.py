@@ -0,0 +1,89 @@
+# Base de datos para las pruebas que la necesitan. Cada prueba trabaja dentro de una transacción que se
+# deshace al terminar (los commit del código probado solo liberan un savepoint), así que no deja filas.
+# Si la base de datos configurada en el .env no responde, esas pruebas se saltan
+import asyncio
+import uuid
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from main.database import ASYNC_DATABASE_URL, engine
+from main.models import GeneroEnum, User
+
+
+def _database_available():
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
+    except OperationalError:
+        return False
+
+
+@pytest.fixture(scope="session")
+def database():
+    if not _database_available():
+        pytest.skip("Base de datos no disponible")
+
+
+def add_user(db: Session, **values) -> int:
+    username = f"test_{uuid.uuid4().hex[:8]}"
+    user = User(email=f"{username}@example.com", username=username, password="x",
+                birthdate=values.pop("birthdate", date(1990, 1, 1)), gender=values.pop("gender", GeneroEnum.MASCULINO))
+    db.add(user)
+    db.flush()
+    return user.id
+
+
+@pytest.fixture
+def db(database):
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+# Ejecuta test(session) con una AsyncSession dentro de una transacción que se deshace al terminar. Los
+# datos de partida se escriben con session.run_sync para que estén en la misma transacción. Motor
+# propio sin pool: las conexiones de asyncpg no sirven fuera del event loop que las creó
+def run_async(test):
+    async def run():
+        test_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        try:
+            async with test_engine.connect() as connection:
+                transaction = await connection.begin()
+                session = AsyncSession(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+                try:
+                    return await test(session)
+                finally:
+                    await session.close()
+                    await transaction.rollback()
+        finally:
+            await test_engine.dispose()
+
+    return asyncio.run(run())
+
+
+# Sentencias que la sesión (síncrona o asíncrona) envía a la base de datos dentro del bloque
+@contextmanager
+def counted_queries(session):
+    statements = []
+    connection = session.bind.sync_connection if isinstance(session, AsyncSession) else session.connection()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(connection, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,71 @@
+# get_current_user: caché de tokens verificados y comprobación de la revocación en cada petición
+import asyncio
+from datetime import timedelta
+from time import monotonic
+import jwt
+import pytest
+from fastapi import HTTPException
+from main import crud
+from main.cache import MemoryCache
+from main.crud import create_access_token, get_current_user, logout_user
+from main.revocation import MemoryRevocationStore, RevocationList
+from config import SECRET_KEY
+
+
+@pytest.fixture
+def auth(monkeypatch):
+    monkeypatch.setattr(crud, "verified_tokens", MemoryCache(default_ttl=0))
+    monkeypatch.setattr(crud, "revocations", RevocationList(MemoryRevocationStore(), cache_ttl=0))
+    decoded = []
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decoded.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, "decode", counting_decode)
+    return decoded
+
+
+def _user(token):
+    return asyncio.run(get_current_user(token))
+
+
+def _rejected(token):
+    with pytest.raises(HTTPException) as error:
+        _user(token)
+    return error.value.status_code, error.value.detail
+
+
+def test_verified_token_is_not_decoded_again(auth):
+    token = create_access_token({"user_id": 7})
+    assert _user(token) == 7
+    assert _user(token) == 7
+    assert auth == [token]
+    # La entrada caduca con el token, no antes ni después
+    _, expires_at = crud.verified_tokens._data[token]
+    assert 29 * 60 < expires_at - monotonic() <= 30 * 60
+
+
+def test_logout_rejects_cached_token(auth):
+    token = create_access_token({"user_id": 7})
+    assert _user(token) == 7
+    asyncio.run(logout_user(None, token))
+    assert _rejected(token) == (401, "Invalid authentication credentials")
+
+
+def test_logout_in_other_worker_is_seen(auth):
+    token = create_access_token({"user_id": 7})
+    assert _user(token) == 7
+    # Otro worker revoca el token en el almacén compartido; sin caché local se ve en la siguiente petición
+    payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    crud.revocations.store.revoke(payload["jti"], payload["exp"])
+    assert _rejected(token)[0] == 401
+
+
+def test_invalid_tokens(auth):
+    expired = create_access_token({"user_id": 7}, expires_delta=timedelta(seconds=-1))
+    assert _rejected(expired) == (401, "Token has expired")
+    assert _rejected("no-es-un-token") == (401, "Invalid token")
+    assert _rejected(create_access_token({"other": 1})) == (401, "Invalid authentication credentials")
+    assert len(crud.verified_tokens._data) == 0
@@ -0,0 +1,85 @@
+# Importación masiva: división en secciones y filas de cada métrica
+import io
+import zipfile
+from datetime import datetime
+import pandas as pd
+import pytest
+from main.crud import import_bulk_data
+from main.importer import parse_bulk, split_sections
+from main.models import DailySteps, Height, Weight
+from main.partitions import ensure_partitions
+from tests.conftest import add_user
+
+SECTIONS = (b"\xef\xbb\xbffecha,peso\r\n2024-03-01 08:00:00,70\r\n2024-03-02 08:00:00,71\r\n"
+            b"\r\n;;\r\n  \r\n"
+            b"fecha,cantidadPasos\n2024-03-01 09:00:00,5000\n\n\n"
+            b"fecha,peso,altura\n2024-03-02 08:00:00,72,1.75\n2024-03-03 08:00:00,,1.76\n")
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+def test_split_csv_sections():
+    sections = split_sections(io.BytesIO(SECTIONS))
+    assert [name for name, _ in sections] == ["section 1", "section 2", "section 3"]
+    assert sections[1][1] == b"fecha,cantidadPasos\n2024-03-01 09:00:00,5000"
+    assert sections[2][1].startswith(b"fecha,peso,altura\n")
+
+
+def test_split_zip_members():
+    archive = _zip({"pesos.csv": "fecha,peso\n2024-03-01 08:00:00,70\n", "leeme.txt": "x",
+                    "__MACOSX/._pesos.csv": "x", "agua.CSV": "fecha,vasosDeAgua\n2024-03-01 08:00:00,3\n"})
+    assert split_sections(archive) == [("pesos.csv", b"fecha,peso\n2024-03-01 08:00:00,70\n"),
+                                       ("agua.CSV", b"fecha,vasosDeAgua\n2024-03-01 08:00:00,3\n")]
+
+
+def test_split_excel_sheets():
+    pytest.importorskip("openpyxl")
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        pd.DataFrame({"fecha": [datetime(2024, 3, 1, 8)], "peso": [70]}).to_excel(writer, sheet_name="Peso", index=False)
+        pd.DataFrame().to_excel(writer, sheet_name="Vacía", index=False)
+    buffer.seek(0)
+    [(name, frame)] = split_sections(buffer)
+    assert name == "Peso" and list(frame.columns) == ["fecha", "peso"]
+
+
+def test_parse_bulk_multi_metric_sections():
+    frames, summary, report = parse_bulk(io.BytesIO(SECTIONS), 1, workers=2)
+    assert sorted(frames) == ['daily_steps', 'heights', 'weights']
+    # La misma fecha en dos secciones: gana la última
+    assert frames['weights'][["date", "weight"]].values.tolist() == [[pd.Timestamp(2024, 3, 1, 8), 70.0],
+                                                                     [pd.Timestamp(2024, 3, 2, 8), 72.0]]
+    # En una sección con varias métricas, una fila sin peso solo aporta la altura
+    assert frames['heights']["height"].tolist() == [1.75, 1.76]
+    assert summary == [
+        {"name": "section 1", "data_types": ['weights'], "invalid_rows": 0},
+        {"name": "section 2", "data_types": ['daily_steps'], "invalid_rows": 0},
+        {"name": "section 3", "data_types": ['weights', 'heights'], "invalid_rows": 0},
+    ]
+
+
+def test_parse_bulk_rejects_unknown_section():
+    with pytest.raises(ValueError, match="section 2"):
+        parse_bulk(io.BytesIO(b"fecha,peso\n2024-03-01 08:00:00,70\n\nfecha,otra\n2024-03-01 08:00:00,1\n"), 1)
+
+
+def test_bulk_import_writes_every_metric(db):
+    for table in (Weight, Height, DailySteps):
+        ensure_partitions(table.__tablename__, datetime(2024, 3, 1), datetime(2024, 3, 31))
+    user_id = add_user(db)
+    result = import_bulk_data(db, user_id, io.BytesIO(SECTIONS))
+    assert result["data_types"] == {
+        'daily_steps': {"rows": 1, "inserted": 1, "updated": 0, "skipped": 0},
+        'heights': {"rows": 2, "inserted": 2, "updated": 0, "skipped": 0},
+        'weights': {"rows": 2, "inserted": 2, "updated": 0, "skipped": 0},
+    }
+    assert (result["inserted"], result["updated"]) == (5, 0)
+    result = import_bulk_data(db, user_id, io.BytesIO(SECTIONS))
+    assert (result["inserted"], result["updated"]) == (0, 5)
@@ -0,0 +1,38 @@
+# Caché de respuestas: invalidación por generación y backend por defecto según los workers
+import logging
+from main import cache as cache_module
+from main.cache import MemoryCache, NullCache, cache_key, create_cache, default_backend, invalidate
+
+
+def test_default_backend():
+    assert default_backend(None, 1) == "memory"
+    assert default_backend(None, 4) == "none"
+    assert default_backend("redis://localhost:6379/0", 4) == "redis"
+    assert default_backend("redis://localhost:6379/0", 1) == "redis"
+
+
+def test_memory_backend_with_several_workers_warns(caplog):
+    with caplog.at_level(logging.WARNING, logger="main.cache"):
+        assert isinstance(create_cache("memory", workers=4), MemoryCache)
+    assert "4 workers" in caplog.text
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="main.cache"):
+        assert isinstance(create_cache("none", workers=4), NullCache)
+        create_cache("memory", workers=1)
+    assert caplog.text == ""
+
+
+def test_invalidate_changes_the_key(monkeypatch):
+    monkeypatch.setattr(cache_module, "cache", MemoryCache())
+    key = cache_key(1, "dashboard")
+    assert cache_key(1, "dashboard") == key
+    other = cache_key(2, "dashboard")
+    invalidate(1, "dashboard")
+    assert cache_key(1, "dashboard") != key
+    # Solo se invalidan el usuario y los ámbitos dados
+    assert cache_key(2, "dashboard") == other
+
+
+def test_null_cache_never_reuses_keys(monkeypatch):
+    monkeypatch.setattr(cache_module, "cache", NullCache())
+    assert cache_key(1, "dashboard") != cache_key(1, "dashboard")
@@ -0,0 +1,81 @@
+# Vista de cohorte: distribución por periodo y series por usuario a partir de los resúmenes
+import asyncio
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import delete
+from main import analytics
+from main.analytics import get_cohort_view
+from main.cache import NullCache
+from main.models import MetricRollup
+from main.rollups import _bucket_start
+from tests.conftest import add_user, run_async
+
+WEEKS = [_bucket_start('week', datetime.today() - timedelta(weeks=weeks)) for weeks in (2, 1, 0)]
+# Media semanal de peso de cada usuario: (total, mediciones) por semana; el tercero no tiene la primera
+WEIGHTS = [
+    [(280.0, 4), (213.0, 3), (138.0, 2)],
+    [(180.0, 2), (182.0, 2), (184.0, 2)],
+    [None, (300.0, 5), (305.0, 5)],
+]
+
+
+def _seed(session):
+    # Solo cuentan las filas de la prueba: las demás se borran dentro de la transacción, que se deshace
+    session.execute(delete(MetricRollup).where(MetricRollup.metric == 'weights'))
+    user_ids = []
+    for weeks in WEIGHTS:
+        user_id = add_user(session)
+        user_ids.append(user_id)
+        for bucket, week in zip(WEEKS, weeks):
+            if week is not None:
+                total, count = week
+                session.add(MetricRollup(userId=user_id, metric='weights', granularity='week', bucket=bucket, total=total,
+                                         count=count, minimum=0, maximum=0, last=0, lastDate=datetime(2024, 1, 1)))
+    session.flush()
+    return user_ids
+
+
+def _cohort(monkeypatch, **kwargs):
+    monkeypatch.setattr(analytics, "cache", NullCache())
+
+    async def test(session):
+        user_ids = await session.run_sync(_seed)
+        return user_ids, await get_cohort_view(session, 'weights', 'month', 'week', **kwargs)
+
+    return run_async(test)
+
+
+def test_cohort_summary(monkeypatch, database):
+    _, response = _cohort(monkeypatch)
+    means = [[total / count for total, count in filter(None, [weeks[i] for weeks in WEIGHTS])] for i in range(3)]
+    assert [row["bucket"] for row in response["summary"]] == WEEKS
+    for row, values in zip(response["summary"], means):
+        assert row["users"] == len(values)
+        assert row["mean"] == round(np.mean(values), 4)
+        assert [row["p25"], row["median"], row["p75"]] == [round(float(np.percentile(values, p)), 4) for p in (25, 50, 75)]
+
+
+def test_cohort_user_series(monkeypatch, database):
+    user_ids, response = _cohort(monkeypatch)
+    users = {user["user_id"]: user for user in response["users"]}
+    assert list(users) == user_ids
+    first = users[user_ids[0]]
+    assert [bucket["value"] for bucket in first["buckets"]] == [70.0, 71.0, 69.0]
+    assert [bucket["change"] for bucket in first["buckets"]] == [None, 1.0, -2.0]
+    # Pendiente por día de la recta que pasa por los tres puntos (una semana entre cada uno)
+    assert first["trend_per_day"] == round(-0.5 / 7, 4)
+    assert [bucket["change"] for bucket in users[user_ids[2]]["buckets"]] == [None, 1.0]
+    assert response["next_cursor"] is None
+
+
+def test_cohort_pages(monkeypatch, database):
+    user_ids, response = _cohort(monkeypatch, limit=2)
+    assert [user["user_id"] for user in response["users"]] == user_ids[:2]
+    assert response["next_cursor"] == user_ids[1]
+    assert len(response["summary"]) == 3
+
+
+def test_cohort_validation():
+    messages = [asyncio.run(get_cohort_view(None, *args))["message"]
+                for args in (('height', 'month'), ('weights', 'decade'), ('weights', 'month', 'hour'))]
+    assert messages == ["Invalid metric", "Invalid period", "Invalid granularity"]
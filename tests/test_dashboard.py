@@ -0,0 +1,97 @@
+# /dashboard/view: valores actuales y totales de hoy en una sola consulta
+from datetime import datetime, time, timedelta
+from main import cache as cache_module
+from main import crud
+from main.cache import MemoryCache, NullCache
+from main.crud import get_dashboard_view
+from main.models import BodyComposition, BodyFatPercentage, DailySteps, Exercise, Height, WaterConsumption, Weight
+from main.partitions import ensure_partitions
+from main.rollups import refresh_rollups
+from tests.conftest import add_user, counted_queries, run_async
+
+TODAY = datetime.combine(datetime.today().date(), time.min)
+YESTERDAY = TODAY - timedelta(days=1)
+TABLES = [Weight, Height, BodyComposition, BodyFatPercentage, WaterConsumption, DailySteps, Exercise]
+
+
+def _seed(session):
+    for table in TABLES:
+        ensure_partitions(table.__tablename__, YESTERDAY, TODAY)
+    user_id = add_user(session)
+    at = lambda day, minutes: day + timedelta(minutes=minutes)
+    session.add_all([
+        Weight(userId=user_id, date=at(YESTERDAY, 600), weight=72.0),
+        Weight(userId=user_id, date=at(TODAY, 1), weight=71.5),
+        Height(userId=user_id, date=at(YESTERDAY, 600), height=1.75),
+        BodyComposition(userId=user_id, date=at(YESTERDAY, 600), fat=20.0, muscle=40.0, water=55.0),
+        BodyFatPercentage(userId=user_id, date=at(YESTERDAY, 600), fatPercentage=21.5),
+        WaterConsumption(userId=user_id, date=at(YESTERDAY, 600), waterAmount=9),
+        WaterConsumption(userId=user_id, date=at(TODAY, 1), waterAmount=3),
+        WaterConsumption(userId=user_id, date=at(TODAY, 2), waterAmount=5),
+        DailySteps(userId=user_id, date=at(YESTERDAY, 600), stepsAmount=20000),
+        DailySteps(userId=user_id, date=at(TODAY, 1), stepsAmount=3000),
+        DailySteps(userId=user_id, date=at(TODAY, 3), stepsAmount=4500),
+        Exercise(userId=user_id, date=at(YESTERDAY, 600), exerciseName="Nadar", duration=45),
+        Exercise(userId=user_id, date=at(TODAY, 2), exerciseName="Correr", duration=30),
+        Exercise(userId=user_id, date=at(TODAY, 1), exerciseName="Caminar", duration=20),
+    ])
+    session.flush()
+    for table in (WaterConsumption, DailySteps):
+        refresh_rollups(session, user_id, table, YESTERDAY, TODAY)
+    return user_id
+
+
+def test_dashboard_in_one_query(monkeypatch, database):
+    monkeypatch.setattr(crud, "cache", NullCache())
+
+    async def test(session):
+        user_id = await session.run_sync(_seed)
+        with counted_queries(session) as statements:
+            response = await get_dashboard_view(session, user_id)
+        return response, statements
+
+    response, statements = run_async(test)
+    assert len(statements) == 1
+    assert response == {"status": "success", "data": {
+        "weight": 71.5,
+        "height": 1.75,
+        "body_composition": {"fat": 20.0, "muscle": 40.0, "water": 55.0},
+        "body_fat_percentage": 21.5,
+        "water_consumption_today": 8,
+        "daily_steps": 7500,
+        "exercises_today": [{"name": "Caminar", "duration": 20}, {"name": "Correr", "duration": 30}],
+    }}
+
+
+def test_dashboard_without_data(monkeypatch, database):
+    monkeypatch.setattr(crud, "cache", NullCache())
+
+    async def test(session):
+        return await get_dashboard_view(session, await session.run_sync(add_user))
+
+    assert run_async(test)["data"] == {
+        "weight": None, "height": None, "body_composition": {"fat": None, "muscle": None, "water": None},
+        "body_fat_percentage": None, "water_consumption_today": 0, "daily_steps": 0, "exercises_today": [],
+    }
+
+
+def test_dashboard_cache_expires_at_midnight(monkeypatch, database):
+    monkeypatch.setattr(cache_module, "cache", MemoryCache(default_ttl=0))
+    monkeypatch.setattr(crud, "cache", cache_module.cache)
+
+    async def test(session):
+        user_id = await session.run_sync(_seed)
+        with counted_queries(session) as statements:
+            today = await get_dashboard_view(session, user_id)
+            assert await get_dashboard_view(session, user_id) == today
+            assert len(statements) == 1
+            # Al día siguiente la misma entrada (sin caducidad) ya no se usa
+            monkeypatch.setattr(crud, "_today_range", lambda: (TODAY + timedelta(days=1), TODAY + timedelta(days=2)))
+            tomorrow = await get_dashboard_view(session, user_id)
+            assert len(statements) == 2
+        return today, tomorrow
+
+    today, tomorrow = run_async(test)
+    assert today["data"]["daily_steps"] == 7500
+    assert tomorrow["data"]["daily_steps"] == 0
+    assert tomorrow["data"]["exercises_today"] == []
@@ -0,0 +1,58 @@
+# Fechas con zona horaria en los rangos de /dashboard/history/raw: se comparan con columnas
+# timestamp sin zona, así que deben llegar a la consulta en UTC sin zona
+import asyncio
+from datetime import datetime, timedelta, timezone
+from main.crud import get_raw_history
+from main.formats import naive_utc
+
+UTC_Z = datetime.fromisoformat("2024-01-01T00:00:00+00:00")
+PLUS_TWO = datetime.fromisoformat("2024-01-01T02:00:00+02:00")
+
+
+class CapturedQuery(Exception):
+    pass
+
+
+# Sesión que guarda la consulta en lugar de ejecutarla
+class FakeSession:
+    def __init__(self):
+        self.query = None
+
+    async def stream(self, query):
+        self.query = query
+        raise CapturedQuery()
+
+
+def _bounds(query):
+    return sorted(value for value in query.compile().params.values() if isinstance(value, datetime))
+
+
+def test_naive_utc():
+    assert naive_utc(None) is None
+    assert naive_utc(datetime(2024, 1, 1, 5)) == datetime(2024, 1, 1, 5)
+    assert naive_utc(UTC_Z) == datetime(2024, 1, 1)
+    assert naive_utc(PLUS_TWO) == datetime(2024, 1, 1)
+    assert naive_utc(PLUS_TWO).tzinfo is None
+
+
+def test_raw_history_same_instant_with_offsets():
+    # 00:00Z y 02:00+02:00 son el mismo instante
+    result = asyncio.run(get_raw_history(None, 1, 'weights', UTC_Z, PLUS_TWO))
+    assert result == {"status": "error", "message": "from debe ser anterior a to"}
+
+
+def test_raw_history_mixed_naive_and_aware():
+    result = asyncio.run(get_raw_history(None, 1, 'weights', datetime(2024, 1, 1, 1), PLUS_TWO))
+    assert result["status"] == "error"
+
+
+def test_raw_history_filters_in_naive_utc():
+    db = FakeSession()
+    end = datetime(2024, 1, 2, 2, tzinfo=timezone(timedelta(hours=2)))
+    try:
+        asyncio.run(get_raw_history(db, 1, 'weights', UTC_Z, end))
+    except CapturedQuery:
+        pass
+    bounds = _bounds(db.query)
+    assert bounds == [datetime(2024, 1, 1), datetime(2024, 1, 2)]
+    assert all(bound.tzinfo is None for bound in bounds)
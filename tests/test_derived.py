@@ -0,0 +1,79 @@
+# Series derivadas: recálculo incremental tras una importación de este proceso y completo si los datos
+# cambiaron por otra vía
+import asyncio
+from datetime import date
+import numpy as np
+import pandas as pd
+from main import cache as cache_module
+from main import derived
+from main.cache import MemoryCache, invalidate
+from main.derived import derived_frame, mark_dirty
+from main.models import DailySteps
+
+USER_ID = 41
+DAYS = pd.date_range("2024-01-01", periods=60, freq="D", name="day")
+
+
+def _fake_store(monkeypatch):
+    monkeypatch.setattr(cache_module, "cache", MemoryCache())
+    monkeypatch.setattr(derived, "_memo", MemoryCache(default_ttl=0))
+    monkeypatch.setattr(derived, "_dirty", {})
+    daily = pd.DataFrame({"weight": np.nan, "steps": 10000.0, "water": 6.0}, index=DAYS)
+    loads = []
+
+    async def fake_load(db, user_id, start):
+        loads.append(start)
+        rows = daily if start is None else daily[daily.index >= pd.Timestamp(start)]
+        return rows.copy(), pd.DataFrame(columns=["date", "height"])
+
+    monkeypatch.setattr(derived, "_load", fake_load)
+    return daily, loads
+
+
+def _frame():
+    return asyncio.run(derived_frame(None, USER_ID))
+
+
+def test_local_import_recomputes_from_dirty_day(monkeypatch):
+    daily, loads = _fake_store(monkeypatch)
+    _frame()
+    daily.loc["2024-02-20", "steps"] = 12000.0
+    mark_dirty(USER_ID, {DailySteps: date(2024, 2, 20)}, "dashboard")
+    frame = _frame()
+    assert loads == [None, date(2024, 2, 6)]
+    assert frame.loc["2024-02-20", "steps"] == 12000.0
+    assert frame.loc["2024-02-20", "steps_streak"] == 51
+
+
+def test_other_write_forces_full_recompute(monkeypatch):
+    daily, loads = _fake_store(monkeypatch)
+    _frame()
+    # Otro proceso cambia un día anterior: solo invalida, no marca nada en este proceso
+    daily.loc["2024-01-05", "steps"] = 100.0
+    invalidate(USER_ID, DailySteps.__tablename__)
+    # Después este proceso importa días posteriores
+    daily.loc["2024-02-20", "steps"] = 12000.0
+    mark_dirty(USER_ID, {DailySteps: date(2024, 2, 20)}, "dashboard")
+    frame = _frame()
+    assert loads == [None, None]
+    assert frame.loc["2024-01-05", "steps"] == 100.0
+    assert frame.loc["2024-02-20", "steps_streak"] == 46
+
+
+def test_other_write_after_local_import(monkeypatch):
+    daily, loads = _fake_store(monkeypatch)
+    _frame()
+    mark_dirty(USER_ID, {DailySteps: date(2024, 2, 20)}, "dashboard")
+    daily.loc["2024-01-05", "steps"] = 100.0
+    invalidate(USER_ID, DailySteps.__tablename__)
+    assert _frame().loc["2024-01-05", "steps"] == 100.0
+    assert loads == [None, None]
+
+
+def test_without_shared_cache_always_full(monkeypatch):
+    daily, loads = _fake_store(monkeypatch)
+    monkeypatch.setattr(cache_module, "cache", cache_module.NullCache())
+    _frame()
+    mark_dirty(USER_ID, {DailySteps: date(2024, 2, 20)}, "dashboard")
+    _frame()
+    assert loads == [None, None]
@@ -0,0 +1,85 @@
+# Reducción de series del historial: LTTB y elección automática de la resolución
+from datetime import datetime, timedelta
+import numpy as np
+from main import crud
+from main.cache import NullCache
+from main.crud import get_data_history
+from main.downsampling import auto_bucket, lttb
+from main.models import DailySteps
+from main.partitions import ensure_partitions
+from main.rollups import refresh_rollups
+from tests.conftest import add_user, run_async
+
+X = np.arange(1000, dtype=float)
+Y = np.sin(X / 50)
+
+
+def test_lttb_point_count_and_endpoints():
+    selected = lttb(X, Y, 100)
+    assert len(selected) == 100
+    assert selected[0] == 0 and selected[-1] == 999
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_one_point_per_bucket():
+    selected = lttb(X, Y, 12)
+    edges = np.linspace(1, 999, 11).astype(np.int64)
+    for i, index in enumerate(selected[1:-1]):
+        assert edges[i] <= index < edges[i + 1]
+
+
+def test_lttb_keeps_spikes():
+    y = np.zeros(1000)
+    y[437] = 50
+    y[812] = -30
+    selected = lttb(X, y, 20)
+    assert 437 in selected and 812 in selected
+
+
+def test_lttb_short_series_unchanged():
+    assert lttb(X[:50], Y[:50], 100).tolist() == list(range(50))
+    assert lttb(X[:50], Y[:50], 50).tolist() == list(range(50))
+
+
+def test_auto_bucket():
+    start = datetime(2024, 1, 1)
+    assert auto_bucket(start, start + timedelta(weeks=1), 500) == 'hour'
+    assert auto_bucket(start, start + timedelta(days=365), 500) == 'day'
+    assert auto_bucket(start, start + timedelta(days=365), 100) == 'week'
+    assert auto_bucket(start, start + timedelta(days=3650), 100) == 'month'
+    # Si ni los meses caben se devuelven meses igualmente
+    assert auto_bucket(start, start + timedelta(days=3650), 10) == 'month'
+
+
+def _seed_steps(session):
+    start = datetime.combine(datetime.today().date(), datetime.min.time()) - timedelta(days=5)
+    ensure_partitions(DailySteps.__tablename__, start, datetime.today())
+    user_id = add_user(session)
+    # Cada media hora durante cinco días, con un pico aislado
+    session.add_all([DailySteps(userId=user_id, date=start + timedelta(minutes=30 * i), stepsAmount=5000 if i == 77 else 100 + i % 7)
+                     for i in range(240)])
+    session.flush()
+    refresh_rollups(session, user_id, DailySteps, start, start + timedelta(days=5))
+    return user_id, start
+
+
+def test_history_resolutions(monkeypatch, database):
+    monkeypatch.setattr(crud, "cache", NullCache())
+
+    async def test(session):
+        user_id, start = await session.run_sync(_seed_steps)
+        label = "Pasos durante el día"
+        raw = (await get_data_history(session, user_id, 'steps', 'week'))["data"]
+        hourly = (await get_data_history(session, user_id, 'steps', 'week', resolution='hour'))["data"]
+        reduced = (await get_data_history(session, user_id, 'steps', 'week', resolution='lttb', max_points=20))["data"]
+        auto = (await get_data_history(session, user_id, 'steps', 'week', resolution='auto', max_points=10))["data"]
+        assert len(raw) == 240
+        assert len(hourly) == 120
+        assert sum(point[label] for point in hourly) == sum(point[label] for point in raw)
+        assert len(reduced) == 20
+        assert reduced[0] == raw[0] and reduced[-1] == raw[-1]
+        assert {"fecha": start + timedelta(minutes=30 * 77), label: 5000} in reduced
+        # Una semana no cabe en 10 horas: la resolución automática usa los resúmenes diarios
+        assert [point["fecha"] for point in auto] == [start + timedelta(days=day) for day in range(5)]
+
+    run_async(test)
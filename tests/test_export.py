@@ -0,0 +1,33 @@
+# Validación de /export antes de empezar la respuesta en streaming
+import asyncio
+from datetime import datetime
+from fastapi.responses import StreamingResponse
+from main import export
+from main.export import export_data
+
+UTC_Z = datetime.fromisoformat("2024-01-01T00:00:00+00:00")
+PLUS_TWO = datetime.fromisoformat("2024-01-01T02:00:00+02:00")
+
+
+def test_export_rejects_empty_range_with_offsets():
+    assert export_data(1, ['weights'], 'csv', UTC_Z, PLUS_TWO) == {"status": "error", "message": "from debe ser anterior a to"}
+
+
+def test_export_mixed_naive_and_aware():
+    assert export_data(1, ['weights'], 'csv', datetime(2024, 1, 1, 1), PLUS_TWO)["status"] == "error"
+    response = export_data(1, ['weights'], 'csv', datetime(2023, 12, 31), PLUS_TWO)
+    assert isinstance(response, StreamingResponse)
+
+
+def test_export_streams_naive_bounds(monkeypatch):
+    captured = {}
+
+    async def fake_stream(user_id, data_type, format, start, end):
+        captured.update(start=start, end=end)
+        yield b""
+
+    monkeypatch.setattr(export, "_stream_file", fake_stream)
+    response = export_data(1, ['weights'], 'csv', UTC_Z, PLUS_TWO.replace(day=2))
+    assert isinstance(response, StreamingResponse)
+    asyncio.run(anext(response.body_iterator))
+    assert captured == {"start": datetime(2024, 1, 1), "end": datetime(2024, 1, 2)}
@@ -0,0 +1,49 @@
+# Formatos de respuesta del historial: columnas, NDJSON y Arrow IPC en streaming
+from datetime import datetime
+import orjson
+import pytest
+from main.formats import ArrowStreamEncoder, columnar, ndjson_lines, pa
+
+needs_pyarrow = pytest.mark.skipif(pa is None, reason="Requiere pyarrow")
+
+ROWS = [(datetime(2024, 1, 1, 8), 70.5), (datetime(2024, 1, 2, 8), 71.0), (datetime(2024, 1, 3, 8), 70.0)]
+EXERCISES = [(datetime(2024, 1, 1, 8), "Correr", 30), (datetime(2024, 1, 1, 18), "Nadar", 45)]
+
+
+def test_columnar():
+    assert columnar(ROWS, "Peso (kg)") == {
+        "fecha": [row[0] for row in ROWS], "values": [70.5, 71.0, 70.0], "label": "Peso (kg)",
+    }
+    data = columnar(EXERCISES, "Duración (min)", names=True)
+    assert data["names"] == ["Correr", "Nadar"]
+    assert data["values"] == [30, 45]
+    assert columnar([], "Peso (kg)") == {"fecha": [], "values": [], "label": "Peso (kg)"}
+
+
+def test_ndjson_lines():
+    lines = ndjson_lines([{"fecha": ROWS[0][0], "Peso (kg)": 70.5}, {"fecha": ROWS[1][0], "Peso (kg)": 71.0}])
+    assert lines.endswith(b"\n")
+    assert [orjson.loads(line) for line in lines.splitlines()] == [
+        {"fecha": "2024-01-01T08:00:00", "Peso (kg)": 70.5}, {"fecha": "2024-01-02T08:00:00", "Peso (kg)": 71.0},
+    ]
+    assert ndjson_lines([]) == b""
+
+
+@needs_pyarrow
+def test_arrow_stream_round_trip():
+    encoder = ArrowStreamEncoder("Peso (kg)", integer=False)
+    # Cada lote devuelve sus propios bytes; juntos forman un stream que se lee de una vez
+    stream = encoder.write(ROWS[:2]) + encoder.write(ROWS[2:]) + encoder.write([]) + encoder.close()
+    table = pa.ipc.open_stream(stream).read_all()
+    assert table.schema.metadata == {b"label": b"Peso (kg)"}
+    assert table.column_names == ["fecha", "value"]
+    assert table.column("value").type == pa.float64()
+    assert table.to_pylist() == [{"fecha": fecha, "value": value} for fecha, value in ROWS]
+
+
+@needs_pyarrow
+def test_arrow_stream_with_names():
+    encoder = ArrowStreamEncoder("Duración (min)", integer=True, names=True)
+    table = pa.ipc.open_stream(encoder.write(EXERCISES) + encoder.close()).read_all()
+    assert table.column("value").type == pa.int64()
+    assert table.to_pylist() == [{"fecha": fecha, "name": name, "value": value} for fecha, name, value in EXERCISES]
@@ -0,0 +1,49 @@
+# Hashes de contraseñas en un pool acotado fuera del event loop
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+from main import hashing
+from main.hashing import BCRYPT_ROUNDS, hash_password, verify_password
+
+
+def test_hash_and_verify():
+    async def run():
+        hashed = await hash_password("secreto")
+        return hashed, await verify_password("secreto", hashed), await verify_password("otro", hashed)
+
+    hashed, valid, invalid = asyncio.run(run())
+    assert bcrypt.from_string(hashed).rounds == BCRYPT_ROUNDS
+    assert valid == (True, None)
+    assert invalid == (False, None)
+
+
+def test_hash_with_other_cost_is_updated():
+    old = bcrypt.using(rounds=4).hash("secreto")
+    valid, new_hash = asyncio.run(verify_password("secreto", old))
+    assert valid
+    assert bcrypt.from_string(new_hash).rounds == BCRYPT_ROUNDS
+
+
+def test_full_queue_answers_503(monkeypatch):
+    monkeypatch.setattr(hashing, "_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(hashing, "HASH_MAX_PENDING", 2)
+    release = threading.Event()
+
+    async def run():
+        # Dos hashes ocupan el pool y la cola; el tercero se rechaza sin esperar
+        running = [asyncio.create_task(hashing._submit(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert hashing.pending() == 2
+        with pytest.raises(HTTPException) as rejected:
+            await hashing._submit(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == str(hashing.HASH_RETRY_AFTER)
+    assert hashing.pending() == 0
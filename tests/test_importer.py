@@ -0,0 +1,74 @@
+# Números de línea del informe de errores de la importación
+import io
+import pytest
+from main import importer
+from main.importer import parse_csv, strip_blank_lines
+
+
+def _errors(content: bytes, data_types, chunk_size=50000, **kwargs):
+    blocks = list(parse_csv(io.BytesIO(content), 1, data_types, chunk_size, **kwargs))
+    return [(error["row"], error["column"]) for block in blocks for error in block.errors], blocks
+
+
+def test_strip_blank_lines():
+    content, lines = strip_blank_lines(b"fecha,peso\n2024-01-01,70\n\n  \n;;\n2024-01-02,x\n")
+    assert content == b"fecha,peso\n2024-01-01,70\n2024-01-02,x\n"
+    assert lines.tolist() == [1, 2, 6]
+
+
+def test_error_lines_after_blank_lines():
+    content = b"fecha,peso\n2024-01-01,70\n\n   \n2024-01-02,abc\n2024-01-03,71\n\n2024-01-04,\n"
+    errors, blocks = _errors(content, ['weights'])
+    assert errors == [(5, "peso"), (8, "peso")]
+    assert len(blocks[0].frames['weights']) == 2
+
+
+def test_error_lines_with_skip_empty():
+    # Sección con dos métricas: las filas sin peso no cuentan para weights, pero no mueven la numeración
+    content = b"fecha,peso,altura\n2024-02-01,70,1.7\n\n2024-02-02,,abc\n\n2024-02-03,-1,\n"
+    errors, _ = _errors(content, ['weights', 'heights'], skip_empty=True)
+    assert errors == [(4, "altura"), (6, "peso")]
+
+
+@pytest.mark.parametrize("parser", ["pyarrow", "pandas"])
+def test_error_lines_across_blocks(monkeypatch, parser):
+    monkeypatch.setattr(importer, "IMPORT_PARSER", parser)
+    lines, expected = [b"fecha,cantidadPasos"], []
+    for i in range(20000):
+        if i % 7 == 0:
+            lines.append(b"")
+        if i % 1500 == 1:
+            lines.append(b"2024-01-01 00:00:00,-%d" % i)
+            expected.append((len(lines), "cantidadPasos"))
+        else:
+            lines.append(b"2024-01-01 00:00:00,%d" % i)
+    errors, blocks = _errors(b"\n".join(lines) + b"\n", ['daily_steps'], chunk_size=3000)
+    assert len(blocks) > 2
+    assert errors == expected
+
+
+def test_malformed_rows_keep_line_numbers():
+    content = b"fecha,peso\n\n2024-01-01,70,1\n2024-01-02,70\n2024-01-03,-5\n"
+    errors, _ = _errors(content, ['weights'])
+    assert errors == [(3, None), (5, "peso")]
+
+
+def test_trailing_blank_line_without_newline():
+    content, lines = strip_blank_lines(b"fecha,peso\n2024-01-01,70\n  ")
+    assert content == b"fecha,peso\n2024-01-01,70\n"
+    assert lines.tolist() == [1, 2]
+
+
+def test_without_blank_lines():
+    assert strip_blank_lines(b"fecha,peso\n2024-01-01,70\n") == (b"fecha,peso\n2024-01-01,70\n", None)
+
+
+def test_small_files_are_parsed_inline(monkeypatch):
+    def no_pool():
+        raise AssertionError("el pool no debe usarse con archivos pequeños")
+
+    monkeypatch.setattr(importer, "_get_parse_pool", no_pool)
+    content = b"fecha,cantidadPasos\n" + b"".join(b"2024-01-01 00:00:00,%d\n" % i for i in range(20000))
+    blocks = list(parse_csv(io.BytesIO(content), 1, ['daily_steps'], 3000, processes=4))
+    assert len(blocks) > 2
+    assert sum(block.rows for block in blocks) == 20000
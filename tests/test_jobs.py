@@ -0,0 +1,46 @@
+# Estado de los trabajos de importación guardado en importJobs
+import io
+from types import SimpleNamespace
+import pytest
+from main import jobs
+from main.jobs import ImportJob
+from main.models import ImportJobRecord
+
+
+def test_job_record_round_trip():
+    job = ImportJob(7, "daily_steps")
+    job.state = "succeeded"
+    job.rows_processed, job.chunks = 1200, 3
+    job.started_at, job.finished_at = job.created_at + 1, job.created_at + 3.5
+    job.result = {"status": "success", "rows": 1200}
+
+    restored = ImportJob.from_record(ImportJobRecord(**job.to_record()))
+    assert restored.to_dict() == job.to_dict()
+    assert restored.user_id == 7
+
+
+class _Upload:
+    def __init__(self, data: bytes):
+        self.file = io.BytesIO(data)
+
+
+def _fail(*args, **kwargs):
+    raise RuntimeError("fallo")
+
+
+# Si el trabajo no llega a encolarse, el archivo subido no se queda en el directorio temporal
+@pytest.mark.parametrize("failing", ["_save", "_executor"])
+def test_submit_removes_upload_on_failure(tmp_path, monkeypatch, failing):
+    monkeypatch.setattr(jobs, "IMPORT_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "IMPORT_JOBS_INLINE", False)
+    monkeypatch.setattr(jobs, "_prune_jobs", lambda: None)
+    monkeypatch.setattr(jobs, "_start_heartbeat", lambda: None)
+    monkeypatch.setattr(jobs, "_save", _fail if failing == "_save" else lambda job, required=True: None)
+    if failing == "_executor":
+        monkeypatch.setattr(jobs, "_executor", SimpleNamespace(submit=_fail))
+
+    job = ImportJob(7, "weights")
+    with pytest.raises(RuntimeError):
+        jobs._submit(job, _Upload(b"fecha,peso\n"), ".csv", None, ["weights"])
+    assert list(tmp_path.iterdir()) == []
+    assert job.id not in jobs._jobs
@@ -0,0 +1,39 @@
+# Perfilado de peticiones: solo con pyinstrument, cProfile mezclaría las corrutinas concurrentes
+import logging
+from main import metrics as metrics_module
+from main.metrics import request_profile_every
+
+
+def test_cprofile_does_not_sample_requests(caplog):
+    with caplog.at_level(logging.WARNING, logger="main.metrics"):
+        assert request_profile_every(10, "cprofile") == 0
+    assert "PROFILER=cprofile" in caplog.text
+
+
+def test_pyinstrument_samples_requests(monkeypatch, caplog):
+    monkeypatch.setattr(metrics_module, "Profiler", object)
+    with caplog.at_level(logging.WARNING, logger="main.metrics"):
+        assert request_profile_every(10, "pyinstrument") == 10
+        assert request_profile_every(0, "cprofile") == 0
+    assert caplog.text == ""
+
+
+def test_pyinstrument_missing(monkeypatch, caplog):
+    monkeypatch.setattr(metrics_module, "Profiler", None)
+    with caplog.at_level(logging.WARNING, logger="main.metrics"):
+        assert request_profile_every(10, "pyinstrument") == 0
+    assert "pyinstrument" in caplog.text
+
+
+# Server-Timing y /metrics solo informan de consultas y tiempo, no de filas (ver QueryStats)
+def test_query_stats_in_server_timing_and_registry():
+    stats = metrics_module.QueryStats()
+    stats.queries, stats.seconds = 3, 0.012
+    assert metrics_module._server_timing(0.05, stats) == b'app;dur=50.0, db;dur=12.0;desc="3 queries"'
+
+    registry = metrics_module.Registry()
+    registry.started("GET", "/dashboard")
+    registry.finished("GET", "/dashboard", 200, 0.05, stats)
+    rendered = registry.render()
+    assert 'db_queries_total{method="GET",route="/dashboard"} 3' in rendered
+    assert "rows" not in rendered
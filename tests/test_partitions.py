@@ -0,0 +1,53 @@
+# Caché de particiones conocidas: los meses pasados se comprueban siempre, porque la retención
+# puede haberlos separado desde otro proceso
+from contextlib import contextmanager
+from datetime import datetime
+from main import partitions
+from main.partitions import add_months, ensure_partitions, month_start
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, parameters=None):
+        self.statements.append(str(statement))
+        # La tabla está particionada y la partición ya existe
+        return FakeResult(True)
+
+
+class FakeEngine:
+    def __init__(self):
+        self.transactions = 0
+        self.connection = FakeConnection()
+
+    @contextmanager
+    def begin(self):
+        self.transactions += 1
+        yield self.connection
+
+
+def test_only_current_and_future_months_are_cached(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(partitions, "engine", engine)
+    monkeypatch.setattr(partitions, "_known", set())
+    current = month_start(datetime.utcnow())
+    past, future = add_months(current, -14), add_months(current, 2)
+
+    ensure_partitions("weights", future, future)
+    ensure_partitions("weights", future, future)
+    assert engine.transactions == 1
+
+    ensure_partitions("weights", past, past)
+    ensure_partitions("weights", past, past)
+    assert engine.transactions == 3
+    assert ("weights", past) not in partitions._known
+    assert ("weights", future) in partitions._known
@@ -0,0 +1,27 @@
+# Tras una escritura del usuario sus lecturas van al primario aunque haya réplica
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from main import database
+from main.cache import invalidate, wrote_recently
+
+replica = async_sessionmaker()
+
+
+def _use_replica(monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_READ_HOST", "replica")
+    monkeypatch.setattr(database, "AsyncReadSessionLocal", replica)
+
+
+def test_reads_go_to_replica_without_writes(monkeypatch):
+    _use_replica(monkeypatch)
+    assert not wrote_recently(9001)
+    assert database.read_session(9001).sync_session.bind is None
+    assert database.read_session().sync_session.bind is None
+
+
+def test_reads_go_to_primary_after_write(monkeypatch):
+    _use_replica(monkeypatch)
+    invalidate(9002, "dashboard")
+    assert wrote_recently(9002)
+    assert database.read_session(9002).sync_session.bind is database.async_engine.sync_engine
+    # Los demás usuarios siguen leyendo de la réplica
+    assert database.read_session(9003).sync_session.bind is None
@@ -0,0 +1,69 @@
+# Respuestas validadas con los esquemas de schemas.py y serializadas con orjson
+from datetime import datetime
+import pytest
+from fastapi.exceptions import ResponseValidationError
+from fastapi.testclient import TestClient
+from main import main as app_module
+from main.crud import get_current_user
+from main.main import app, get_read_db
+
+DASHBOARD = {"status": "success", "data": {
+    "weight": 71.5, "height": None, "body_composition": {"fat": 20.0, "muscle": None, "water": None},
+    "body_fat_percentage": None, "water_consumption_today": 8, "daily_steps": 7500,
+    "exercises_today": [{"name": "Correr", "duration": 30}],
+}}
+
+
+async def _no_db():
+    yield None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app.dependency_overrides[get_current_user] = lambda: 1
+    app.dependency_overrides[get_read_db] = _no_db
+    # Sin el gestor de contexto no se ejecuta el lifespan (migraciones y particiones)
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def _returning(monkeypatch, name, payload):
+    async def fake(*args, **kwargs):
+        return payload
+    monkeypatch.setattr(app_module, name, fake)
+
+
+def test_dashboard_response(client, monkeypatch):
+    _returning(monkeypatch, "get_dashboard_view", {**DASHBOARD, "debug": "no sale en la respuesta"})
+    response = client.get("/dashboard/view")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == DASHBOARD
+
+
+def test_error_response(client, monkeypatch):
+    _returning(monkeypatch, "get_dashboard_view", {"status": "error", "message": "fallo"})
+    assert client.get("/dashboard/view").json() == {"status": "error", "message": "fallo"}
+
+
+def test_history_rows_and_columns(client, monkeypatch):
+    rows = [{"fecha": datetime(2024, 1, 1, 8), "Peso (kg)": 70.5}]
+    _returning(monkeypatch, "get_data_history", {"status": "success", "data": rows})
+    assert client.get("/dashboard/history", params={"data_type": "weights", "period": "week"}).json() == \
+        {"status": "success", "data": [{"fecha": "2024-01-01T08:00:00", "Peso (kg)": 70.5}]}
+
+    columns = {"fecha": [datetime(2024, 1, 1, 8)], "values": [30], "label": "Duración (min)"}
+    _returning(monkeypatch, "get_data_history", {"status": "success", "data": {**columns, "names": ["Correr"]}})
+    data = client.get("/dashboard/history", params={"data_type": "exercises", "period": "week"}).json()["data"]
+    assert data == {"fecha": ["2024-01-01T08:00:00"], "values": [30], "label": "Duración (min)", "names": ["Correr"]}
+
+    # Sin nombres se usa el esquema de columnas sin names
+    _returning(monkeypatch, "get_data_history", {"status": "success", "data": columns})
+    data = client.get("/dashboard/history", params={"data_type": "weights", "period": "week"}).json()["data"]
+    assert data == {"fecha": ["2024-01-01T08:00:00"], "values": [30], "label": "Duración (min)"}
+
+
+def test_invalid_payload_is_not_sent(client, monkeypatch):
+    _returning(monkeypatch, "get_dashboard_view", {"status": "success", "data": {"weight": "mucho"}})
+    with pytest.raises(ResponseValidationError):
+        client.get("/dashboard/view")
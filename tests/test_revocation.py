@@ -0,0 +1,29 @@
+# Lista de revocaciones: caché local por proceso delante de un almacén compartido
+from time import time
+from main.revocation import MemoryRevocationStore, RevocationList
+
+
+def test_logout_seen_by_other_worker_without_local_cache():
+    store = MemoryRevocationStore()
+    worker_a, worker_b = RevocationList(store, cache_ttl=0), RevocationList(store, cache_ttl=0)
+    assert not worker_b.is_revoked("jti-1")
+    worker_a.revoke("jti-1", time() + 60)
+    assert worker_b.is_revoked("jti-1")
+    assert worker_a.cached("jti-1") is True
+
+
+def test_not_revoked_is_cached_for_ttl():
+    store = MemoryRevocationStore()
+    worker_a, worker_b = RevocationList(store, cache_ttl=60), RevocationList(store, cache_ttl=60)
+    assert not worker_b.is_revoked("jti-2")
+    worker_a.revoke("jti-2", time() + 60)
+    # Hasta que caduque la entrada local, el otro worker sigue con su respuesta guardada
+    assert worker_b.cached("jti-2") is False
+    assert store.is_revoked("jti-2")
+
+
+def test_expired_revocation_is_forgotten():
+    store = MemoryRevocationStore()
+    revocations = RevocationList(store, cache_ttl=0)
+    store.revoke("jti-3", time() - 1)
+    assert not revocations.is_revoked("jti-3")
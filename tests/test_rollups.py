@@ -0,0 +1,71 @@
+# Resúmenes por día, semana y mes que mantienen las importaciones
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, update
+from main.models import DailySteps, MetricRollup, Weight
+from main.partitions import ensure_partitions
+from main.rollups import refresh_rollups
+from tests.conftest import add_user
+
+# Del jueves 25 de enero al martes 6 de febrero de 2024: cruza una semana y un mes
+START = datetime(2024, 1, 25)
+DAYS = 13
+
+
+def _rollups(db, user_id, metric):
+    rows = db.execute(select(MetricRollup.granularity, MetricRollup.bucket, MetricRollup.total, MetricRollup.count,
+                             MetricRollup.minimum, MetricRollup.maximum, MetricRollup.last)
+                      .where(MetricRollup.userId == user_id, MetricRollup.metric == metric)).all()
+    return {(row.granularity, row.bucket): tuple(row[2:]) for row in rows}
+
+
+def _seed(db):
+    ensure_partitions(DailySteps.__tablename__, START, START + timedelta(days=DAYS))
+    ensure_partitions(Weight.__tablename__, START, START + timedelta(days=DAYS))
+    user_id = add_user(db)
+    # Dos lecturas de pasos por día: 1000 * (día + 1) a las 8 y 100 a las 20
+    for day in range(DAYS):
+        db.add(DailySteps(userId=user_id, date=START + timedelta(days=day, hours=8), stepsAmount=1000 * (day + 1)))
+        db.add(DailySteps(userId=user_id, date=START + timedelta(days=day, hours=20), stepsAmount=100))
+    db.flush()
+    refresh_rollups(db, user_id, DailySteps, START, START + timedelta(days=DAYS - 1))
+    return user_id
+
+
+def test_rollups_by_day_week_and_month(db):
+    user_id = _seed(db)
+    rollups = _rollups(db, user_id, 'steps')
+    assert rollups[('day', date(2024, 1, 25))] == (1100.0, 2, 100.0, 1000.0, 100.0)
+    # Semana del lunes 29 de enero: días 4 a 10
+    assert rollups[('week', date(2024, 1, 29))] == (sum(1000 * (day + 1) + 100 for day in range(4, 11)), 14, 100.0, 11000.0, 100.0)
+    assert rollups[('month', date(2024, 1, 1))] == (sum(1000 * (day + 1) + 100 for day in range(7)), 14, 100.0, 7000.0, 100.0)
+    assert rollups[('month', date(2024, 2, 1))][:2] == (sum(1000 * (day + 1) + 100 for day in range(7, 13)), 12)
+    assert len([key for key in rollups if key[0] == 'day']) == DAYS
+    assert len([key for key in rollups if key[0] == 'week']) == 3
+
+
+def test_refresh_only_affected_days(db):
+    user_id = _seed(db)
+    before = _rollups(db, user_id, 'steps')
+    changed = START + timedelta(days=8, hours=8)
+    db.execute(update(DailySteps).where(DailySteps.userId == user_id, DailySteps.date == changed).values(stepsAmount=50))
+    refresh_rollups(db, user_id, DailySteps, changed, changed)
+    after = _rollups(db, user_id, 'steps')
+
+    difference = 50 - 9000
+    assert after[('day', date(2024, 2, 2))] == (150.0, 2, 50.0, 100.0, 100.0)
+    assert after[('week', date(2024, 1, 29))][0] == before[('week', date(2024, 1, 29))][0] + difference
+    assert after[('month', date(2024, 2, 1))][0] == before[('month', date(2024, 2, 1))][0] + difference
+    # Lo que no cubre el día cambiado queda igual
+    unchanged = [key for key in before if key not in {('day', date(2024, 2, 2)), ('week', date(2024, 1, 29)), ('month', date(2024, 2, 1))}]
+    assert all(after[key] == before[key] for key in unchanged)
+
+
+def test_last_value_and_average(db):
+    ensure_partitions(Weight.__tablename__, START, START)
+    user_id = add_user(db)
+    db.add_all([Weight(userId=user_id, date=START + timedelta(hours=hour), weight=weight)
+                for hour, weight in ((7, 71.0), (21, 70.0), (12, 72.0))])
+    db.flush()
+    refresh_rollups(db, user_id, Weight, START, START)
+    total, count, minimum, maximum, last = _rollups(db, user_id, 'weights')[('day', START.date())]
+    assert (total / count, minimum, maximum, last) == (71.0, 70.0, 72.0, 70.0)
@@ -0,0 +1,76 @@
+# Importaciones incrementales: marca de agua y huellas diarias
+import io
+from datetime import datetime
+import pandas as pd
+from main.crud import import_sensor_data
+from main.models import DailySteps
+from main.partitions import ensure_partitions
+from main.sync import day_hashes, merge_day_hashes
+from tests.conftest import add_user
+
+
+def _csv(rows):
+    return io.BytesIO(("fecha,cantidadPasos\n" + "".join(f"2024-03-{day:02d} {hour:02d}:00:00,{steps}\n"
+                                                         for day, hour, steps in rows)).encode())
+
+
+# Tres lecturas por día durante cinco días
+ROWS = [(day, hour, 1000 * day + hour) for day in range(1, 6) for hour in (8, 13, 20)]
+
+
+def _frame(rows):
+    return pd.DataFrame({"date": [datetime(2024, 3, day, hour) for day, hour, _ in rows],
+                         "stepsAmount": [steps for _, _, steps in rows]})
+
+
+def test_day_hash_ignores_order_and_blocks():
+    whole = day_hashes(_frame(ROWS), 'daily_steps')
+    assert day_hashes(_frame(ROWS[::-1]), 'daily_steps') == whole
+    merged = {}
+    for start in range(0, len(ROWS), 4):
+        merge_day_hashes(merged, day_hashes(_frame(ROWS[start:start + 4]), 'daily_steps'))
+    assert merged == whole
+    assert whole[datetime(2024, 3, 1)][1] == 3
+    # El mismo valor como entero o como decimal da la misma huella
+    floats = _frame(ROWS).astype({"stepsAmount": "float64"})
+    assert day_hashes(floats, 'daily_steps') == whole
+    changed = ROWS[:4] + [(2, 13, 1)] + ROWS[5:]
+    different = day_hashes(_frame(changed), 'daily_steps')
+    assert [day.day for day in whole if whole[day] != different[day]] == [2]
+
+
+def _import(db, user_id, rows, sync):
+    result = import_sensor_data(db, user_id, 'daily_steps', _csv(rows), sync=sync)
+    return result["written"], result["skipped"]
+
+
+def _user(db):
+    ensure_partitions(DailySteps.__tablename__, datetime(2024, 3, 1), datetime(2024, 3, 31))
+    return add_user(db)
+
+
+def test_hash_mode_skips_identical_days(db):
+    user_id = _user(db)
+    assert _import(db, user_id, ROWS, "hash") == (15, 0)
+    assert _import(db, user_id, ROWS[::-1], "hash") == (0, 15)
+    # Un valor distinto en el día 2: se reescribe el día completo
+    changed = ROWS[:4] + [(2, 13, 1)] + ROWS[5:]
+    assert _import(db, user_id, changed, "hash") == (3, 12)
+    assert _import(db, user_id, changed, "hash") == (0, 15)
+
+
+def test_full_import_forgets_day_hashes(db):
+    user_id = _user(db)
+    _import(db, user_id, ROWS, "hash")
+    assert _import(db, user_id, ROWS[:3], "full") == (3, 0)
+    # Las huellas del día 1 ya no describen la tabla: la siguiente importación en modo hash lo reescribe
+    assert _import(db, user_id, ROWS, "hash") == (3, 12)
+
+
+def test_watermark_mode_skips_older_rows(db):
+    user_id = _user(db)
+    assert _import(db, user_id, ROWS[:9], "watermark") == (9, 0)
+    assert _import(db, user_id, ROWS, "watermark") == (6, 9)
+    assert _import(db, user_id, ROWS, "watermark") == (0, 15)
+    # Una fila anterior a la marca de agua se salta aunque sea nueva
+    assert _import(db, user_id, [(1, 23, 5)], "watermark") == (0, 1)
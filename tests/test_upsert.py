@@ -0,0 +1,68 @@
+# Escritura de las importaciones: recuento de filas insertadas y actualizadas y bloqueo por usuario y tabla
+import io
+from datetime import datetime
+from sqlalchemy import func, select
+from main.crud import import_sensor_data
+from main.database import engine
+from main.importer import parse_csv, upsert_frame
+from main.models import Weight
+from main.partitions import ensure_partitions
+from tests.conftest import add_user
+
+
+def _csv(weights):
+    return ("fecha,peso\n" + "".join(f"2024-03-{day:02d} 08:00:00,{weight}\n" for day, weight in weights.items())).encode()
+
+
+def _frame(user_id, weights):
+    [block] = parse_csv(io.BytesIO(_csv(weights)), user_id, ['weights'])
+    return block.frames['weights']
+
+
+def _stored(db, user_id):
+    return dict(db.execute(select(func.extract("day", Weight.date), Weight.weight).where(Weight.userId == user_id)).all())
+
+
+def test_upsert_counts_inserts_and_updates_across_batches(db):
+    ensure_partitions("weights", datetime(2024, 3, 1), datetime(2024, 3, 31))
+    user_id = add_user(db)
+    weights = {day: 70.0 for day in range(1, 11)}
+    assert upsert_frame(db, 'weights', _frame(user_id, weights), batch_size=4) == (10, 0)
+
+    # Cinco días ya guardados (uno con otro valor) y dos nuevos, en lotes que mezclan ambos
+    changed = {**{day: 70.0 for day in range(6, 11)}, 8: 75.5, 11: 71.0, 12: 72.0}
+    assert upsert_frame(db, 'weights', _frame(user_id, changed), batch_size=3) == (2, 5)
+    stored = _stored(db, user_id)
+    assert len(stored) == 12
+    assert stored[8] == 75.5 and stored[12] == 72.0
+
+    # Las filas de otro usuario en los mismos días no cuentan como existentes
+    other = add_user(db)
+    assert upsert_frame(db, 'weights', _frame(other, weights)) == (10, 0)
+
+
+def test_import_reports_written_rows(db):
+    ensure_partitions("weights", datetime(2024, 3, 1), datetime(2024, 3, 31))
+    user_id = add_user(db)
+    weights = {day: 70.0 + day for day in range(1, 21)}
+    result = import_sensor_data(db, user_id, 'weights', io.BytesIO(_csv(weights)), batch_size=7)
+    assert (result["inserted"], result["updated"], result["written"]) == (20, 0, 20)
+
+    result = import_sensor_data(db, user_id, 'weights', io.BytesIO(_csv({**weights, 3: 90.0})), batch_size=7)
+    assert (result["inserted"], result["updated"], result["written"]) == (0, 20, 20)
+    assert _stored(db, user_id)[3] == 90.0
+
+
+def test_upsert_holds_lock_until_transaction_ends(db):
+    ensure_partitions("weights", datetime(2024, 3, 1), datetime(2024, 3, 31))
+    user_id, other = add_user(db), add_user(db)
+    upsert_frame(db, 'weights', _frame(user_id, {1: 70.0}))
+
+    def try_lock(table, locked_user):
+        with engine.connect() as connection:
+            return connection.scalar(select(func.pg_try_advisory_xact_lock(func.hashtext(table), locked_user)))
+
+    # Otra importación del mismo usuario y tabla espera; las de otro usuario u otra tabla no
+    assert try_lock("weights", user_id) is False
+    assert try_lock("weights", other) is True
+    assert try_lock("heights", user_id) is True